@@ -22,7 +22,8 @@ from coretc.blocks import Block
 from coretc.transaction import TX
 from coretc.utxo import UTXO
 from coretc.utxoset import UTXOSet
-from coretc.miner import mine_block
+from coretc.miner import mine_block, ParallelMiner, ChainMiner
+from coretc.blocktemplate import BlockTemplate
 
 from coretc.chain import Chain, ForkBlock
 from coretc.status import BlockStatus
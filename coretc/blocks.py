@@ -1,21 +1,37 @@
 
-from typing import Type, Optional
+from typing import Type, Optional, Tuple
 
 from binascii import hexlify, unhexlify
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from hashlib import sha256
 import json, struct, logging
 from Crypto.Util.number import long_to_bytes
 from coretc import transaction
 
 from coretc.difficulty import hashDifficulty, adjustDifficulty, getDifficultyTarget, checkDifficulty
-from coretc.transaction import TX
+from coretc.transaction import TX, TXList
+from coretc.merkle import ProofStep, merkle_root, merkle_proof
 from coretc.utils.generic import data_hexdigest, data_hexundigest
 
 from coretc.object_schemas import BLOCK_JSON_SCHEMA, is_schema_valid
 
 logger = logging.getLogger('tc-core')
 
+# Binary record: version, previous hash, timestamp, difficulty, nonce length, tx count | nonce | txs
+BLOCK_RECORD_HEADER = struct.Struct('<B32sQIHH')
+MAX_BLOCK_NONCE_SIZE = 0xFFFF
+MAX_BLOCK_TXS = 0xFFFF
+
+# Versions 0 & 1 hash every txid into the header, version 2 commits to their merkle root instead.
+# Version 3 moves the timestamp & nonce to the end of the header so miners can reuse the hash midstate
+BLOCK_VERSION_MERKLE = 2
+BLOCK_VERSION_MIDSTATE = 3
+SUPPORTED_BLOCK_VERSIONS = {0, 1, BLOCK_VERSION_MERKLE, BLOCK_VERSION_MIDSTATE}
+LATEST_BLOCK_VERSION = BLOCK_VERSION_MIDSTATE
+
+# Changing any of these invalidates the cached block hash
+HASHED_FIELDS = {'previous_hash', 'timestamp', 'difficulty_bits', 'nonce', 'transactions', '_VERSION'}
+
 @dataclass(init = True)
 class Block:
     previous_hash: bytes
@@ -26,25 +42,155 @@ class Block:
 
     transactions: list[TX]
 
-    _VERSION: int = 1
+    _VERSION: int = LATEST_BLOCK_VERSION
 
-    # TODO: Also need to cache some stuff for TXs
+    # Hash caches. Assigning to a hashed field invalidates them, changes made in place to the
+    # transactions are caught by the revision of the TXList they are kept in
+    _txdata_cache: bytes  = field(default = b'', init = False, repr = False, compare = False)
+    _hash_cache: bytes    = field(default = b'', init = False, repr = False, compare = False)
+    _cached_revision: int = field(default = -1, init = False, repr = False, compare = False)
 
-    def hash_sha256(self) -> bytes:
+    def __setattr__(self, name: str, value) -> None:
+        if name == 'transactions' and not isinstance(value, TXList):
+            value = TXList(value)
+
+        object.__setattr__(self, name, value)
+
+        if name in HASHED_FIELDS:
+            object.__setattr__(self, '_hash_cache', b'')
+
+            if name == 'transactions' or name == '_VERSION':
+                object.__setattr__(self, '_txdata_cache', b'')
+
+    def invalidate_cache(self) -> None:
+        '''
+        Drop the cached hash & header data. Only needed if a contained TX was modified without dropping it's txid cache
+        '''
+
+        object.__setattr__(self, '_txdata_cache', b'')
+        object.__setattr__(self, '_hash_cache', b'')
+
+    def get_txids(self) -> list[bytes]:
+        return [tx.get_txid() for tx in self.transactions]
+
+    def is_txdata_stale(self) -> bool:
+        '''
+        Check if the transactions changed since the header data was cached
+        '''
+
+        return not self._cached_revision == self.transactions.revision
+
+    def get_txdata(self) -> bytes:
         '''
-        Get the block hash
+        Get the part of the header that commits to the transactions, cached until they change.
+        This is the merkle root for version 2 blocks and the concatenated txids for older ones
 
         Returns:
-            bytes: The SHA-256 hash of the block object
+            bytes: Transaction commitment bytes
+        '''
+
+        if self.is_txdata_stale():
+            self.invalidate_cache()
+
+        if not self._txdata_cache:
+            txids = self.get_txids()
+
+            if self._VERSION >= BLOCK_VERSION_MERKLE:
+                txdata = merkle_root(txids)
+            else:
+                txdata = b''.join(txids)
+
+            object.__setattr__(self, '_txdata_cache', txdata)
+            object.__setattr__(self, '_cached_revision', self.transactions.revision)
+
+        return self._txdata_cache
+
+    def get_merkle_root(self) -> bytes:
+        '''
+        Get the merkle root of the block's txids, whatever the block version
+
+        Returns:
+            bytes: 32 byte merkle root
+        '''
+
+        if self._VERSION >= BLOCK_VERSION_MERKLE:
+            return self.get_txdata()
+
+        return merkle_root(self.get_txids())
+
+    def get_tx_proof(self, tx_index: int) -> Optional[list[ProofStep]]:
+        '''
+        Get the merkle inclusion proof of one of the block's transactions.
+        Can be checked against get_merkle_root() with merkle.merkle_verify
+
+        Args:
+            tx_index (int): Index of the transaction in the block
+        Returns:
+            list[ProofStep] | None: The proof or None if the index is invalid
         '''
 
-        return sha256(
+        return merkle_proof(self.get_txids(), tx_index)
+
+    def get_header_prefix(self) -> bytes:
+        '''
+        Get the part of a version 3 header that stays the same while mining,
+        ie everything but the timestamp and the nonce
+
+        Returns:
+            bytes: Constant header prefix
+        '''
+
+        return (
+            self.previous_hash +
+            struct.pack('>IB', self.difficulty_bits, self._VERSION) +
+            self.get_txdata()
+        )
+
+    def get_header_bytes(self) -> bytes:
+        '''
+        Get the serialized header that is hashed to get the block hash.
+        Version 2+ headers have a constant size (for a fixed nonce length)
+
+        Returns:
+            bytes: Header bytes
+        '''
+
+        if self._VERSION >= BLOCK_VERSION_MIDSTATE:
+            return self.get_header_prefix() + struct.pack('>Q', self.timestamp) + self.nonce
+
+        txdata = self.get_txdata()
+
+        if self._VERSION >= BLOCK_VERSION_MERKLE:
+            return (
+                self.previous_hash +
+                struct.pack('>QI', self.timestamp, self.difficulty_bits) +
+                self.nonce + struct.pack('B', self._VERSION) +
+                txdata
+            )
+
+        return (
             self.previous_hash + 
             long_to_bytes(self.timestamp) + 
             long_to_bytes(self.difficulty_bits) + 
             self.nonce + struct.pack('B', self._VERSION) + 
-            b''.join([tx.get_txid() for tx in self.transactions])
-        ).digest()
+            txdata
+        )
+
+    def hash_sha256(self) -> bytes:
+        '''
+        Get the block hash, cached until a hashed field changes
+
+        Returns:
+            bytes: The SHA-256 hash of the block object
+        '''
+
+        if self._hash_cache and not self.is_txdata_stale():
+            return self._hash_cache
+
+        block_hash = sha256(self.get_header_bytes()).digest()
+        object.__setattr__(self, '_hash_cache', block_hash)
+
+        return block_hash
     
     def is_hash_valid(self) -> bool:
         '''
@@ -82,6 +228,82 @@ class Block:
         
         return result
     
+    def to_bytes(self) -> bytes:
+        '''
+        Serialize the Block into it's compact binary record
+
+        Returns:
+            bytes: Binary record
+        '''
+
+        return b''.join([
+            BLOCK_RECORD_HEADER.pack(
+                self._VERSION, self.previous_hash, self.timestamp, self.difficulty_bits,
+                len(self.nonce), len(self.transactions)
+            ),
+            self.nonce,
+            *[tx.to_bytes() for tx in self.transactions]
+        ])
+
+    @staticmethod
+    def read_bytes(data: bytes | memoryview, offset: int = 0) -> Tuple['Block', int]:
+        '''
+        Parse a Block binary record that starts at an offset of a buffer
+        NOTE: Raises struct.error or ValueError on malformed data, use from_bytes for a checked parse
+
+        Args:
+            data (bytes | memoryview): Buffer containing the record
+            offset (int): Where the record starts
+
+        Returns:
+            Tuple[Block, int]: Resulting object and the offset right after the record
+        '''
+
+        version, previous_hash, timestamp, difficulty, nonce_len, tx_count = BLOCK_RECORD_HEADER.unpack_from(data, offset)
+        offset += BLOCK_RECORD_HEADER.size
+
+        nonce = bytes(data[offset:offset + nonce_len])
+        offset += nonce_len
+
+        tx_objects: list[TX] = []
+
+        for _ in range(tx_count):
+            tx, offset = TX.read_bytes(data, offset)
+            tx_objects.append(tx)
+
+        if offset > len(data):
+            raise ValueError('Block record exceeds the buffer')
+
+        return Block(
+            previous_hash   = previous_hash,
+            timestamp       = timestamp,
+            difficulty_bits = difficulty,
+            nonce           = nonce,
+            transactions    = tx_objects,
+            _VERSION        = version
+        ), offset
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview) -> Optional['Block']:
+        '''
+        Parse a Block from it's binary record
+
+        Returns:
+            Block | None: Resulting object or None if the record is malformed
+        '''
+
+        try:
+            blk, end = Block.read_bytes(data)
+        except (struct.error, ValueError, IndexError):
+            logger.error('Malformed Block binary record')
+            return None
+
+        if not end == len(data):
+            logger.error('Trailing data after Block binary record')
+            return None
+
+        return blk
+
     @staticmethod
     def valid_block_json(json_data: dict) -> bool:
         '''
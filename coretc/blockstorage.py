@@ -1,63 +1,90 @@
+from typing import Iterator, List, Tuple
 
-from typing import Mapping, List, Tuple
-
-import os, re
+import os, re, struct, mmap, shutil
 from os.path import exists as fileExists
 from os.path import isdir as isDirectory
-from copy import deepcopy
 
-import bson, json, logging
+import logging
 
-from coretc.utils.generic import dump_json, load_bson_from_file
+from coretc.utils.generic import load_bson_from_file
 
 from coretc.blocks import Block
+from coretc.utils.cache import LRUCache
 from coretc.utils.valid_data import valid_directory, valid_file
 
 logger = logging.getLogger('tc-core')
-   
+
+# Store layout:
+#   <n>.blk     Binary block records (see Block.to_bytes) appended back to back, n in hex
+#   blocks.idx  One fixed size entry per height: store file, offset & length of the record
+
+INDEX_FILE = 'blocks.idx'
+INDEX_ENTRY = struct.Struct('<IQI')
+
+# Max count of store files kept memory mapped at once
+MAX_MAPPED_FILES = 64
+
+LEGACY_STORE_PATTERN = re.compile(r'^[0-9a-f]+\.dat$')
+
+# Legacy stores are converted in here and only moved into the store once complete
+MIGRATION_DIRECTORY = 'migrating/'
+
 class BlockStorage:
-    def __init__(self, store_directory: str, blocks_per_file: int):
-        
+    def __init__(self, store_directory: str, blocks_per_file: int, cache_size: int = 1024):
+
         logger.debug(f'Initializing BlockStorage {store_directory}, blocksperfile={blocks_per_file}')
-        
-        
+
+
         self.store_dir = store_directory + ('/' if store_directory[-1] != '/' else '')
-        
+
         self.blocks_per_file = blocks_per_file
 
-        self.block_cache: Mapping[int, Block] = {}
-        
+        # Decoded blocks, by height and by hash
+        self.block_cache: LRUCache = LRUCache(cache_size)
+        self.hash_cache:  LRUCache = LRUCache(cache_size)
+
+        # Read only memory maps of the store files & index, by path
+        self.file_maps: LRUCache = LRUCache(MAX_MAPPED_FILES)
+
         self.height: int = -1
         self.initialize()
 
     def initialize(self):
         '''
-        Used to initialize the block store height
+        Used to initialize the block store height. Legacy BSON stores get migrated
+        NOTE: Raises RuntimeError if a legacy store can't be migrated, the node must not start with half a chain
         '''
-        filenames: List[str] = []
-        pattern = re.compile(r'^[0-9a-f]+\.dat$')
-        
+
         if not valid_directory(self.store_dir):
             os.makedirs(self.store_dir)
 
-        filenames = [f for f in os.listdir(self.store_dir) if pattern.match(f)]
-        
-        if len(filenames) == 0:
+        index_path = self.store_dir + INDEX_FILE
+
+        if not valid_file(index_path):
+            legacy_files = [f for f in os.listdir(self.store_dir) if LEGACY_STORE_PATTERN.match(f)]
+
+            if len(legacy_files) > 0:
+                logger.warning(f'Found {len(legacy_files)} legacy block store files, migrating')
+
+                if migrate_legacy_store(self.store_dir, self.blocks_per_file) < 0:
+                    logger.critical('Legacy block store migration failed, the legacy files were left as they are')
+                    raise RuntimeError(f'Unable to migrate the legacy block store in {self.store_dir}')
+
+        if not valid_file(index_path):
             self.height = 0
             return
 
-        # Get the block count of the last file
-        block_count, _ = self.get_storefile_json(len(filenames) - 1)
-        logger.info(f'Last block file contains {block_count} blocks')
-        
-        if block_count <= 0:
-            logger.critical(f'Error initializing block store, invalid file: {len(filenames) - 1}')
-            return
+        index_size = os.path.getsize(index_path)
+
+        self.height = index_size // INDEX_ENTRY.size
 
-        self.height = (len(filenames) - 1)*self.blocks_per_file + block_count
+        # Left by a crash mid-write, later entries would be appended after it misaligned
+        if index_size % INDEX_ENTRY.size != 0:
+            logger.critical('Block store index has a partial entry, truncating it')
+            os.truncate(index_path, self.height * INDEX_ENTRY.size)
 
         logger.info(f'Found {self.height} blocks stored')
-    
+
     def get_store_tophash(self) -> bytes:
         '''
         Get the tophash that is _stored_
@@ -65,16 +92,14 @@ class BlockStorage:
         Returns:
             bytes: SHA-256 Hash of the block
         '''
-        
+
         if self.height <= 0:
             return b''
 
-        storefile = (self.height - 1) // self.blocks_per_file
+        topblock = self.get_block(self.height)
 
-        topblocks = self.get_store_file_blocks(storefile)
+        return topblock.hash_sha256() if topblock is not None else b''
 
-        return topblocks[-1].hash_sha256()
-    
     def get_store_topdiff(self) -> int:
         '''
         Get the top difficulty in the block storage
@@ -84,11 +109,10 @@ class BlockStorage:
         '''
 
         if self.height <= 0: return -1
-        storefile = (self.height - 1) // self.blocks_per_file
 
-        topblocks = self.get_store_file_blocks(storefile)
+        topblock = self.get_block(self.height)
 
-        return topblocks[-1].difficulty_bits
+        return topblock.difficulty_bits if topblock is not None else -1
 
     def get_block(self, blockheight: int) -> Block | None:
         '''
@@ -99,141 +123,375 @@ class BlockStorage:
         Returns:
             Block: Block object or None if it does not exist
         '''
-        
-        if blockheight > self.height: return None
 
-        chunk = (blockheight - 1) // self.blocks_per_file
-        
-        #print('Target height:', blockheight, 'Chunk:', chunk)
+        if blockheight > self.height or blockheight <= 0: return None
+
+        cached: Block | None = self.block_cache.get(blockheight)
+
+        if cached is not None: return cached
+
+        raw_data = self.get_block_bytes(blockheight)
 
-        blocks = self.get_store_file_blocks(chunk)
+        if raw_data is None: return None
 
-        # Get the specified block
-        target_index = (blockheight - 1) % 32
+        block_object = Block.from_bytes(raw_data)
 
-        if target_index >= len(blocks): return None
+        if block_object is None:
+            logger.critical(f'Invalid block data when loading height {blockheight} from store!')
+            return None
 
-        return blocks[target_index]
+        self.cache_block(blockheight, block_object)
 
-    def get_store_file_blocks(self, storefile: int | str) -> List[Block]:
+        return block_object
+
+    def get_blocks(self, start_height: int, count: int) -> List[Block]:
         '''
-        Get all blocks in a storefile
+        Get a contiguous range of blocks. Records that are not cached are read in bulk
 
         Args:
-            storefile (int | str): Storefile to read
+            start_height (int): Height of the first block
+            count (int): Maximum count of blocks to return
         Returns:
-            List[Block]: Resulting block list
+            List[Block]: The blocks, can be less than count if the store ends
         '''
-        block_count, raw_data = self.get_storefile_json(storefile)
 
-        result: List[Block] = []
+        start_height = max(start_height, 1)
+        end_height = min(start_height + count - 1, self.height)
+
+        if end_height < start_height: return []
 
-        for entry in raw_data:
-            
-            block_object: Block | None = Block.from_json(entry)
+        found: dict[int, Block] = {}
+        missing: List[int] = []
+
+        for height in range(start_height, end_height + 1):
+            if (cached := self.block_cache.get(height)) is not None:
+                found[height] = cached
+            else:
+                missing.append(height)
+
+        # Read the missing records straight out of the mapped store files
+        for height, raw_data in self.iter_block_bytes(missing):
+            block_object = Block.from_bytes(raw_data)
 
             if block_object is None:
-                logger.critical('Invalid block data when loading from store file!')
-                return []
+                logger.critical(f'Invalid block data when loading height {height} from store!')
+                break
+
+            found[height] = block_object
+            self.cache_block(height, block_object)
+
+        result: List[Block] = []
 
-            result.append(block_object)
+        for height in range(start_height, end_height + 1):
+            if height not in found: break
+
+            result.append(found[height])
 
         return result
 
+    def get_block_by_hash(self, block_hash: bytes) -> Block | None:
+        '''
+        Get a stored block by it's hash. Only blocks that are currently cached can be found
+
+        Args:
+            block_hash (bytes): Hash of the block
+        Returns:
+            Block | None: Block object or None if it's not cached
+        '''
+
+        height: int | None = self.hash_cache.get(block_hash)
+
+        if height is None: return None
+
+        return self.get_block(height)
+
+    def cache_block(self, height: int, block: Block) -> None:
+        '''
+        Add a block to the height & hash caches
+        '''
+
+        self.block_cache.put(height, block)
+        self.hash_cache.put(block.hash_sha256(), height)
+
+    def get_cache_stats(self) -> dict:
+        '''
+        Returns:
+            dict: Hit/miss counters of the block caches
+        '''
+
+        return {
+            'blocks': self.block_cache.get_stats(),
+            'hashes': self.hash_cache.get_stats()
+        }
+
+    def get_mapping(self, path: str, min_size: int) -> mmap.mmap | None:
+        '''
+        Get a read only memory map of a store file (or the index), covering at least min_size bytes.
+        Maps are reused until the file grows past them
+
+        Args:
+            path (str): File to map
+            min_size (int): Required mapped size
+        Returns:
+            mmap.mmap | None: The mapping or None if the file is too small
+        '''
+
+        mapping: mmap.mmap | None = self.file_maps.get(path)
+
+        if mapping is not None and len(mapping) >= min_size:
+            return mapping
+
+        # Evicted or stale maps are not closed explicitly, slices handed out may still
+        # reference them. They get unmapped once the last reference is gone
+        if not valid_file(path) or os.path.getsize(path) < max(min_size, 1):
+            return None
+
+        with open(path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+        self.file_maps.put(path, mapping)
+
+        return mapping
+
+    def get_block_location(self, blockheight: int) -> Tuple[int, int, int] | None:
+        '''
+        Look up where a block record is stored using the index
+
+        Args:
+            blockheight (int): Target height
+        Returns:
+            Tuple[int, int, int] | None: Store file, offset & length of the record
+        '''
+
+        if blockheight > self.height or blockheight <= 0: return None
+
+        index_map = self.get_mapping(self.store_dir + INDEX_FILE, blockheight * INDEX_ENTRY.size)
+
+        if index_map is None:
+            logger.critical(f'Block store index is missing height {blockheight}')
+            return None
+
+        return INDEX_ENTRY.unpack_from(index_map, (blockheight - 1) * INDEX_ENTRY.size)
+
+    def get_block_bytes(self, blockheight: int) -> memoryview | None:
+        '''
+        Get the binary record of a block, as a slice of the mapped store file (no copy is made)
+
+        Args:
+            blockheight (int): Target height
+        Returns:
+            memoryview | None: The record or None if it does not exist
+        '''
+
+        location = self.get_block_location(blockheight)
+
+        if location is None: return None
+
+        storefile, offset, length = location
+
+        store_map = self.get_mapping(self.get_storefile_path(storefile), offset + length)
+
+        if store_map is None:
+            logger.critical(f'Store file {storefile} is truncated')
+            return None
+
+        return memoryview(store_map)[offset:offset + length]
+
+    def iter_block_bytes(self, heights: List[int]) -> Iterator[Tuple[int, memoryview]]:
+        '''
+        Get the binary records of many blocks, as slices of the mapped store files
+
+        Args:
+            heights (List[int]): List of heights
+        Returns:
+            Iterator[Tuple[int, memoryview]]: Pairs of the height and it's record
+        '''
+
+        for height in heights:
+            raw_data = self.get_block_bytes(height)
+
+            if raw_data is None: return
+
+            yield height, raw_data
+
+    def get_blocks_bytes(self, start_height: int, count: int) -> List[memoryview]:
+        '''
+        Get the binary records of a contiguous range of blocks without decoding them
+
+        Args:
+            start_height (int): Height of the first block
+            count (int): Maximum count of records to return
+        Returns:
+            List[memoryview]: The records, can be less than count if the store ends
+        '''
+
+        start_height = max(start_height, 1)
+        end_height = min(start_height + count - 1, self.height)
+
+        return [raw_data for _, raw_data in self.iter_block_bytes(list(range(start_height, end_height + 1)))]
+
+    def get_store_file_blocks(self, storefile: int) -> List[Block]:
+        '''
+        Get all blocks in a storefile
+
+        Args:
+            storefile (int): Storefile to read
+        Returns:
+            List[Block]: Resulting block list
+        '''
+
+        return self.get_blocks(storefile * self.blocks_per_file + 1, self.blocks_per_file)
+
     def store_blocks(self, blocks: List[Block]) -> bool:
         '''
         Get a list of blocks and add them to the store
+        Block records are appended to the store files, then their entries to the index
 
         Args:
             blocks (List[Block]): List of blocks to force-save
         Return:
             bool: Whether the storing was successful
 
-        '''   
-        # Needed since the list will be modified
-        to_add: List[Block] = deepcopy(blocks)
-        added_count: int = 0
-        
-        # Iterate through the blocks in chucks, according to the block height
-        while len(to_add) > 0:
+        '''
+
+        index_entries: List[bytes] = []
+        i = 0
+
+        while i < len(blocks):
+            storefile = self.height // self.blocks_per_file
             cut = self.blocks_per_file - (self.height % self.blocks_per_file)
 
-            chunk = to_add[0:cut]
-            to_add = to_add[cut:]
+            chunk = blocks[i:i + cut]
+
+            with open(self.get_storefile_path(storefile), 'ab') as f:
+                offset = f.tell()
+
+                for blk in chunk:
+                    record = blk.to_bytes()
+                    f.write(record)
 
-            store_file = (self.height + len(chunk) - 1) // self.blocks_per_file
-            #print(f'Writting to store file {store_file}')
+                    index_entries.append(INDEX_ENTRY.pack(storefile, offset, len(record)))
+                    offset += len(record)
 
-            # Handle possible other data in preexisting store file
-            prev_data: List[dict] = []
-        
-            if self.store_file_exists(store_file):
-                _, prev_data = self.get_storefile_json(store_file)
-           
-            if len(prev_data) + len(chunk) > self.blocks_per_file:
-                logger.critical('INVALID STORE FILE SIZES!')
+            # Written to the index last, so it never points at missing data
+            with open(self.store_dir + INDEX_FILE, 'ab') as f:
+                f.write(b''.join(index_entries))
+
+            index_entries.clear()
 
             for blk in chunk:
-                prev_data.append(blk.to_json())
-            
-            self.save_to_storefile(store_file, {'blocks': prev_data})
+                self.height += 1
+                self.cache_block(self.height, blk)
+
+            i += len(chunk)
 
-            self.height += len(chunk)
-        
         return True
-    
-    def store_file_exists(self, storefile: str | int) -> bool:
+
+    def get_storefile_path(self, storefile: int) -> str:
+        '''
+        Get the path of a store file given it's number
+        '''
+
+        return self.store_dir + f'{hex(storefile)[2:]}.blk'
+
+    def store_file_exists(self, storefile: int) -> bool:
         '''
         Check if a storefile exists
 
         Args:
-            storefile (str | int): If it's in INT form it will be parsed into the str
+            storefile (int): Store file number
         Returns:
             bool: Whether the store exists
         '''
 
-        if isinstance(storefile, int):
-            storefile = f'{hex(storefile)[2:]}.dat'
-        return valid_file(self.store_dir + storefile)
+        return valid_file(self.get_storefile_path(storefile))
 
+    def get_stored_blockcount(self) -> int:
+        return self.height
 
-    def get_storefile_json(self, storefile: str | int) -> Tuple[int, List]:
+    def close(self) -> None:
+        '''
+        Drop the memory maps & caches of the store
         '''
-        Used to get the JSON of a given store file
 
-        Args:
-            storefile (str | int): If it's in INT form it will be parsed into the str
-        Returns:
-            Tuple[int, List]: Tuple of the block count and list of block json objects
-        '''
-        if isinstance(storefile, int):
-            storefile = f'{hex(storefile)[2:]}.dat'
-        
-        
-        results = load_bson_from_file(
-            self.store_dir + storefile, verbose = False
-        )
-
-        if results is None:
-            logger.critical(f'Error loading BSON from store: {storefile}')
-            return (-1, [])
-
-        #print(results['blocks'])
-
-        if 'blocks' not in results or not isinstance(results['blocks'], list):
-            logger.critical(f'Malformed JSON for block store file {storefile}')
-            return (-1,[])
-
-        return (len(results['blocks']), results['blocks'])
-    
-    def save_to_storefile(self, storefile: str | int, json_data: dict) -> bool:
-        if isinstance(storefile, int):
-            storefile = f'{hex(storefile)[2:]}.dat'
-        
-        with open(self.store_dir + storefile, 'wb') as f:
-            f.write(bson.dumps(json_data))
+        self.file_maps.clear()
+        self.block_cache.clear()
+        self.hash_cache.clear()
 
-        return True
+def migrate_legacy_store(store_directory: str, blocks_per_file: int) -> int:
+    '''
+    Convert a legacy block store, made of BSON files of block JSON, into the binary format.
+    The new store is built in a temporary directory and moved into place only when complete,
+    then the legacy files are moved in a legacy/ subdirectory of the store.
+    On error the store directory is left as it was
 
-    def get_stored_blockcount(self) -> int:
-        return self.height
+    Args:
+        store_directory (str): Directory of the block store
+        blocks_per_file (int): Blocks per store file to use in the new store
+    Returns:
+        int: Count of blocks migrated, -1 on error
+    '''
+
+    store_directory = store_directory + ('/' if store_directory[-1] != '/' else '')
+    legacy_directory = store_directory + 'legacy/'
+    migration_directory = store_directory + MIGRATION_DIRECTORY
+
+    if valid_file(store_directory + INDEX_FILE):
+        logger.error(f'{store_directory} already contains a binary block store')
+        return -1
+
+    legacy_files = sorted(
+        [f for f in os.listdir(store_directory) if LEGACY_STORE_PATTERN.match(f)],
+        key = lambda f: int(f.split('.')[0], 16)
+    )
+
+    # Leftovers of a migration that was interrupted
+    if isDirectory(migration_directory):
+        shutil.rmtree(migration_directory)
+
+    store = BlockStorage(migration_directory, blocks_per_file)
+
+    for filename in legacy_files:
+        data = load_bson_from_file(store_directory + filename, verbose = True)
+
+        if data is None or 'blocks' not in data or not isinstance(data['blocks'], list):
+            logger.critical(f'Malformed legacy store file {filename}, migration stopped')
+            shutil.rmtree(migration_directory)
+            return -1
+
+        blocks: List[Block] = []
+
+        for entry in data['blocks']:
+            blk = Block.from_json(entry)
+
+            if blk is None:
+                logger.critical(f'Invalid block in legacy store file {filename}, migration stopped')
+                shutil.rmtree(migration_directory)
+                return -1
+
+            blocks.append(blk)
+
+        store.store_blocks(blocks)
+
+    store.close()
+
+    # The index goes in last, until it exists the store directory still counts as a legacy store
+    for filename in os.listdir(migration_directory):
+        if filename == INDEX_FILE: continue
+
+        os.replace(migration_directory + filename, store_directory + filename)
+
+    if valid_file(migration_directory + INDEX_FILE):
+        os.replace(migration_directory + INDEX_FILE, store_directory + INDEX_FILE)
+
+    shutil.rmtree(migration_directory)
+
+    if not isDirectory(legacy_directory):
+        os.makedirs(legacy_directory)
+
+    for filename in legacy_files:
+        os.replace(store_directory + filename, legacy_directory + filename)
+
+    logger.info(f'Migrated {store.height} blocks from {len(legacy_files)} legacy store files')
+
+    return store.height
@@ -0,0 +1,181 @@
+
+from typing import List, Set, Tuple
+import heapq, logging, time
+
+from coretc.blocks import Block, BLOCK_RECORD_HEADER
+from coretc.status import BlockStatus
+from coretc.transaction import TX
+from coretc.utxo import UTXO
+from coretc.utils.generic import data_hexdigest
+from coretc.utils.list_utils import compact_lazy_heap
+
+logger = logging.getLogger('tc-core')
+
+# Nonce length produced by the miners, counted towards the block size
+TEMPLATE_NONCE_SIZE = 16
+
+class BlockTemplate:
+    '''
+    Builds candidate blocks on top of the longest fork of a chain. Mempool transactions
+    are kept in a fee-rate priority queue that is updated as transactions enter and leave
+    the mempool, so building a template only pops the best ones instead of rescanning the pool
+    '''
+
+    def __init__(self, chain, reward_pk: bytes, validate: bool = True):
+        '''
+        Args:
+            chain (Chain): The chain to build templates for, its mempool is followed
+            reward_pk (bytes): Public key bytes the block reward is sent to
+            validate (bool): Validate the picked transactions against the tip (DEFAULT=True)
+        '''
+
+        self.chain = chain
+        self.reward_pk: bytes = reward_pk
+        self.validate: bool = validate
+
+        # (-fee rate, insertion order, txid). Removed entries are skipped lazily
+        self.queue: List[Tuple[float, int, bytes]] = []
+        self.candidates: dict[bytes, TX] = {}
+        self.sequence: int = 0
+
+        for transaction in self.chain.memory_pool.get_transactions():
+            self.add_transaction(transaction)
+
+        self.chain.memory_pool.add_tx_listener(self.on_mempool_change)
+
+    def close(self) -> None:
+        '''
+        Stop following the mempool
+        '''
+
+        self.chain.memory_pool.remove_tx_listener(self.on_mempool_change)
+
+    def on_mempool_change(self, transaction: TX, added: bool) -> None:
+
+        if added:
+            self.add_transaction(transaction)
+        else:
+            self.remove_transaction(transaction.get_txid())
+
+    def add_transaction(self, transaction: TX) -> bool:
+        '''
+        Queue a transaction as a template candidate
+
+        Args:
+            transaction (TX): The transaction
+        Returns:
+            bool: Whether it was queued, reward transactions and duplicates are not
+        '''
+
+        txid = transaction.get_txid()
+
+        if len(transaction.inputs) == 0 or txid in self.candidates:
+            return False
+
+        fee_rate = transaction.transaction_fee() / transaction.get_size()
+
+        self.candidates[txid] = transaction
+        heapq.heappush(self.queue, (-fee_rate, self.sequence, txid))
+        self.sequence += 1
+
+        # remove_transaction leaves the queue entry behind, see select_transactions
+        self.queue = compact_lazy_heap(self.queue, self.candidates)
+
+        return True
+
+    def remove_transaction(self, txid: bytes) -> bool:
+        '''
+        Drop a candidate transaction. Its queue entry is skipped when popped
+
+        Args:
+            txid (bytes): Transaction id
+        Returns:
+            bool: Whether it was a candidate
+        '''
+
+        return self.candidates.pop(txid, None) is not None
+
+    def create_reward_transaction(self, reward: float) -> TX:
+
+        tx = TX()
+        tx.add_output(UTXO(owner_pk = self.reward_pk, amount = reward))
+
+        return tx.make()
+
+    def select_transactions(self, size_limit: int, fork = None) -> List[TX]:
+        '''
+        Pick the highest fee-rate transactions that fit in the size limit and do not
+        spend the same outputs as each other
+
+        Args:
+            size_limit (int): Max total size of the picked transactions in bytes
+            fork (ForkBlock | None): Fork the transactions are validated against
+        Returns:
+            List[TX]: Picked transactions in order of decreasing fee rate
+        '''
+
+        picked: List[TX] = []
+        spent: Set[Tuple[bytes, int]] = set()
+        size = 0
+
+        # Popped straight off the queue, only what was looked at gets pushed back (minus removed entries)
+        popped: List[Tuple[float, int, bytes]] = []
+
+        try:
+            while len(self.queue) > 0 and size < size_limit:
+                entry = heapq.heappop(self.queue)
+                txid = entry[2]
+
+                transaction = self.candidates.get(txid)
+                if transaction is None: continue
+
+                popped.append(entry)
+
+                tx_size = transaction.get_size()
+                if size + tx_size > size_limit: continue
+
+                outpoints = [utxo.get_outpoint() for utxo in transaction.inputs]
+
+                if any(outpoint in spent for outpoint in outpoints) or not len(set(outpoints)) == len(outpoints):
+                    continue
+
+                if self.validate and not self.chain.validate_transaction(transaction, fork) == BlockStatus.TX_VALID:
+                    logger.debug(f'Skipping invalid mempool TX {data_hexdigest(txid)} in template')
+                    continue
+
+                spent.update(outpoints)
+                picked.append(transaction)
+                size += tx_size
+
+        finally:
+            # Picked ones stay candidates until the block that confirms them removes them from the mempool
+            for entry in popped:
+                heapq.heappush(self.queue, entry)
+
+        return picked
+
+    def create_block(self) -> Block:
+        '''
+        Build a new unmined block on top of the longest fork
+
+        Returns:
+            Block: The block template
+        '''
+
+        fork, _ = self.chain.get_longest_fork()
+
+        previous_hash = fork.block.hash_sha256() if fork is not None else self.chain.get_tophash()
+
+        # Fees are not claimable yet, the reward transaction only gets the block reward
+        reward_tx = self.create_reward_transaction(self.chain.get_top_blockreward())
+
+        size_limit = (self.chain.settings.block_size_limit - BLOCK_RECORD_HEADER.size -
+                      TEMPLATE_NONCE_SIZE - reward_tx.get_size())
+
+        return Block(
+            previous_hash   = previous_hash,
+            timestamp       = int(time.time()),
+            difficulty_bits = self.chain.get_difficulty(fork),
+            nonce           = b'',
+            transactions    = [reward_tx] + self.select_transactions(size_limit, fork)
+        )
@@ -1,10 +1,10 @@
 
-from typing import List, Tuple
+from typing import Callable, Iterator, List, Set, Tuple
 
 from coretc.difficulty import adjustDifficulty
-from coretc.forktree import ForkBlock
+from coretc.forktree import ForkBlock, Outpoint
 from coretc.transaction import TX
-from coretc.blocks import Block
+from coretc.blocks import Block, SUPPORTED_BLOCK_VERSIONS, BLOCK_RECORD_HEADER, MAX_BLOCK_NONCE_SIZE, MAX_BLOCK_TXS
 from coretc.utils.errors import deprecated, incomplete
 from coretc.utils.generic import data_hexdigest, dump_json
 from coretc.utxo import UTXO
@@ -14,6 +14,7 @@ from coretc.settings import ChainSettings
 from coretc.utxoset import UTXOSet
 from coretc.blockstorage import BlockStorage
 from coretc.mempool import MemPool
+from coretc.sigverify import SignatureVerifier
 
 from binascii import hexlify
 import json, time
@@ -22,6 +23,9 @@ import logging
 
 logger = logging.getLogger('tc-core')
 
+# Max count of stored blocks read in one go by Chain.iter_blocks
+ITER_BLOCKS_STORE_CHUNK = 256
+
 # Possibly split the logger into further submodules
 
 class Chain:
@@ -46,28 +50,264 @@ class Chain:
         self.forks: ForkBlock | None = None
         
         self.block_store: BlockStorage = BlockStorage(settings.block_data_directory,
-                                                      settings.blocks_per_store_file)
+                                                      settings.blocks_per_store_file,
+                                                      settings.block_cache_size)
         if self.block_store.height > 0:
             self.difficulty = self.block_store.get_store_topdiff()
     
         self.utxo_set: UTXOSet = UTXOSet(self.opts.utxo_set_path)
         
-        # TODO: Do checks here
         self.utxo_set.load_utxos()
+        self.sync_utxoset_with_store()
 
-        self.memory_pool: MemPool = MemPool(self.opts.mempool_path)
+        self.memory_pool: MemPool = MemPool(self.opts.mempool_path,
+                                            self.opts.mempool_max_txs,
+                                            self.opts.mempool_max_size)
         self.memory_pool.load_mempool()
 
+        if not self.settings.debug_dont_save:
+            self.memory_pool.open_journal()
+
+        self.signature_verifier: SignatureVerifier = SignatureVerifier(self.opts.signature_workers,
+                                                                      self.opts.signature_parallel_min)
+
         self._temporary_data_mode: bool = False # In this mode the chain will not save anything,
                                                 # everything is considered temporary
+
+        # Called with the new top hash whenever the tip of the longest fork changes
+        self.tip_listeners: List[Callable[[bytes], None]] = []
+
+        # Called with a block and True when it joins the longest fork, False when it leaves it
+        self.block_listeners: List[Callable[[Block, bool], None]] = []
+
+        self.add_block_listener(self.update_mempool)
+
+    def add_block_listener(self, listener: Callable[[Block, bool], None]) -> None:
+        '''
+        Register a function to be called when a block gets connected to or disconnected
+        from the longest fork. Disconnects of a reorg come first, from the old tip downwards
+
+        Args:
+            listener (Callable[[Block, bool], None]): Gets the block and True if connected, False if disconnected
+        '''
+
+        if listener not in self.block_listeners:
+            self.block_listeners.append(listener)
+
+    def remove_block_listener(self, listener: Callable[[Block, bool], None]) -> None:
+
+        if listener in self.block_listeners:
+            self.block_listeners.remove(listener)
+
+    def notify_block_listeners(self, old_route: List[Block], new_route: List[Block]) -> bool:
+        '''
+        Emit the disconnect & connect events between two routes of the longest fork
+
+        Args:
+            old_route (List[Block]): Route to the previous tip
+            new_route (List[Block]): Route to the new tip
+        Returns:
+            bool: Whether the tip changed
+        '''
+
+        common = 0
+
+        for old_block, new_block in zip(old_route, new_route):
+            if not old_block.hash_sha256() == new_block.hash_sha256(): break
+            common += 1
+
+        disconnected = old_route[common:]
+        connected = new_route[common:]
+
+        for listener in list(self.block_listeners):
+            try:
+                for blk in reversed(disconnected):
+                    listener(blk, False)
+
+                for blk in connected:
+                    listener(blk, True)
+
+            except Exception as e:
+                logger.error(f'Chain block listener failed: {e}')
+
+        return len(disconnected) > 0 or len(connected) > 0
+
+    def update_mempool(self, block: Block, connected: bool) -> None:
+        '''
+        Block listener keeping the mempool in line with the longest fork
+        '''
+
+        if connected:
+            self.memory_pool.remove_block_transactions(block)
+            return
+
+        # Pooled TXs spending the block's outputs were admitted against the old branch, where
+        # those outputs existed. They can't stay since the outputs are gone now
+        dropped = self.memory_pool.remove_block_spenders(block)
+
+        # The longest fork is already the new one, so the transactions of the disconnected block
+        # go through the normal admission checks against it. The ones spending outputs of the
+        # orphaned branch or outputs already spent on the new one are dropped
+        transactions = [transaction for transaction in block.transactions if len(transaction.inputs) > 0]
+        statuses = self.add_transactions_to_mempool(transactions)
+
+        dropped += len([status for status in statuses if status not in (BlockStatus.TX_VALID, BlockStatus.INVALID_DUPLICATE)])
+
+        if dropped > 0:
+            logger.debug(f'Dropped {dropped} TXs of or spending a disconnected block, invalid on the new tip')
+
+    def add_transactions_to_mempool(self, transactions: List[TX], timestamp: int | None = None) -> List[BlockStatus]:
+        '''
+        Validate a batch of transactions against the longest fork & the mempool and add the valid ones.
+        The fork's UTXO changes are gathered once for the whole batch and the input signatures
+        of all transactions are verified together, in parallel for big enough batches
+
+        Args:
+            transactions (List[TX]): Transactions to add
+            timestamp (int | None): When they were received, None for now (DEFAULT=None)
+        Returns:
+            List[BlockStatus]: Status of each transaction, TX_VALID for the ones added
+        '''
+
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        fork, _ = self.get_longest_fork()
+
+        statuses: List[BlockStatus] = []
+        batch_txids: Set[bytes] = set()
+        batch_spent: Set[Outpoint] = set()
+
+        # Everything but the signatures is checked first, so only the survivors reach the verifier
+        for transaction in transactions:
+            status = self.check_mempool_transaction(transaction, fork, batch_txids, batch_spent)
+
+            if status == BlockStatus.TX_VALID:
+                batch_txids.add(transaction.get_txid())
+                batch_spent.update(utxo.get_outpoint() for utxo in transaction.inputs)
+
+            statuses.append(status)
+
+        checks: List[Tuple[bytes, bytes, bytes]] = []
+
+        for transaction, status in zip(transactions, statuses):
+            if status == BlockStatus.TX_VALID:
+                checks += transaction.get_signature_checks()
+
+        signatures_valid = iter(self.signature_verifier.verify_all(checks))
+
+        for i, transaction in enumerate(transactions):
+            if not statuses[i] == BlockStatus.TX_VALID: continue
+
+            # Consume this TX's results even if it already failed, to stay aligned
+            if not all([next(signatures_valid) for _ in transaction.inputs]):
+                logger.warning(f'MemPool TX {data_hexdigest(transaction.get_txid())} has an invalid input signature')
+                statuses[i] = BlockStatus.INVALID_TX_INPUTS
+                continue
+
+            if not self.memory_pool.add_transaction(timestamp, transaction):
+                statuses[i] = BlockStatus.INVALID_TX_MEMPOOL_REJECTED
+
+        return statuses
+
+    def check_mempool_transaction(self, transaction: TX, fork: ForkBlock | None,
+                                  batch_txids: Set[bytes],
+                                  batch_spent: Set[Outpoint]) -> BlockStatus:
+        '''
+        Check a transaction that is about to enter the mempool, signatures excluded
+
+        Args:
+            transaction (TX): The transaction
+            fork (ForkBlock | None): Tip of the longest fork, None if there are no forks
+            batch_txids (Set[bytes]): Txids accepted earlier in the same batch
+            batch_spent (Set[Outpoint]): Outpoints spent earlier in the same batch
+        Returns:
+            BlockStatus: TX_VALID if the signatures are all that's left to check
+        '''
+
+        txid = transaction.get_txid()
+
+        if txid in batch_txids or self.memory_pool.has_transaction(txid):
+            return BlockStatus.INVALID_DUPLICATE
+
+        # Rewards only belong in blocks
+        if len(transaction.inputs) == 0 or not transaction.is_valid():
+            return BlockStatus.INVALID_TX_INPUTS
+
+        if not all([utxo.is_valid_input() for utxo in transaction.inputs]):
+            return BlockStatus.INVALID_TX_INPUTS
+
+        if not transaction.check_outputs():
+            return BlockStatus.INVALID_TX_OUTPUTS
+
+        if transaction.outgoing_funds() > transaction.ingoing_funds():
+            return BlockStatus.INVALID_TX_AMOUNTS
+
+        outpoints = [utxo.get_outpoint() for utxo in transaction.inputs]
+
+        if not len(set(outpoints)) == len(outpoints):
+            return BlockStatus.INVALID_TX_UTXO_IS_SPENT
+
+        for utxo, outpoint in zip(transaction.inputs, outpoints):
+
+            if outpoint in batch_spent or (fork is not None and fork.is_utxo_spent(outpoint)):
+                return BlockStatus.INVALID_TX_UTXO_IS_SPENT
+
+            if self.memory_pool.get_spender(outpoint) is not None:
+                return BlockStatus.INVALID_TX_UTXO_IS_SPENT
+
+            utxo_from_set: UTXO | None = self.utxo_set.utxo_get(utxo.txid, utxo.index)
+
+            if utxo_from_set is not None:
+                if not utxo.compare_as_input(utxo_from_set):
+                    return BlockStatus.INVALID_TX_MOD_UTXO
+
+                continue
+
+            # Same as in validate_transaction, outputs created in the fork are not compared
+            if fork is None or fork.get_fork_utxo(outpoint) is None:
+                return BlockStatus.INVALID_TX_UTXO_IS_SPENT
+
+        return BlockStatus.TX_VALID
+
+    def add_tip_listener(self, listener: Callable[[bytes], None]) -> None:
+        '''
+        Register a function to be called with the new top hash when the chain tip changes,
+        eg. so local miners can drop stale work
+
+        Args:
+            listener (Callable[[bytes], None]): The listener
+        '''
+
+        if listener not in self.tip_listeners:
+            self.tip_listeners.append(listener)
+
+    def remove_tip_listener(self, listener: Callable[[bytes], None]) -> None:
+
+        if listener in self.tip_listeners:
+            self.tip_listeners.remove(listener)
+
+    def notify_tip_listeners(self, tophash: bytes) -> None:
+
+        for listener in list(self.tip_listeners):
+            try:
+                listener(tophash)
+            except Exception as e:
+                logger.error(f'Chain tip listener failed: {e}')
     
-    def validate_transaction(self, transaction: TX, fork: ForkBlock | None = None) -> BlockStatus:
+    def validate_transaction(self, transaction: TX, fork: ForkBlock | None = None,
+                             verify_signatures: bool = True,
+                             spent_outpoints: Set[Outpoint] | None = None) -> BlockStatus:
         '''
         Validate a transaction given the transaction and the fork (else use the top fork)
 
         Args:
             transaction (TX): Transaction to make sure is valid
             fork (ForkBlock | None): Fork to use. Default is None and picks the top fork
+            verify_signatures (bool): Whether the input signatures are checked, off when the
+                                      caller verifies them in bulk (DEFAULT=True)
+            spent_outpoints (Set[Outpoint] | None): Outpoints already spent by the other TXs of the
+                                                    block, the TX's inputs are added to it (DEFAULT=None)
 
         Returns:
             BlockStatus: Check status result
@@ -76,16 +316,14 @@ class Chain:
         if fork is None:
             fork, _ = self.get_longest_fork()
         
-        tx_inputs_used: List[UTXO] = []
-        fork_used:  List[UTXO] = []
-        fork_added: List[UTXO] = []
-        
-        # In the case there are NO forks
-        if fork is not None:
-            fork_used, fork_added = fork.get_fork_utxoset()
+        if spent_outpoints is None:
+            spent_outpoints = set()
 
-        # Check the TX structure, the inputs signatures are also checked here
-        if not transaction.check_inputs():
+        # Check the TX structure, the inputs signatures are also checked here unless done in bulk
+        if not transaction.is_valid():
+            return BlockStatus.INVALID_TX_INPUTS
+
+        if not transaction.check_inputs(verify_signatures):
             return BlockStatus.INVALID_TX_INPUTS
 
         if not transaction.check_outputs():
@@ -98,14 +336,15 @@ class Chain:
 
         # Check the inputs (unspent)
         for utxo in transaction.inputs:
+            outpoint = utxo.get_outpoint()
 
             # ======== DOUBLE SPEND CHECK ==========
             # If the used UTXO has been used in this block already
-            if utxo in tx_inputs_used or utxo in fork_used:
+            if outpoint in spent_outpoints or (fork is not None and fork.is_utxo_spent(outpoint)):
                 logger.warning(f'Input UTXO of {data_hexdigest(transaction.get_txid())} already spent in current fork or block')
                 return BlockStatus.INVALID_TX_UTXO_IS_SPENT 
             
-            tx_inputs_used.append(utxo)
+            spent_outpoints.add(outpoint)
 
             # ======== UTXO Exists Check ===========
             # Check if the UTXO not in the UTXO set
@@ -121,8 +360,9 @@ class Chain:
                 continue
             
             # In this case we haven't found the utxo in the UTXOSet, but it might have been 
-            # added in the fork, so we check the fork_added
-            if utxo not in fork_added:
+            # added in the fork, so we check the fork's created outputs
+            # In the case there are NO forks it can't have been
+            if fork is None or fork.get_fork_utxo(outpoint) is None:
                 logger.warning(f'Input utxo of {data_hexdigest(transaction.get_txid())} does not exist.')
 
                 return BlockStatus.INVALID_TX_UTXO_IS_SPENT
@@ -142,15 +382,14 @@ class Chain:
         '''
 
         reward_found = False
-        
-        if fork is not None:
-            fork_used, fork_added = fork.get_fork_utxoset()
-        else:
-            fork_used = []
-            fork_added = []
 
         # Utilized to make sure no 2 transactions use the same UTXO
-        utxos_used: List[UTXO] = list()
+        utxos_used: Set[Outpoint] = set()
+
+        signature_checks: List[Tuple[bytes, bytes, bytes]] = []
+
+        # Size of the block's binary record, the TXs are only measured once they are known to serialize
+        block_size = BLOCK_RECORD_HEADER.size + len(block.nonce)
 
         for transaction in block.transactions:
             
@@ -165,12 +404,24 @@ class Chain:
                 if transaction.outgoing_funds() > self.get_top_blockreward():
                     return BlockStatus.INVALID_TX_WRONG_REWARD_AMOUNT
 
-            res = self.validate_transaction(transaction, fork = fork)
+            res = self.validate_transaction(transaction, fork = fork, verify_signatures = False,
+                                            spent_outpoints = utxos_used)
 
             if not res == BlockStatus.TX_VALID:
                 return res
-            
-            
+
+            block_size += transaction.get_size()
+            signature_checks += transaction.get_signature_checks()
+
+        if block_size > self.settings.block_size_limit:
+            logger.warning(f'Block is over the size limit ({block_size} bytes)')
+            return BlockStatus.INVALID_SIZE
+
+        # The signatures are by far the most expensive part, they are left for last and verified
+        # all together so big blocks can be spread over the verifier's worker processes
+        if not self.signature_verifier.verify(signature_checks):
+            logger.warning('Block contains an invalid input signature')
+            return BlockStatus.INVALID_TX_INPUTS
 
         return BlockStatus.VALID
 
@@ -185,6 +436,15 @@ class Chain:
             bool: Block validity
         '''
         
+        if not block._VERSION in SUPPORTED_BLOCK_VERSIONS:
+            logger.warning(f'Block Invalid: Unsupported version {block._VERSION}')
+            return BlockStatus.INVALID_VERSION
+
+        # The counts have to fit in the block's binary record
+        if len(block.transactions) > MAX_BLOCK_TXS or len(block.nonce) > MAX_BLOCK_NONCE_SIZE:
+            logger.warning('Block Invalid: Too many TXs or nonce too long')
+            return BlockStatus.INVALID_SIZE
+
         block_hash = block.hash_sha256()
         
         # Check if the block is a duplicate already in the fork tree
@@ -265,6 +525,8 @@ class Chain:
         if not validity == BlockStatus.VALID:
             return validity
         
+        _, old_route = self.get_longest_fork()
+
         # In the case where a fork is not present, it needs to be created with the new block as the root
 
         if forkblock is None:
@@ -279,11 +541,18 @@ class Chain:
             fb = forkblock.append_block(newBlock)
             self.forks.hash_cache[newBlock.hash_sha256()] = fb
 
+        # Merging keeps the longest fork in place, so the routes are compared before it
+        _, new_route = self.get_longest_fork()
+
+        tip_changed = self.notify_block_listeners(old_route, new_route)
+
         merged = self.attempt_merge()
 
         if merged > 0:
             logger.debug(f'Merged {merged} blocks.')
         
+        if tip_changed:
+            self.notify_tip_listeners(self.get_tophash())
 
         return validity
     
@@ -327,13 +596,14 @@ class Chain:
 
             return merge_count
 
+        # Balanced root, nothing to merge yet
+        if merge_count == 0: return 0
+
         self.update_utxoset_from_fork(current.parent)
         self.forks = current
         logger.info(f'New fork root: {data_hexdigest(self.forks.block.hash_sha256())}')
-        self.forks.parent = None
-
-        self.forks.regenerate_heights()
-        self.forks.regenerate_cache()
+        # Prunes the dropped branches from the hash cache, the rest of the tree is kept as is
+        self.forks.make_root()
         
         # Update the established difficulty
 
@@ -349,17 +619,69 @@ class Chain:
 
             self.difficulty = newdiff
 
-        # Try to save block to the block store, should match the blocks per file ideally
-        while len(self.blocks) > self.settings.blocks_per_store_file and not self.settings.debug_dont_save and not self._temporary_data_mode:
-            chunk_size = self.settings.blocks_per_store_file - (self.block_store.height % self.settings.blocks_per_store_file)
+        # Store the established blocks in batches, the UTXO set is saved along with them
+        if len(self.blocks) > self.settings.blocks_per_store_file and not self.settings.debug_dont_save and not self._temporary_data_mode:
+            self.store_established()
+
+        return merge_count
+
+    def store_established(self) -> bool:
+        '''
+        Move all the established blocks to the block store, then write the UTXO set changes.
+        The UTXO set is only saved together with the blocks it covers, and after them, so after
+        a crash it can't be ahead of the block store (see sync_utxoset_with_store)
 
-            logger.debug(f'Permanently storing {chunk_size} blocks.')
+        Return:
+            bool: Whether both were saved
+        '''
 
-            self.block_store.store_blocks(self.blocks[:chunk_size])
+        logger.debug(f'Permanently storing {len(self.blocks)} blocks.')
 
-            self.blocks = self.blocks[chunk_size:]
+        if not self.block_store.store_blocks(self.blocks):
+            logger.critical('Unable to store the established blocks')
+            return False
 
-        return merge_count
+        self.blocks.clear()
+
+        # Only the outputs spent & created since the last save are written
+        self.utxo_set.currently_scanned_height = self.block_store.height
+
+        return self.utxo_set.save_utxos()
+
+    def sync_utxoset_with_store(self) -> bool:
+        '''
+        Bring the loaded UTXO set to the height of the block store. Blocks stored after the
+        last UTXO save (crash in between) are applied again. A set that is ahead of the
+        store can't be rolled back, so it is rebuilt from the stored blocks
+
+        Return:
+            bool: Whether the UTXO set matches the block store
+        '''
+
+        utxo_height = self.utxo_set.currently_scanned_height
+
+        if utxo_height == self.block_store.height: return True
+
+        if utxo_height > self.block_store.height:
+            logger.critical(f'UTXO set at height {utxo_height} is ahead of the block store ({self.block_store.height}), rebuilding it')
+
+            if not self.utxo_set.clear(): return False
+
+            utxo_height = 0
+
+        start_height = max(utxo_height, 0) + 1
+
+        logger.warning(f'Applying stored blocks {start_height} to {self.block_store.height} to the UTXO set')
+
+        for height in range(start_height, self.block_store.height + 1, ITER_BLOCKS_STORE_CHUNK):
+            for blk in self.block_store.get_blocks(height, ITER_BLOCKS_STORE_CHUNK):
+                self.update_utxoset_from_fork(ForkBlock(None, blk))
+
+        self.utxo_set.currently_scanned_height = self.block_store.height
+
+        if self.settings.debug_dont_save: return True
+
+        return self.utxo_set.save_utxos()
 
     def merge_all(self) -> int:
         '''
@@ -451,23 +773,73 @@ class Chain:
             return self.blocks[index]
         
         if fork is None and not get_top_fork: return None
-        
-        used_fork: ForkBlock | None = None
 
-        if fork is not None:
-            used_fork = fork
-            route = used_fork.get_block_route()
-        elif get_top_fork:
-            used_fork, route = self.get_longest_fork()
-        
-        if used_fork is None or len(route) == 0: return None
+        if fork is None:
+            fork = self.forks.best_tip if self.forks is not None else None
 
-        index = target_height - self.get_established_height() - 1
-        
-        if index >= len(route): return None
+        if fork is None: return None
+
+        depth = target_height - self.get_established_height()
+
+        # The longest fork's route is cached, any other fork is walked up from without building it
+        if self.forks is not None and fork is self.forks.best_tip:
+            return self.forks.best_route[depth - 1] if depth <= len(self.forks.best_route) else None
+
+        node = fork.get_ancestor(depth)
+
+        return node.block if node is not None else None
+
+    def iter_blocks(self, start_height: int, count: int,
+                    fork: ForkBlock | None = None,
+                    get_top_fork: bool = False) -> Iterator[Block]:
+        '''
+        Iterate over a contiguous span of blocks, going through the block store, the established
+        blocks and the fork route in turn. Stored blocks are read in bulk
+
+        Args:
+            start_height (int): Height of the first block
+            count (int): Max count of blocks
+            fork (ForkBlock | None): Fork to continue into after the established blocks, None to not use a fork
+            get_top_fork (bool): Continue into the longest fork if no fork is given
+        Returns:
+            Iterator[Block]: The blocks in order of height, stops early where the chain ends
+        '''
+
+        height = max(start_height, 1)
+        end_height = start_height + count - 1
+
+        # Read from the store in chunks, so a huge span doesn't load everything at once
+        while height <= min(end_height, self.block_store.height):
+            chunk_size = min(end_height, self.block_store.height) - height + 1
+            chunk = self.block_store.get_blocks(height, min(chunk_size, ITER_BLOCKS_STORE_CHUNK))
 
-        return route[index]
+            if len(chunk) == 0: return
 
+            yield from chunk
+            height += len(chunk)
+
+        if height > end_height: return
+
+        established_height = self.get_established_height()
+
+        if height <= established_height:
+            start_index = height - self.block_store.height - 1
+            end_index = min(end_height, established_height) - self.block_store.height
+
+            yield from self.blocks[start_index:end_index]
+            height += end_index - start_index
+
+        if height > end_height: return
+
+        if fork is None and get_top_fork and self.forks is not None:
+            fork = self.forks.best_tip
+
+        if fork is None: return
+
+        # Built once for the whole span, the longest fork's route is already cached
+        route = self.forks.best_route if self.forks is not None and fork is self.forks.best_tip else fork.get_block_route()
+
+        yield from route[height - established_height - 1:end_height - established_height]
 
     def get_height(self) -> int:
         '''
@@ -569,9 +941,7 @@ class Chain:
             return self.difficulty
         
 
-        route: List[Block] = forkblock.get_block_route()
-        route_len: int = len(route)
-        fork_height: int = self.get_established_height() + route_len
+        fork_height: int = self.get_established_height() + forkblock.depth
 
         established_chunk = (self.get_established_height() - 1) // self.settings.difficulty_adjustment
 
@@ -593,7 +963,7 @@ class Chain:
             int: Difficulty bits
         '''
         
-        return self.get_difficulty(self.get_longest_fork()[0])
+        return self.get_difficulty(self.forks.best_tip if self.forks is not None else None)
     
     def get_established_difficulty(self):
         return self.difficulty
@@ -601,7 +971,8 @@ class Chain:
     def get_longest_fork(self) -> Tuple[ForkBlock | None, List[Block]]:
         '''
         Returns the current longest fork, including the fork's leaf
-        and the block route towards it
+        and the block route towards it. Both are cached in the fork tree
+        NOTE: The route is shared, don't modify it
 
         Returns:
             Tuple[ForkBlock, List[Block]]: Leaf and the route
@@ -610,18 +981,8 @@ class Chain:
         if self.forks is None:
             return (None, [])
 
-        cur: ForkBlock | None = self.forks
-
-        while cur is not None and not len(cur.next) == 0:
-            cur = cur.get_tallest_subtree()
-        
-        if cur is None:
-            logger.critical('This error should never logically happen')
-            return (None, [])
-
-        route: List[Block] = cur.get_block_route()
-
-        return (cur, route)
+        # Kept up to date by the fork tree as blocks are appended
+        return self.forks.get_best_tip()
 
     def get_tophash(self) -> bytes:
         '''
@@ -633,9 +994,6 @@ class Chain:
 
         '''
         
-        # This is horrendously inefficient, needs caching of the top hash when the block
-        # is added
-
         if self.forks is None:
             # Will return the top hash of the blocks list in there is no active fork
 
@@ -645,12 +1003,7 @@ class Chain:
 
             return self.blocks[-1].hash_sha256() if len(self.blocks) > 0 else b'\x00'*32
         
-        current: ForkBlock = self.forks 
-
-        while not len(current.next) == 0:
-            current = current.get_tallest_subtree()
-
-        return current.block.hash_sha256()
+        return self.forks.best_tip.block.hash_sha256()
     
     def check_tophash_exists(self, block_hash: bytes) -> bool:
         '''
@@ -701,7 +1054,14 @@ class Chain:
         else:
             logger.warning('Temporary mode disabled.')
 
+            # The journal was paused, so TXs that left the mempool in the meantime (ie confirmed by
+            # synced blocks) are still on disk. A fresh snapshot drops them there too
+            if self._temporary_data_mode and not self.settings.debug_dont_save:
+                self.memory_pool.journal_paused = False
+                self.memory_pool.save_mempool()
+
         self._temporary_data_mode = value
+        self.memory_pool.journal_paused = value
 
     def wipe_temporary_data(self) -> None:
         '''
@@ -710,26 +1070,24 @@ class Chain:
         logger.debug('Wiping temporary data')
 
         self.blocks.clear()
-        self.utxo_set.load_utxos() # Reload previous stored state
+        self.utxo_set.load_utxos() # Drop the unsaved changes, back to the stored state
         self.memory_pool.load_mempool()
 
     def save(self) -> None:
         '''
         To be executed before exiting. This stores all established blocks in the storage
-        Also saves the UTXO set and (in the future TODO) MemPool
+        Also saves the UTXO set and a MemPool snapshot, and stops the signature verification workers
         '''
         
         if self._temporary_data_mode:
             logger.error('Cannot save while temporary mode is enabled.')
             return
 
+        # Started again if signatures are verified in bulk after this
+        self.signature_verifier.close()
+
         if self.settings.debug_dont_save: return
 
         logger.debug('Saving data.')
-        self.block_store.store_blocks(self.blocks)
-        self.blocks.clear()
-        
-        logger.debug(f'Saved {len(self.blocks)} to block store')
-
-        self.utxo_set.save_utxos()
+        self.store_established()
         self.memory_pool.save_mempool()
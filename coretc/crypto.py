@@ -1,8 +1,28 @@
 
+from hashlib import sha256
+from typing import Tuple
+
 from Crypto.PublicKey import ECC
 from Crypto.Signature import DSS
+from Crypto.Signature.DSS import DssSigScheme
 from Crypto.Hash import SHA256
 
+from coretc.utils.cache import LRUCache
+
+# Max count of verified signatures remembered, so a TX checked when it entered the
+# mempool is not checked again when it shows up in a block (or in every fork containing it)
+SIGNATURE_CACHE_SIZE = 200000
+
+# Only valid signatures are stored, keyed by a digest of (pubkey, signed data, signature)
+signature_cache: LRUCache = LRUCache(SIGNATURE_CACHE_SIZE)
+
+# Max count of parsed public keys kept, the same few addresses show up in most inputs
+PUBLIC_KEY_CACHE_SIZE = 4096
+
+# DER bytes -> (parsed key, DSS verifier). Verifying does not modify the DSS object
+# so one per key is reused, even by different threads
+public_key_cache: LRUCache = LRUCache(PUBLIC_KEY_CACHE_SIZE)
+
 def data_sign(priv: ECC.EccKey, data: bytes) -> bytes | None:
     '''
     Sign a byte array with an ECDSA private key
@@ -45,3 +65,106 @@ def data_verify(pub: ECC.EccKey, data: bytes, signature: bytes) -> bool:
         return True
     except BaseException:
         return False
+
+def get_public_key_entry(owner_pk: bytes) -> Tuple[ECC.EccKey, DssSigScheme] | None:
+
+    entry = public_key_cache.get(owner_pk)
+
+    if entry is not None: return entry
+
+    try:
+        pub = ECC.import_key(owner_pk)
+    except (ValueError, IndexError, TypeError):
+        return None
+
+    entry = (pub, DSS.new(pub, mode = 'fips-186-3'))
+    public_key_cache.put(owner_pk, entry)
+
+    return entry
+
+def import_public_key(owner_pk: bytes) -> ECC.EccKey | None:
+    '''
+    Parse a DER public key, the same key bytes are only parsed once while they stay in the key cache
+
+    Args:
+        owner_pk (bytes): DER public key
+    Return:
+        ECC.EccKey: The parsed key
+        None: If the key is malformed
+    '''
+
+    entry = get_public_key_entry(owner_pk)
+
+    return entry[0] if entry is not None else None
+
+def data_verify_pk(owner_pk: bytes, data: bytes, signature: bytes) -> bool:
+    '''
+    Same as data_verify but takes the public key in DER form, using the cached key & verifier
+
+    Args:
+        owner_pk (bytes): DER public key
+        data (bytes): The data of which's signature will be tested
+        signature (bytes): The signature of said data
+
+    Return:
+        bool: Whether the signature was valid, False for malformed keys too
+    '''
+
+    entry = get_public_key_entry(owner_pk)
+
+    if entry is None: return False
+
+    try:
+        entry[1].verify(SHA256.new(data), signature)
+        return True
+    except BaseException:
+        return False
+
+def get_public_key_cache_stats() -> dict:
+    '''
+    Return:
+        dict: Size and hit/miss counters of the public key cache
+    '''
+
+    return public_key_cache.get_stats()
+
+def get_signature_cache_key(owner_pk: bytes, data: bytes, signature: bytes) -> bytes:
+    '''
+    Digest of everything that makes a signature check, smaller to keep around than the 3 fields.
+    The lengths are included so different splits of the same bytes can't collide
+    '''
+
+    return sha256(
+        len(owner_pk).to_bytes(2, 'big') + owner_pk +
+        len(data).to_bytes(2, 'big') + data +
+        signature
+    ).digest()
+
+def is_signature_cached(owner_pk: bytes, data: bytes, signature: bytes) -> bool:
+    '''
+    Check if a signature has already been verified as valid
+
+    Args:
+        owner_pk (bytes): DER public key
+        data (bytes): The signed data
+        signature (bytes): The signature
+    Return:
+        bool: Whether it is in the signature cache
+    '''
+
+    return signature_cache.get(get_signature_cache_key(owner_pk, data, signature), False)
+
+def cache_valid_signature(owner_pk: bytes, data: bytes, signature: bytes) -> None:
+    '''
+    Remember a signature that was verified as valid
+    '''
+
+    signature_cache.put(get_signature_cache_key(owner_pk, data, signature), True)
+
+def get_signature_cache_stats() -> dict:
+    '''
+    Return:
+        dict: Size and hit/miss counters of the signature cache
+    '''
+
+    return signature_cache.get_stats()
@@ -1,5 +1,6 @@
 
-from typing import List, Tuple, Optional
+from typing import Iterator, List, Tuple, Optional
+from collections import ChainMap
 from binascii import hexlify
 from copy import deepcopy
 
@@ -16,33 +17,178 @@ import logging
 
 logger = logging.getLogger('tc-core')
 
+Outpoint = Tuple[bytes, int]
+
+class TreeAnchor:
+    '''
+    Shared by all the nodes of a fork tree, holds what changes for every node when the tree
+    is re-rooted. Updating it here keeps re-rooting from having to visit the whole tree
+    '''
+
+    def __init__(self, root: 'ForkBlock', root_depth: int = 0):
+        self.root: ForkBlock = root
+        self.root_depth: int = root_depth # abs_depth of the root
+
 class ForkBlock:
     def __init__(self, parent, blk: Block) -> None:
         self.parent: ForkBlock | None = parent
         self.block:  Block = blk
         self.next:   List[ForkBlock] = []
         
-        self.utxos_added: List[UTXO] = []
-        self.utxos_used:  List[UTXO] = []
+        # UTXOs spent & created by this block alone, by outpoint
+        self.utxos_added: dict[Outpoint, UTXO] = {}
+        self.utxos_used:  dict[Outpoint, UTXO] = {}
 
         # Note: need to do height recalculation as well as hash cache recalculation 
         self.height: int = 0 # The height of the subtree with this ForkBlock as it's root
 
         # This is only changed for the root node
         self.hash_cache: dict[bytes, ForkBlock] = {}
+
+        self.anchor: TreeAnchor = TreeAnchor(self) if parent is None else parent.anchor
+        self.abs_depth: int = 0 if parent is None else parent.abs_depth + 1 # Counted from the tree's first root
+
+        # Tip of the longest fork & the route to it, like the hash cache only kept on the root node.
+        # The route list is replaced, never modified, so routes handed out before stay as they were
+        self.best_tip: ForkBlock = self
+        self.best_route: List[Block] = [blk]
         
         # Store used and new utxos from the block
         for transaction in self.block.transactions:
-            self.utxos_used.extend(deepcopy(transaction.inputs))
+            for used in deepcopy(transaction.inputs):
+                self.utxos_used[used.get_outpoint()] = used
             
             tx_outputs_initial = deepcopy(transaction.outputs)
 
             for output in tx_outputs_initial:
                 output.txid = transaction.get_txid()
+                self.utxos_added[output.get_outpoint()] = output
 
-            self.utxos_added.extend(tx_outputs_initial)
+        # Everything spent & created from the root up to and including this block. Layered over
+        # the parent's maps, so a lookup is one dict probe per fork level instead of a walk
+        self.fork_used:  ChainMap = ChainMap()
+        self.fork_added: ChainMap = ChainMap()
+
+        self.link_overlay()
+
+    @property
+    def root(self) -> 'ForkBlock':
+        return self.anchor.root
+
+    @property
+    def depth(self) -> int:
+        '''
+        Length of the route from the root to this node
+        '''
+
+        return self.abs_depth - self.anchor.root_depth + 1
+
+    def link_overlay(self) -> None:
+        '''
+        (Re)build the cumulative UTXO maps on top of the parent's.
+        The parent's maps can still have layers of blocks merged since it was made, those
+        come after the first depth layers (they were emptied when pruned) and are left out
+        '''
+
+        if self.parent is None:
+            self.fork_used  = ChainMap(self.utxos_used)
+            self.fork_added = ChainMap(self.utxos_added)
+        else:
+            live = self.parent.depth
+
+            self.fork_used  = ChainMap(self.utxos_used, *self.parent.fork_used.maps[:live])
+            self.fork_added = ChainMap(self.utxos_added, *self.parent.fork_added.maps[:live])
+
+    def make_root(self) -> None:
+        '''
+        Detach the node from it's parent so it becomes the root of the fork tree.
+        The old root's hash cache is taken over, minus the ancestors & the branches that
+        are dropped with them. Only the dropped part of the tree is visited, the depths of the
+        kept nodes follow the tree anchor and subtree heights don't depend on what's above
+        '''
+
+        old_root = self.root
+
+        if old_root is self: return
+
+        self.hash_cache = old_root.hash_cache
+        old_root.hash_cache = {}
+
+        self.prune_ancestors()
+
+        self.parent = None
+        self.anchor.root = self
+        self.anchor.root_depth = self.abs_depth
+
+        self.link_overlay()
+
+        # The longest fork normally runs through the new root, then only the dropped start of the route changes
+        if old_root.best_tip.anchor is self.anchor:
+            self.best_tip = old_root.best_tip
+            self.best_route = old_root.best_route[-self.best_tip.depth:]
+        else:
+            self.refresh_best_tip()
+
+    def prune_ancestors(self) -> None:
+        '''
+        Drop the ancestors of the node and their other branches from the hash cache (of this node).
+        The dropped nodes get an anchor of their own. The UTXO layers of the ancestors are emptied,
+        their changes are in the UTXO set by now, which takes them out of the maps of every node below
+        '''
+
+        node: ForkBlock = self
+        ancestors: List[ForkBlock] = []
+        pruned: List[ForkBlock] = []
+
+        while node.parent is not None:
+            parent = node.parent
+
+            ancestors.append(parent)
+            pruned.extend(sibling for sibling in parent.next if sibling is not node)
+
+            node = parent
+
+        if len(ancestors) == 0: return
+
+        dropped = TreeAnchor(ancestors[-1], self.anchor.root_depth)
+
+        for node in ancestors:
+            self.hash_cache.pop(node.block.hash_sha256(), None)
+
+            node.anchor = dropped
+            node.utxos_used.clear()
+            node.utxos_added.clear()
+
+        while len(pruned) > 0:
+            node = pruned.pop()
+
+            self.hash_cache.pop(node.block.hash_sha256(), None)
+
+            node.anchor = dropped
+            pruned.extend(node.next)
+
+    def is_utxo_spent(self, outpoint: Outpoint) -> bool:
+        '''
+        Check if an outpoint has been spent in the fork, from the root up to this node
+
+        Return:
+            bool: Whether it was spent
+        '''
+
+        return outpoint in self.fork_used
+
+    def get_fork_utxo(self, outpoint: Outpoint) -> UTXO | None:
+        '''
+        Get an output created in the fork (up to this node) that has not been spent in it
+
+        Return:
+            UTXO | None: The output or None if it was not created in the fork or is spent
+        '''
+
+        if outpoint in self.fork_used: return None
+
+        return self.fork_added.get(outpoint)
 
-    
     def append_block(self, new_block: Block):
         '''
         Create a new ForkBlock and add it to the next List, returns a reference to the new object
@@ -57,20 +203,78 @@ class ForkBlock:
         # Create the new forkblock object to use
         new_fb: ForkBlock = ForkBlock(self, new_block)
         
-        # Increment the height of all parent nodes if this is now the heighest leaf node of the subtree
-        if len(self.next) == 0:
-            
-            cur: ForkBlock | None = self
-            
-            while cur is not None:
-                cur.height += 1
-                cur = cur.parent
-    
+        # Raise the height of the parent nodes for which this is now the heighest leaf of their subtree,
+        # stopping at the first one that already has a taller branch
+        child: ForkBlock = new_fb
+        cur: ForkBlock | None = self
+
+        while cur is not None and cur.height < child.height + 1:
+            cur.height = child.height + 1
+            child, cur = cur, cur.parent
 
         self.next.append(new_fb)
 
+        self.root.update_best_tip(new_fb)
+
         return new_fb
 
+    def update_best_tip(self, node: 'ForkBlock') -> None:
+        '''
+        Called on the root when a node is appended, moves the best tip to it if it's now the longest fork.
+        Picks the same tip as walking down the tallest subtrees would, on ties the later appended branch
+
+        Args:
+            node (ForkBlock): The new node
+        '''
+
+        best = self.best_tip
+
+        if node.depth < best.depth: return
+
+        if node.depth == best.depth:
+            a, b = node, best
+
+            # Both at the same depth, go up to where the branches split
+            while a.parent is not b.parent:
+                a, b = a.parent, b.parent
+
+            if a.parent is None or a.parent.next.index(a) < a.parent.next.index(b): return
+
+        if node.parent is best:
+            self.best_route = self.best_route + [node.block]
+        else:
+            self.best_route = node.get_block_route()
+
+        self.best_tip = node
+
+    def refresh_best_tip(self) -> None:
+        '''
+        Find the best tip from scratch by walking down the tallest subtrees, only needed on the root
+        after the tree was changed by other means than append_block
+        '''
+
+        current: ForkBlock = self
+
+        while len(current.next) > 0:
+            tallest = current.get_tallest_subtree()
+
+            if tallest is None: break
+            current = tallest
+
+        self.best_tip = current
+        self.best_route = current.get_block_route()
+
+    def get_best_tip(self) -> Tuple['ForkBlock', List[Block]]:
+        '''
+        Get the tip of the longest fork and the route to it. O(1), only valid on the root node
+        NOTE: The route is shared, don't modify it
+
+        Return:
+            Tuple[ForkBlock, List[Block]]: Tip and the block route from the root to it
+        '''
+
+        return (self.best_tip, self.best_route)
+
     def block_hash_exists(self, block_hash: bytes) -> bool:
         '''
         Given a Block's hash, check if it exists in the hash cache of the fork tree
@@ -135,23 +339,34 @@ class ForkBlock:
 
         return blocks
 
-    def get_block_route_len(self) -> int:
+    def get_ancestor(self, depth: int) -> Optional['ForkBlock']:
         '''
-        Return the number of total blocks reaching this fork node
+        Get the node of this node's route at a given depth, walking up without building the route
 
+        Args:
+            depth (int): Depth of the node, 1 for the root
         Return:
-            int: Length of this fork
+            ForkBlock | None: The node or None if the depth is not on the route
         '''
 
-        length: int = 0
+        if depth < 1 or depth > self.depth: return None
 
-        current: ForkBlock | None = self
+        current: ForkBlock = self
 
-        while current is not None:
-            length += 1
+        while current.depth > depth and current.parent is not None:
             current = current.parent
 
-        return length
+        return current
+
+    def get_block_route_len(self) -> int:
+        '''
+        Return the number of total blocks reaching this fork node
+
+        Return:
+            int: Length of this fork
+        '''
+
+        return self.depth
 
     def get_children_count(self) -> int:
         '''
@@ -245,80 +460,57 @@ class ForkBlock:
     
     def get_fork_utxoset(self) -> Tuple[List[UTXO], List[UTXO]]:
         '''
-        Iterates to it's parent until None and returns a final list of 
-        UTXOs in the current fork that have been used and created in the form of a Tuple
-        (Note: This is a bit dirty but it should work)
+        Get the UTXOs in the current fork (root up to this node) that have been used and
+        created in the form of a Tuple. Outputs both created & spent in the fork are in neither
 
         Return:
             Tuple[List[UTXO], List[UTXO]]: 2 Lists one of the UTXOs used and one with the ones added
         '''
-        
-        # TODO: High possibility of a bug being here, do unit tests
 
-        result_used:  List[UTXO] = list()
-        result_added: List[UTXO] = list()
+        result_used  = [utxo for outpoint, utxo in self.fork_used.items() if outpoint not in self.fork_added]
+        result_added = [utxo for outpoint, utxo in self.fork_added.items() if outpoint not in self.fork_used]
 
-        cur: ForkBlock | None = self
-        
-        #route: List[UTXO] = self.get_block_route()
+        return (result_used, result_added)
 
-        while cur is not None:
-            
-            for used in cur.utxos_used:
-                result_used.append(used)
+    def iterate_subtree(self) -> Iterator['ForkBlock']:
+        '''
+        Iterate over the nodes of the subtree, parents before their children. Not recursive,
+        so deep forks can't hit the recursion limit
+        '''
 
-            for added in cur.utxos_added:
+        stack: List[ForkBlock] = [self]
 
-                # In case where a UTXO is created inside the fork and used
-                if added in result_used:
-                    result_used.remove(added)
-                    continue
+        while len(stack) > 0:
+            node = stack.pop()
+            yield node
 
-                result_added.append(added)
-            
-            #print(len(result_used), len(result_added))
-            cur = cur.parent
-        
-        return (result_used, result_added)
+            stack.extend(reversed(node.next))
 
-    def regenerate_cache(self, start: bool = True) -> dict:
+    def regenerate_cache(self) -> dict:
         '''
-        Create the hash_cache dict 
-        Will improve in the future
+        Rebuild the hash_cache dict from scratch. Only needed if the tree was changed by hand,
+        re-rooting with make_root keeps the cache up to date
         '''
         
-        if start:
-            logger.info('Regenerating hash cache of fork tree')
-
-        cache = {
-            self.block.hash_sha256(): self
-        }
-
-        for blk in self.next:
-            cache.update(blk.regenerate_cache(start = False))
+        logger.info('Regenerating hash cache of fork tree')
 
-        if start:
-            del self.hash_cache
-            self.hash_cache = cache
+        self.hash_cache = {node.block.hash_sha256(): node for node in self.iterate_subtree()}
 
-        return cache
+        return self.hash_cache
     
-    def regenerate_heights(self, start: bool = True) -> int:
+    def regenerate_heights(self) -> int:
         '''
-        Recursive function that set's every forkblock's height
+        Set every forkblock's height from scratch, children are done before their parents
 
         Return:
             int: The whole subtree's height
         '''
 
-        if start:
-            logger.info('Recalculating heights in fork tree')
+        logger.info('Recalculating heights in fork tree')
 
-        if len(self.next) == 0:
-            self.height = 0
-            return 0
+        for node in reversed(list(self.iterate_subtree())):
+            node.height = max([child.height + 1 for child in node.next], default = 0)
 
-        self.height = max( [blk.regenerate_heights(start = False) for blk in self.next] ) + 1
         return self.height
 
     def _rich_get_tree(self, tree: Tree | None = None) -> Tree:
@@ -1,34 +1,350 @@
-
-from typing import List, MutableMapping
-import logging, json
+from typing import BinaryIO, Callable, List, MutableMapping, Optional, Tuple
+from dataclasses import dataclass, field
+import logging, heapq, itertools, os, struct
 
 from os.path import exists as fileExists
 from os.path import isdir as isDirectory
 
 from coretc import TX
+from coretc.blocks import Block
 from coretc.utils.generic import load_json_from_file
+from coretc.utils.list_utils import compact_lazy_heap
 
 logger = logging.getLogger('tc-core')
 
+Outpoint = Tuple[bytes, int]
+
+# Snapshot: magic, format version, entry count | entries
+# Entry: timestamp, TX record length | TX binary record
+MEMPOOL_MAGIC = b'TCMP'
+MEMPOOL_FORMAT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<4sBI')
+ENTRY_HEADER = struct.Struct('<QI')
+
+# Journal records: op | entry (add) or txid (remove)
+JOURNAL_ADD = 1
+JOURNAL_REMOVE = 2
+
+# Once the journal grows past this a new snapshot is written and the journal restarts
+JOURNAL_COMPACT_SIZE = 32 * 1024 * 1024
+
+@dataclass
+class MemPoolEntry:
+    transaction: TX
+    timestamp: int
+
+    txid: bytes         = b''
+    size: int           = 0
+    fee: float          = 0.
+    fee_rate: float     = 0.
+
+    outpoints: List[Outpoint] = field(default_factory = list)
+
+    @staticmethod
+    def create(transaction: TX, timestamp: int) -> 'MemPoolEntry':
+        '''
+        Create an entry, the derived fields are calculated once here
+        '''
+
+        size = transaction.get_size()
+        fee = transaction.transaction_fee()
+
+        return MemPoolEntry(
+            transaction = transaction,
+            timestamp   = timestamp,
+            txid        = transaction.get_txid(),
+            size        = size,
+            fee         = fee,
+            fee_rate    = fee / size,
+            outpoints   = [utxo.get_outpoint() for utxo in transaction.inputs]
+        )
+
 class MemPool:
-    def __init__(self, mempool_file: str):
+    '''
+    Pool of unconfirmed transactions. Indexed by txid, by the outpoints the
+    transactions spend (so conflicts are found without a scan) and by fee rate,
+    which is used to evict the cheapest transactions once the pool is full
+    '''
+
+    def __init__(self, mempool_file: str, max_transactions: int = 0, max_size: int = 0):
+        '''
+        Args:
+            mempool_file (str): Where the mempool is stored
+            max_transactions (int): Max count of transactions, 0 for no limit
+            max_size (int): Max total size of the transactions in bytes, 0 for no limit
+        '''
 
         self.mempool_file = mempool_file
 
-        # TX -> Timestamp
-        self.mempool: MutableMapping[TX, int] = {}
+        self.max_transactions: int = max_transactions
+        self.max_size: int = max_size
+
+        # txid -> Entry
+        self.entries: MutableMapping[bytes, MemPoolEntry] = {}
+
+        # Spent outpoint -> txid of the mempool TX spending it
+        self.spent_outpoints: MutableMapping[Outpoint, bytes] = {}
+
+        # (fee rate, insertion order, txid), lowest first. Removed entries are skipped lazily
+        self.fee_heap: List[Tuple[float, int, bytes]] = []
+        self.sequence: int = 0
+
+        self.total_size: int = 0
+
+        # Called with the TX and whether it was added or removed
+        self.tx_listeners: List[Callable[[TX, bool], None]] = []
+
+        # Append-only log of the changes since the last snapshot, only written once opened
+        self.journal_file: str = mempool_file + '.journal'
+        self.journal: BinaryIO | None = None
+        self.journal_paused: bool = False
+        self.journal_size: int = 0
+
+    def add_tx_listener(self, listener: Callable[[TX, bool], None]) -> None:
+        '''
+        Register a function to be called when a transaction enters or leaves the mempool
+
+        Args:
+            listener (Callable[[TX, bool], None]): Gets the TX and True if it was added, False if removed
+        '''
+
+        if listener not in self.tx_listeners:
+            self.tx_listeners.append(listener)
+
+    def remove_tx_listener(self, listener: Callable[[TX, bool], None]) -> None:
+
+        if listener in self.tx_listeners:
+            self.tx_listeners.remove(listener)
+
+    def notify_tx_listeners(self, transaction: TX, added: bool) -> None:
+
+        for listener in list(self.tx_listeners):
+            listener(transaction, added)
+
+    def get_transactions(self) -> List[TX]:
+        return [entry.transaction for entry in self.entries.values()]
+
+    def get_entries(self, offset: int = 0, count: int | None = None) -> List[MemPoolEntry]:
+        '''
+        Get a page of the entries, in the order they were added
+
+        Args:
+            offset (int): Entries to skip (DEFAULT=0)
+            count (int | None): Max entries returned, None for all of them (DEFAULT=None)
+        Returns:
+            List[MemPoolEntry]: The entries
+        '''
+
+        stop = None if count is None else offset + count
+
+        return list(itertools.islice(self.entries.values(), offset, stop))
+
+    def get_entry(self, txid: bytes) -> Optional[MemPoolEntry]:
+        return self.entries.get(txid)
+
+    def get_transaction(self, txid: bytes) -> Optional[TX]:
+
+        entry = self.entries.get(txid)
+
+        return entry.transaction if entry is not None else None
+
+    def has_transaction(self, txid: bytes) -> bool:
+        return txid in self.entries
+
+    def get_spender(self, outpoint: Outpoint) -> Optional[bytes]:
+        '''
+        Get the txid of the mempool transaction spending an outpoint
+
+        Args:
+            outpoint (Outpoint): (txid, index) of the spent output
+        Returns:
+            bytes | None: Spending txid or None if no mempool TX spends it
+        '''
+
+        return self.spent_outpoints.get(outpoint)
+
+    def get_conflicts(self, transaction: TX) -> List[bytes]:
+        '''
+        Get the mempool transactions that spend any of the inputs of a transaction
+
+        Args:
+            transaction (TX): Transaction to check
+        Returns:
+            List[bytes]: txids of the conflicting transactions
+        '''
+
+        conflicts: List[bytes] = []
+
+        for utxo in transaction.inputs:
+            spender = self.spent_outpoints.get(utxo.get_outpoint())
+
+            if spender is not None and spender not in conflicts:
+                conflicts.append(spender)
+
+        return conflicts
+
+    def is_full(self) -> bool:
+
+        if self.max_transactions > 0 and len(self.entries) >= self.max_transactions: return True
+        if self.max_size > 0 and self.total_size >= self.max_size: return True
+
+        return False
+
+    def get_lowest_entry(self) -> Optional[MemPoolEntry]:
+        '''
+        Get the entry with the lowest fee rate, also drops removed entries from the top of the heap
+        '''
+
+        while len(self.fee_heap) > 0:
+            txid = self.fee_heap[0][2]
+
+            if txid in self.entries:
+                return self.entries[txid]
+
+            heapq.heappop(self.fee_heap)
+
+        return None
 
     def load_mempool(self) -> bool:
         '''
-        Load the mempool from storage
+        Load the mempool from it's snapshot and replay the journal on top. The
+        transactions are trusted, they were validated before being stored.
+        Falls back to the old JSON format if the file is not a binary snapshot
 
         Returns:
             bool: Whether loading was successful
         '''
         logger.info(f'Loading MemPool from {self.mempool_file}')
 
-        self.mempool.clear()
-        
+        self.clear()
+
+        # Nothing loaded is journaled again
+        was_paused = self.journal_paused
+        self.journal_paused = True
+
+        try:
+            return self.load_stored_data()
+        finally:
+            self.journal_paused = was_paused
+
+    def load_stored_data(self) -> bool:
+
+        if fileExists(self.mempool_file):
+            with open(self.mempool_file, 'rb') as f:
+                data = f.read()
+
+            if data[:len(MEMPOOL_MAGIC)] == MEMPOOL_MAGIC:
+                loaded = self.load_snapshot(data)
+            else:
+                loaded = self.load_legacy_json()
+
+            if not loaded:
+                self.clear()
+                return False
+
+        if fileExists(self.journal_file):
+            with open(self.journal_file, 'rb') as f:
+                self.replay_journal(f.read())
+
+        logger.debug(f'Loaded {len(self.entries)} TXs from MemPool file.')
+        return True
+
+    def load_snapshot(self, data: bytes) -> bool:
+        '''
+        Load the entries of a binary snapshot
+
+        Args:
+            data (bytes): Snapshot file contents
+        Returns:
+            bool: Whether the snapshot was valid
+        '''
+
+        try:
+            _, version, count = SNAPSHOT_HEADER.unpack_from(data, 0)
+            offset = SNAPSHOT_HEADER.size
+
+            if not version == MEMPOOL_FORMAT_VERSION:
+                logger.critical(f'Unsupported MemPool snapshot version {version}')
+                return False
+
+            for _ in range(count):
+                timestamp, transaction, offset = self.read_entry(data, offset)
+                self.add_transaction(timestamp, transaction)
+
+        except (struct.error, ValueError, IndexError):
+            logger.critical('Malformed MemPool snapshot!')
+            return False
+
+        return True
+
+    def read_entry(self, data: bytes, offset: int) -> Tuple[int, TX, int]:
+        '''
+        Parse an entry of the snapshot or journal. Raises on malformed data
+
+        Returns:
+            Tuple[int, TX, int]: Timestamp, transaction and the offset after the entry
+        '''
+
+        timestamp, length = ENTRY_HEADER.unpack_from(data, offset)
+        offset += ENTRY_HEADER.size
+
+        if offset + length > len(data):
+            raise ValueError('MemPool entry exceeds the buffer')
+
+        transaction, end = TX.read_bytes(data, offset)
+
+        if not end == offset + length:
+            raise ValueError('MemPool entry length mismatch')
+
+        return timestamp, transaction, end
+
+    def replay_journal(self, data: bytes) -> int:
+        '''
+        Apply the journal records in order. A truncated last record (eg. from a crash) is ignored
+
+        Args:
+            data (bytes): Journal file contents
+        Returns:
+            int: Count of records applied
+        '''
+
+        offset = 0
+        applied = 0
+
+        try:
+            while offset < len(data):
+                op = data[offset]
+                offset += 1
+
+                if op == JOURNAL_ADD:
+                    timestamp, transaction, offset = self.read_entry(data, offset)
+                    self.add_transaction(timestamp, transaction)
+
+                elif op == JOURNAL_REMOVE:
+                    if offset + 32 > len(data): break
+
+                    self.remove_transaction(data[offset:offset + 32])
+                    offset += 32
+
+                else:
+                    logger.error('Unknown MemPool journal record')
+                    break
+
+                applied += 1
+
+        except (struct.error, ValueError, IndexError):
+            logger.warning('MemPool journal ends with an incomplete record')
+
+        return applied
+
+    def load_legacy_json(self) -> bool:
+        '''
+        Load the mempool from the old JSON format (timestamp -> TX JSON)
+
+        Returns:
+            bool: Whether loading was successful
+        '''
+
         json_data = load_json_from_file(self.mempool_file, verbose = True)
 
         if json_data is None:
@@ -40,22 +356,22 @@ class MemPool:
 
             if tx_obj is None:
                 logger.critical('Malformed TX in MemPool file!')
-                
+
                 return False
-            
-            if not isinstance(timestamp, int):
+
+            # JSON object keys are always strings
+            if not str(timestamp).isdigit():
                 logger.critical('Malformed TX timestamp in MemPool file!')
 
                 return False
 
-            self.mempool[tx_obj] = timestamp
+            self.add_transaction(int(timestamp), tx_obj)
 
-        logger.debug(f'Loaded {len(self.mempool)} TXs from MemPool file.')
         return True
 
     def save_mempool(self) -> bool:
         '''
-        Store the mempool in the corresponding file
+        Store a snapshot of the mempool in the corresponding file and restart the journal
 
         Return:
             bool: Status
@@ -66,35 +382,257 @@ class MemPool:
         if isDirectory(self.mempool_file):
             return False
 
-        data = {}
+        records = [SNAPSHOT_HEADER.pack(MEMPOOL_MAGIC, MEMPOOL_FORMAT_VERSION, len(self.entries))]
+
+        for entry in self.entries.values():
+            records.append(self.pack_entry(entry.timestamp, entry.transaction))
+
+        try:
+            with open(self.mempool_file + '.tmp', 'wb') as f:
+                f.write(b''.join(records))
+
+            os.replace(self.mempool_file + '.tmp', self.mempool_file)
 
-        for transaction, stamp in self.mempool.items():
-            data[stamp] = transaction.to_json()
+            # Everything in the journal is in the snapshot now
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = open(self.journal_file, 'wb')
 
-        with open(self.mempool_file, 'w') as f:
-            json.dump(data, f, indent = 4)
+            elif fileExists(self.journal_file):
+                os.remove(self.journal_file)
+
+        except OSError as e:
+            logger.error(f'Unable to save the MemPool: {e}')
+            return False
+
+        self.journal_size = 0
 
         return True
 
-    def add_transaction(self, timestamp: int, transaction: TX) -> bool:
-        self.mempool[transaction] = timestamp
+    def pack_entry(self, timestamp: int, transaction: TX) -> bytes:
+
+        record = transaction.to_bytes()
+
+        return ENTRY_HEADER.pack(timestamp, len(record)) + record
+
+    def open_journal(self) -> bool:
+        '''
+        Start appending the mempool changes to the journal as they happen
+
+        Returns:
+            bool: Whether the journal could be opened
+        '''
+
+        if self.journal is not None: return True
+
+        try:
+            self.journal = open(self.journal_file, 'ab')
+        except OSError as e:
+            logger.error(f'Unable to open the MemPool journal: {e}')
+            return False
+
+        self.journal_size = self.journal.tell()
+
         return True
 
+    def close_journal(self) -> None:
+
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def write_journal(self, record: bytes) -> None:
+
+        if self.journal is None or self.journal_paused: return
+
+        self.journal.write(record)
+        self.journal.flush()
+
+        self.journal_size += len(record)
+
+        if self.journal_size > JOURNAL_COMPACT_SIZE:
+            self.save_mempool()
+
+    def add_transaction(self, timestamp: int, transaction: TX) -> bool:
+        '''
+        Add a transaction to the mempool. Transactions already in the pool or spending
+        an output that a pooled transaction already spends are rejected. If the pool
+        is full the lowest fee rate transactions are evicted to make room
+
+        NOTE: Does not validate the transaction against the chain
+
+        Args:
+            timestamp (int): When the transaction was received
+            transaction (TX): The transaction
+        Returns:
+            bool: Whether it was added
+        '''
+
+        entry = MemPoolEntry.create(transaction, timestamp)
+
+        if entry.txid in self.entries:
+            return False
+
+        if len(self.get_conflicts(transaction)) > 0:
+            logger.debug('MemPool TX rejected, conflicts with a pooled TX')
+            return False
+
+        # No point in evicting anything for a transaction that pays less than all of them
+        if self.is_full():
+            lowest = self.get_lowest_entry()
+
+            if lowest is not None and entry.fee_rate <= lowest.fee_rate:
+                logger.debug('MemPool full, TX fee rate too low')
+                return False
+
+        self.entries[entry.txid] = entry
+        self.total_size += entry.size
+
+        for outpoint in entry.outpoints:
+            self.spent_outpoints[outpoint] = entry.txid
+
+        heapq.heappush(self.fee_heap, (entry.fee_rate, self.sequence, entry.txid))
+        self.sequence += 1
+
+        self.write_journal(bytes([JOURNAL_ADD]) + self.pack_entry(timestamp, transaction))
+
+        self.notify_tx_listeners(transaction, True)
+
+        self.evict()
+
+        return entry.txid in self.entries
+
     def remove_transaction(self, txid: bytes) -> bool:
         '''
         Remove a transaction from the mempool, identified by it's transaction ID
-        
+
         Args:
             txid (bytes): Transaction id
         Returns:
             bool: Whether the deletion was successful
         '''
 
-        for transaction in list(self.mempool.keys()).copy():
-            
-            if transaction.get_txid() == txid:
-                del self.mempool[transaction]
-                return True
+        entry = self.entries.pop(txid, None)
+
+        if entry is None:
+            return False
+
+        self.total_size -= entry.size
+
+        for outpoint in entry.outpoints:
+            if self.spent_outpoints.get(outpoint) == txid:
+                del self.spent_outpoints[outpoint]
+
+        # Only the eviction order heap keeps removed TXs around, get rid of them once they pile up
+        self.fee_heap = compact_lazy_heap(self.fee_heap, self.entries)
+
+        self.write_journal(bytes([JOURNAL_REMOVE]) + txid)
+
+        self.notify_tx_listeners(entry.transaction, False)
+
+        return True
+
+    def remove_block_transactions(self, block: Block) -> int:
+        '''
+        Remove the transactions confirmed by a connected block, along with the pooled
+        transactions that conflict with them. Goes only over the block's inputs
+
+        Args:
+            block (Block): The connected block
+        Returns:
+            int: Count of removed transactions
+        '''
+
+        removed = 0
+
+        for transaction in block.transactions:
+            if self.remove_transaction(transaction.get_txid()):
+                removed += 1
+
+            for utxo in transaction.inputs:
+                spender = self.spent_outpoints.get(utxo.get_outpoint())
+
+                if spender is not None and self.remove_transaction(spender):
+                    removed += 1
+
+        return removed
+
+    def remove_block_spenders(self, block: Block) -> int:
+        '''
+        Remove the pooled transactions spending outputs created by a disconnected block,
+        along with the ones spending theirs. Goes only over the block's outputs
+
+        Args:
+            block (Block): The disconnected block
+        Returns:
+            int: Count of removed transactions
+        '''
+
+        removed = 0
+        pending: List[TX] = list(block.transactions)
+
+        while len(pending) > 0:
+            transaction = pending.pop()
+            txid = transaction.get_txid()
+
+            for utxo in transaction.outputs:
+                spender = self.spent_outpoints.get((txid, utxo.index))
+                entry = self.entries.get(spender) if spender is not None else None
+
+                if entry is not None and self.remove_transaction(entry.txid):
+                    pending.append(entry.transaction)
+                    removed += 1
+
+        return removed
+
+    def evict(self) -> int:
+        '''
+        Evict the lowest fee rate transactions until the pool is within it's limits
+
+        Returns:
+            int: Count of evicted transactions
+        '''
+
+        evicted = 0
+
+        while self.is_over_limit():
+            lowest = self.get_lowest_entry()
+
+            if lowest is None: break
+
+            self.remove_transaction(lowest.txid)
+            evicted += 1
+
+        if evicted > 0:
+            logger.debug(f'Evicted {evicted} TXs from the MemPool')
+
+        return evicted
+
+    def is_over_limit(self) -> bool:
+
+        if self.max_transactions > 0 and len(self.entries) > self.max_transactions: return True
+        if self.max_size > 0 and self.total_size > self.max_size: return True
 
         return False
 
+    def clear(self) -> None:
+        '''
+        Drop every transaction. The tx listeners get a removal for each one, so
+        whatever follows the pool (like block templates) doesn't keep them around
+        '''
+
+        removed = [entry.transaction for entry in self.entries.values()]
+
+        self.entries.clear()
+        self.spent_outpoints.clear()
+        self.fee_heap.clear()
+        self.total_size = 0
+
+        for transaction in removed:
+            self.notify_tx_listeners(transaction, False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, txid: bytes) -> bool:
+        return txid in self.entries
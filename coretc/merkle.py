@@ -0,0 +1,97 @@
+
+from typing import List, Optional, Tuple
+from hashlib import sha256
+
+# Root of a tree with no leaves
+EMPTY_ROOT = b'\x00'*32
+
+# Proof step: sibling hash and whether the sibling is on the left
+ProofStep = Tuple[bytes, bool]
+
+def hash_pair(left: bytes, right: bytes) -> bytes:
+    return sha256(left + right).digest()
+
+def next_level(level: List[bytes]) -> List[bytes]:
+    '''
+    Hash a level of the tree into its parent level. An odd node out is
+    promoted unchanged instead of being paired with itself, so duplicating the
+    last txid does not produce the same root
+
+    Args:
+        level (List[bytes]): Node hashes of the current level
+    Returns:
+        List[bytes]: Node hashes of the parent level
+    '''
+
+    parents = [hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+
+    if len(level) % 2 == 1:
+        parents.append(level[-1])
+
+    return parents
+
+def merkle_root(leaves: List[bytes]) -> bytes:
+    '''
+    Compute the merkle root of a list of leaf hashes (txids)
+
+    Args:
+        leaves (List[bytes]): Leaf hashes in order
+    Returns:
+        bytes: 32 byte root hash, EMPTY_ROOT if there are no leaves
+    '''
+
+    if len(leaves) == 0: return EMPTY_ROOT
+
+    level = list(leaves)
+
+    while len(level) > 1:
+        level = next_level(level)
+
+    return level[0]
+
+def merkle_proof(leaves: List[bytes], index: int) -> Optional[List[ProofStep]]:
+    '''
+    Build the inclusion proof of a leaf, ie the sibling hashes from the leaf up to the root
+
+    Args:
+        leaves (List[bytes]): Leaf hashes in order
+        index (int): Index of the leaf to prove
+    Returns:
+        List[ProofStep] | None: The proof steps or None if the index is out of range
+    '''
+
+    if index < 0 or index >= len(leaves): return None
+
+    proof: List[ProofStep] = []
+    level = list(leaves)
+
+    while len(level) > 1:
+        sibling = index ^ 1
+
+        # Promoted nodes have no sibling on this level
+        if sibling < len(level):
+            proof.append((level[sibling], sibling < index))
+
+        level = next_level(level)
+        index //= 2
+
+    return proof
+
+def merkle_verify(leaf: bytes, proof: List[ProofStep], root: bytes) -> bool:
+    '''
+    Check an inclusion proof against a merkle root
+
+    Args:
+        leaf (bytes): The leaf hash (txid) being proven
+        proof (List[ProofStep]): Proof from merkle_proof
+        root (bytes): Expected root
+    Returns:
+        bool: Whether the leaf is included under the root
+    '''
+
+    current = leaf
+
+    for sibling, is_left in proof:
+        current = hash_pair(sibling, current) if is_left else hash_pair(current, sibling)
+
+    return current == root
@@ -1,35 +1,305 @@
 
-from coretc.blocks import Block
+from coretc.blocks import Block, BLOCK_VERSION_MIDSTATE
+from coretc.difficulty import getDifficultyTarget
 
-import time, os, struct
+from hashlib import sha256
+from typing import Any, Callable, List, Optional, Tuple
+import multiprocessing.synchronize
+import multiprocessing as mp
+import threading, queue, time, os, struct, contextlib
 import logging
 
 logger = logging.getLogger('tc-core')
 
-def mine_block(blk: Block, verbose: bool = False) -> Block:
+# Anything with is_set() works, threads and processes have their own
+Event = threading.Event | multiprocessing.synchronize.Event
+
+# Precomputed last nonce byte of the inner mining loop, so nothing is packed per attempt
+NONCE_LOW_BYTES = [bytes([i]) for i in range(256)]
+
+# Rounds of 256 attempts between checks of the stop event
+STOP_CHECK_ROUNDS = 16
+
+
+def get_target_bytes(difficulty_bits: int) -> bytes:
     '''
-    Mine a block. Brute force the nonce until the hash is valid
+    Get the difficulty target as 32 big endian bytes, a digest is valid if it compares lower
+
+    Args:
+        difficulty_bits (int): The block's difficulty bits
+    Returns:
+        bytes: 32 byte target
+    '''
+
+    return min(getDifficultyTarget(difficulty_bits), 2**256 - 1).to_bytes(32, 'big')
+
+def mine_block_midstate(blk: Block, mixer: bytes = b'', stop_event: Optional[Event] = None) -> Tuple[bool, int]:
+    '''
+    Mine a version 3 block. The constant header prefix is hashed once and the
+    hash state is copied for each attempt. The timestamp & high nonce bytes are
+    only refreshed once every 256 attempts
 
     Args:
         blk (Block): The block to be mined
+        mixer (bytes): 8 byte nonce prefix, random if not given
+        stop_event (Event | None): Mining is abandoned once this is set
+    Returns:
+        Tuple[bool, int]: Whether a valid nonce was found and the number of attempts made
+    '''
+
+    mixer = mixer or os.urandom(8)
+    target = get_target_bytes(blk.difficulty_bits)
+
+    midstate = sha256(blk.get_header_prefix())
+
+    high = 0
+
+    while True:
+        if stop_event is not None and high % STOP_CHECK_ROUNDS == 0 and stop_event.is_set():
+            return False, high * 256
+
+        timestamp = int(time.time())
+        nonce_high = mixer + high.to_bytes(7, 'big')
+
+        outer = midstate.copy()
+        outer.update(struct.pack('>Q', timestamp) + nonce_high)
+
+        for low in NONCE_LOW_BYTES:
+            attempt = outer.copy()
+            attempt.update(low)
+
+            if attempt.digest() < target:
+                blk.timestamp = timestamp
+                blk.nonce = nonce_high + low
+
+                return True, high * 256 + low[0] + 1
+
+        high += 1
+
+def mine_block_generic(blk: Block, mixer: bytes = b'', stop_event: Optional[Event] = None) -> Tuple[bool, int]:
+    '''
+    Mine a block of any version by hashing the whole header on every attempt
 
+    Args:
+        blk (Block): The block to be mined
+        mixer (bytes): 8 byte nonce prefix, random if not given
+        stop_event (Event | None): Mining is abandoned once this is set
     Returns:
-        Block: Reference to the block object
+        Tuple[bool, int]: Whether a valid nonce was found and the number of attempts made
+    '''
+
+    mixer = mixer or os.urandom(8)
+
+    high = 0
+
+    while True:
+        if stop_event is not None and stop_event.is_set():
+            return False, high * 256
 
+        blk.timestamp = int(time.time())
+        nonce_high = mixer + high.to_bytes(7, 'big')
+
+        for low in NONCE_LOW_BYTES:
+            blk.nonce = nonce_high + low
+
+            if blk.is_hash_valid():
+                return True, high * 256 + low[0] + 1
+
+        high += 1
+
+def mine_block(blk: Block, verbose: bool = False, stop_event: Optional[Event] = None) -> Optional[Block]:
     '''
+    Mine a block. Brute force the nonce until the hash is valid
 
-    mixer = os.urandom(8)
+    Args:
+        blk (Block): The block to be mined
+        verbose (bool): Log the mining time & hash rate (DEFAULT=False)
+        stop_event (Event | None): Mining is cancelled once this is set, it is checked every few thousand attempts
+
+    Returns:
+        Block | None: Reference to the block object, None if mining was cancelled
+
+    '''
 
-    counter = 0
-    
     t0 = time.time()
+    found = True
+
+    if blk.is_hash_valid():
+        counter = 0
+    elif blk._VERSION >= BLOCK_VERSION_MIDSTATE:
+        found, counter = mine_block_midstate(blk, stop_event = stop_event)
+    else:
+        found, counter = mine_block_generic(blk, stop_event = stop_event)
+
+    if not found:
+        logger.debug(f'Mining cancelled after {counter} cycles')
+        return None
 
-    while not blk.is_hash_valid():
-        blk.timestamp = int(time.time())
-        blk.nonce = mixer + struct.pack('Q', counter)
-        counter += 1
-    
     if verbose:
-        logger.debug(f'Block mined. TIME: {time.time() - t0:.3f} CYCLES: {counter}')
+        log_mining_stats(t0, counter)
 
     return blk
+
+def log_mining_stats(t0: float, counter: int) -> None:
+    elapsed = time.time() - t0
+    rate = counter / elapsed if elapsed > 0 else 0.
+
+    logger.debug(f'Block mined. TIME: {elapsed:.3f} CYCLES: {counter} RATE: {rate:.0f} H/s')
+
+def parallel_mine_worker(worker_id: int, blk: Block, stop_event: multiprocessing.synchronize.Event, results: mp.Queue, counters) -> None:
+    '''
+    Worker process of the ParallelMiner. The worker id makes up the start of the
+    mixer so the nonce spaces of the workers never overlap
+    '''
+
+    mixer = worker_id.to_bytes(2, 'big') + os.urandom(6)
+
+    if blk._VERSION >= BLOCK_VERSION_MIDSTATE:
+        found, attempts = mine_block_midstate(blk, mixer, stop_event)
+    else:
+        found, attempts = mine_block_generic(blk, mixer, stop_event)
+
+    counters[worker_id] = attempts
+
+    if found:
+        results.put((worker_id, blk.timestamp, blk.nonce))
+        stop_event.set()
+
+class ParallelMiner:
+    '''
+    Mines a block on multiple processes, one per core by default. The nonce space
+    is split between the workers and they are all stopped once one finds a valid hash
+    '''
+
+    def __init__(self, workers: int = 0):
+        self.workers: int = workers if workers > 0 else (os.cpu_count() or 1)
+
+    def mine(self, blk: Block, timeout: Optional[float] = None) -> Optional[Tuple[Block, List[int]]]:
+        '''
+        Mine a block using all the workers
+
+        Args:
+            blk (Block): The block to be mined, updated in place
+            timeout (float | None): Give up after this many seconds (DEFAULT=None, no limit)
+        Returns:
+            Tuple[Block, List[int]] | None: The mined block and the attempts made by each worker, None on timeout
+        '''
+
+        stop_event = mp.Event()
+        results: mp.Queue = mp.Queue()
+        counters = mp.Array('Q', self.workers)
+
+        processes = [
+            mp.Process(target = parallel_mine_worker, args = (i, blk, stop_event, results, counters), daemon = True)
+            for i in range(self.workers)
+        ]
+
+        t0 = time.time()
+
+        for process in processes:
+            process.start()
+
+        found: Tuple[int, int, bytes] | None = None
+
+        while found is None:
+            if timeout is not None and time.time() - t0 > timeout: break
+
+            try:
+                found = results.get(timeout = 0.1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    logger.error('All mining workers exited without a result')
+                    break
+
+        stop_event.set()
+
+        for process in processes:
+            process.join()
+
+        counts = list(counters)
+
+        if found is None:
+            return None
+
+        worker_id, blk.timestamp, blk.nonce = found
+
+        logger.debug(f'Block mined by worker #{worker_id}. TIME: {time.time() - t0:.3f} CYCLES: {sum(counts)}')
+
+        return blk, counts
+
+class ChainMiner:
+    '''
+    Keeps mining blocks on top of a chain in a background thread. Listens for tip
+    changes of the chain, so when a block from a peer replaces the tip the current
+    (now stale) work is cancelled and mining restarts on a fresh template
+    '''
+
+    def __init__(self, chain, create_template: Callable[[], Block], submit_block: Optional[Callable[[Block], Any]] = None,
+                 lock: Optional[threading.Lock] = None):
+        '''
+        Args:
+            chain (Chain): Chain whose tip is followed
+            create_template (Callable): Returns a new block template on top of the current tip
+            submit_block (Callable | None): Called with every mined block (DEFAULT=chain.add_block)
+            lock (Lock | None): Lock serializing access to the chain (ie the RPC's), held while a template
+                                is created and while a block is submitted, so neither should take it again
+        '''
+
+        self.chain = chain
+        self.create_template = create_template
+        self.submit_block = submit_block if submit_block is not None else chain.add_block
+        self.lock = lock if lock is not None else contextlib.nullcontext()
+
+        self.stop_event: threading.Event = threading.Event()
+        self.running: bool = False
+        self.thread: threading.Thread | None = None
+
+        self.blocks_mined: int = 0
+        self.restarts: int = 0
+
+    def on_tip_changed(self, tophash: bytes) -> None:
+        '''
+        Tip listener, cancels the work on the current template
+        '''
+
+        self.stop_event.set()
+
+    def mine_loop(self) -> None:
+
+        while self.running:
+            # Create the event before the template, so a tip change while it is built still cancels it
+            self.stop_event = threading.Event()
+
+            with self.lock:
+                template = self.create_template()
+
+            if mine_block(template, stop_event = self.stop_event) is None:
+                self.restarts += 1
+                continue
+
+            self.blocks_mined += 1
+
+            with self.lock:
+                self.submit_block(template)
+
+    def start(self) -> None:
+
+        if self.running: return
+
+        self.running = True
+        self.chain.add_tip_listener(self.on_tip_changed)
+
+        self.thread = threading.Thread(target = self.mine_loop, daemon = True)
+        self.thread.start()
+
+    def stop(self) -> None:
+
+        if not self.running: return
+
+        self.running = False
+        self.chain.remove_tip_listener(self.on_tip_changed)
+        self.stop_event.set()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
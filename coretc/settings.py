@@ -14,6 +14,13 @@ class ChainSettings:
 
     block_size_limit: int       = 1024 * 1024   # In bytes (Default = 1MB)
     blocks_per_store_file: int  = 32            # TODO: When done testing this should be 512
+    block_cache_size: int       = 1024          # Max count of decoded stored blocks kept in memory
+
+    mempool_max_txs: int        = 50000         # Max count of mempool TXs (0 for no limit)
+    mempool_max_size: int       = 64*1024*1024  # In bytes, of the mempool TXs in binary form (0 for no limit)
+
+    signature_workers: int      = 0             # Processes used to verify signatures in bulk (0 for one per core)
+    signature_parallel_min: int = 64            # Fewer signatures than this are verified serially
 
     target_blocktime: int       = 10            # In seconds. Set to 300 when done
 
@@ -0,0 +1,188 @@
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple
+import multiprocessing as mp
+import logging, os
+
+from coretc.crypto import data_verify_pk, is_signature_cached, cache_valid_signature
+from coretc.settings import ChainSettings
+
+logger = logging.getLogger('tc-core')
+
+# (DER public key, signed data, signature)
+SignatureCheck = Tuple[bytes, bytes, bytes]
+
+# The node runs threads (RPC, miner), forking it could copy a lock some other thread holds
+POOL_START_METHOD = 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
+
+def verify_signature(check: SignatureCheck) -> bool:
+    '''
+    Verify a single signature check
+
+    Args:
+        check (SignatureCheck): Public key, data and signature
+    Returns:
+        bool: Whether the signature is valid
+    '''
+
+    return data_verify_pk(*check)
+
+def verify_signature_chunk(checks: List[SignatureCheck]) -> List[bool]:
+    '''
+    Worker side of the SignatureVerifier, a chunk is sent per task to keep the IPC down
+    '''
+
+    return [verify_signature(check) for check in checks]
+
+def chunk_verified(checks: List[SignatureCheck]) -> bool:
+    '''
+    Worker side of SignatureVerifier.verify, stops at the first invalid signature of the chunk
+    '''
+
+    return all(verify_signature(check) for check in checks)
+
+class SignatureVerifier:
+    '''
+    Checks batches of ECDSA signatures, spreading them over a pool of worker processes.
+    The pool is only started the first time a batch is big enough to need it, smaller
+    batches are checked serially since sending them to the workers costs more than it saves
+    '''
+
+    def __init__(self, workers: int = 0, parallel_min: int = ChainSettings.signature_parallel_min):
+        '''
+        Args:
+            workers (int): Worker process count, 0 for one per core (DEFAULT=0)
+            parallel_min (int): Batches smaller than this are checked serially (DEFAULT=ChainSettings.signature_parallel_min)
+        '''
+
+        self.workers: int = workers if workers > 0 else (os.cpu_count() or 1)
+        self.parallel_min: int = parallel_min
+
+        self.executor: ProcessPoolExecutor | None = None
+
+    def get_executor(self) -> ProcessPoolExecutor:
+
+        if self.executor is None:
+            logger.debug(f'Starting signature verification pool with {self.workers} workers')
+            self.executor = ProcessPoolExecutor(max_workers = self.workers,
+                                                mp_context = mp.get_context(POOL_START_METHOD))
+
+        return self.executor
+
+    def close(self) -> None:
+        '''
+        Shut the worker pool down, it is restarted if needed again
+        '''
+
+        if self.executor is not None:
+            self.executor.shutdown(wait = True)
+            self.executor = None
+
+    def drop_broken_pool(self) -> None:
+        '''
+        A worker died, the pool is unusable. The batch is checked serially and a new pool is started next time
+        '''
+
+        logger.error('Signature verification worker died, checking the batch serially')
+
+        if self.executor is not None:
+            self.executor.shutdown(wait = False, cancel_futures = True)
+            self.executor = None
+
+    def use_parallel(self, count: int) -> bool:
+        return self.workers > 1 and count >= self.parallel_min
+
+    def split_chunks(self, checks: List[SignatureCheck]) -> List[List[SignatureCheck]]:
+
+        # A few chunks per worker so a slow chunk doesn't leave the rest idle
+        chunk_size = max(1, -(-len(checks) // (self.workers * 4)))
+
+        return [checks[i:i + chunk_size] for i in range(0, len(checks), chunk_size)]
+
+    def verify(self, checks: List[SignatureCheck]) -> bool:
+        '''
+        Check that every signature of a batch is valid, eg. all the inputs of a block.
+        Signatures in the signature cache are skipped, the rest are cached if they all pass.
+        Stops at the first invalid one, chunks that haven't started by then are cancelled
+
+        Args:
+            checks (List[SignatureCheck]): Signatures to check
+        Returns:
+            bool: Whether all of them are valid
+        '''
+
+        checks = [check for check in checks if not is_signature_cached(*check)]
+
+        if not self.verify_uncached(checks): return False
+
+        for check in checks:
+            cache_valid_signature(*check)
+
+        return True
+
+    def verify_uncached(self, checks: List[SignatureCheck]) -> bool:
+
+        if not self.use_parallel(len(checks)):
+            return all(verify_signature(check) for check in checks)
+
+        executor = self.get_executor()
+
+        try:
+            pending = {executor.submit(chunk_verified, chunk) for chunk in self.split_chunks(checks)}
+
+            while len(pending) > 0:
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+
+                if all(future.result() for future in done): continue
+
+                for future in pending:
+                    future.cancel()
+
+                return False
+
+        except BrokenProcessPool:
+            self.drop_broken_pool()
+            return all(verify_signature(check) for check in checks)
+
+        return True
+
+    def verify_all(self, checks: List[SignatureCheck]) -> List[bool]:
+        '''
+        Verify every signature of a batch, the signature cache is used like in verify
+
+        Args:
+            checks (List[SignatureCheck]): Signatures to check
+        Returns:
+            List[bool]: Validity of each signature, in the same order
+        '''
+
+        results: List[bool] = [is_signature_cached(*check) for check in checks]
+        uncached = [i for i, cached in enumerate(results) if not cached]
+
+        uncached_results = self.verify_all_uncached([checks[i] for i in uncached])
+
+        for i, valid in zip(uncached, uncached_results):
+            results[i] = valid
+
+            if valid:
+                cache_valid_signature(*checks[i])
+
+        return results
+
+    def verify_all_uncached(self, checks: List[SignatureCheck]) -> List[bool]:
+
+        if not self.use_parallel(len(checks)):
+            return verify_signature_chunk(checks)
+
+        results: List[bool] = []
+
+        try:
+            for chunk_result in self.get_executor().map(verify_signature_chunk, self.split_chunks(checks)):
+                results.extend(chunk_result)
+
+        except BrokenProcessPool:
+            self.drop_broken_pool()
+            return verify_signature_chunk(checks)
+
+        return results
@@ -16,6 +16,12 @@ class BlockStatus(IntEnum):
     INVALID_TX_AMOUNTS = -11
     INVALID_TX_MOD_UTXO = -12
 
+    INVALID_VERSION = -13
+
+    INVALID_TX_MEMPOOL_REJECTED = -14
+
+    INVALID_SIZE = -15
+
     INVALID_ERROR = 0
 
     VALID = 1
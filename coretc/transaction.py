@@ -3,9 +3,9 @@ from binascii import hexlify, unhexlify
 from copy import deepcopy
 from hashlib import sha256
 import json
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from dataclasses import dataclass, field
-import os, logging
+import os, struct, logging, weakref
 from coretc.object_schemas import TX_JSON_SCHEMA, is_schema_valid
 from coretc.utils.errors import deprecated
 
@@ -15,13 +15,57 @@ from coretc.utils.generic import data_hexdigest, data_hexundigest
 
 logger = logging.getLogger('tc-core')
 
+# Binary record: nonce length, input count, output count | nonce | inputs | outputs
+TX_RECORD_HEADER = struct.Struct('<BHH')
+MAX_TX_NONCE_SIZE = 0xFF
+MAX_TX_INPUTS = 0xFFFF
+
+# Assigning to any of these invalidates the cached txid
+HASHED_FIELDS = {'inputs', 'outputs', '_nonce'}
+
 @dataclass(init = True)
 class TX:
     inputs:  List[UTXO] = field(default_factory=list)
     outputs: List[UTXO] = field(default_factory=list)
 
     _nonce: bytes = b''
-    _txid_cache: bytes = b'' # Used so the object is not hashed needlessly
+    _txid_cache: bytes = field(default = b'', repr = False, compare = False) # Used so the object is not hashed needlessly
+
+    def __setattr__(self, name: str, value) -> None:
+        object.__setattr__(self, name, value)
+
+        if name in HASHED_FIELDS:
+            self.invalidate_cache()
+
+    def __getstate__(self) -> dict:
+        # The links to the owning lists are weak references, copies & pickles go without them
+        state = self.__dict__.copy()
+        state.pop('_owners', None)
+
+        return state
+
+    def invalidate_cache(self) -> None:
+        '''
+        Drop the cached txid. Needed after modifying the inputs or outputs in place.
+        The TXLists holding this TX (ie blocks) are notified as well
+        '''
+
+        object.__setattr__(self, '_txid_cache', b'')
+
+        for ref in self.__dict__.get('_owners', ()):
+            if (owner := ref()) is not None:
+                owner.touch()
+
+    def add_owner(self, owner: 'TXList') -> None:
+        '''
+        Link a TXList that holds this TX, so it gets notified when the txid changes
+        '''
+
+        owners: list = self.__dict__.setdefault('_owners', [])
+
+        # TXs outlive the templates they are put in, drop the dead links while at it
+        owners[:] = [ref for ref in owners if ref() is not None and ref() is not owner]
+        owners.append(weakref.ref(owner))
 
     def hash_sha256(self) -> bytes:
         '''
@@ -48,7 +92,9 @@ class TX:
        
         if self._txid_cache and not ignore_cache: return self._txid_cache
 
-        return self.hash_sha256()
+        self._txid_cache = self.hash_sha256()
+
+        return self._txid_cache
 
     def get_output_references(self) -> list[UTXO]:
         '''
@@ -104,6 +150,89 @@ class TX:
             'txid': data_hexdigest(self.get_txid())
         }
     
+    def to_bytes(self) -> bytes:
+        '''
+        Serialize the TX into it's compact binary record
+        NOTE: The txid is not stored, it is derived from the contents
+
+        Return:
+            bytes: Binary record
+        '''
+
+        return b''.join([
+            TX_RECORD_HEADER.pack(len(self._nonce), len(self.inputs), len(self.outputs)),
+            self._nonce,
+            *[utxo.to_bytes() for utxo in self.inputs],
+            *[utxo.to_bytes() for utxo in self.outputs]
+        ])
+
+    def get_size(self) -> int:
+        '''
+        Get the size of the transaction in it's binary form
+
+        Return:
+            int: Size in bytes
+        '''
+
+        return len(self.to_bytes())
+
+    @staticmethod
+    def read_bytes(data: bytes | memoryview, offset: int = 0) -> Tuple['TX', int]:
+        '''
+        Parse a TX binary record that starts at an offset of a buffer
+        NOTE: Raises struct.error or ValueError on malformed data, use from_bytes for a checked parse
+
+        Args:
+            data (bytes | memoryview): Buffer containing the record
+            offset (int): Where the record starts
+
+        Return:
+            Tuple[TX, int]: Resulting object and the offset right after the record
+        '''
+
+        nonce_len, input_count, output_count = TX_RECORD_HEADER.unpack_from(data, offset)
+        offset += TX_RECORD_HEADER.size
+
+        nonce = bytes(data[offset:offset + nonce_len])
+        offset += nonce_len
+
+        inputs:  List[UTXO] = []
+        outputs: List[UTXO] = []
+
+        for _ in range(input_count):
+            utxo, offset = UTXO.read_bytes(data, offset)
+            inputs.append(utxo)
+
+        for _ in range(output_count):
+            utxo, offset = UTXO.read_bytes(data, offset)
+            outputs.append(utxo)
+
+        if offset > len(data):
+            raise ValueError('TX record exceeds the buffer')
+
+        return TX(inputs = inputs, outputs = outputs, _nonce = nonce), offset
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview) -> Optional['TX']:
+        '''
+        Parse a TX from it's binary record
+
+        Return:
+            TX | None: Resulting object or None if the record is malformed
+        '''
+
+        try:
+            tx, end = TX.read_bytes(data)
+        except (struct.error, ValueError, IndexError):
+            logger.error('Malformed TX binary record')
+            return None
+
+        if not end == len(data):
+            logger.error('Trailing data after TX binary record')
+            return None
+
+        return tx
+
     @staticmethod
     def valid_transaction_json(json_data: dict) -> bool:
         '''
@@ -194,7 +323,7 @@ class TX:
             None
         '''
         
-        self._txid_cache = b''
+        self.invalidate_cache()
 
         for i, utxo in enumerate(self.outputs):
             utxo.index = i
@@ -240,12 +369,15 @@ class TX:
 
         return self.ingoing_funds() - self.outgoing_funds()
 
-    def check_inputs(self) -> bool:
+    def check_inputs(self, verify_signatures: bool = True) -> bool:
         '''
         Check the utxo input validities also check the UTXO input 
         signatures to unlock for spending. Note this only checks for the case
         where all the inputs are from 1 address
 
+        Args:
+            verify_signatures (bool): Whether the signatures are checked too, turned off when
+                                      they are verified in bulk with get_signature_checks (DEFAULT=True)
         Return:
             bool: Whether the inputs are proper
         '''
@@ -253,20 +385,31 @@ class TX:
         for utxo_input in self.inputs:
 
             if not utxo_input.is_valid_input(): return False
-            if not utxo_input.unlock_spend(self.outputs): return False
+            if verify_signatures and not utxo_input.unlock_spend(self.outputs): return False
 
         return True
+
+    def get_signature_checks(self) -> List[Tuple[bytes, bytes, bytes]]:
+        '''
+        Get what is needed to verify the input signatures without the TX object,
+        so they can be checked in bulk or in other processes
+
+        Return:
+            List[Tuple[bytes, bytes, bytes]]: (Public key, signed data, signature) of every input
+        '''
+
+        return [(utxo.owner_pk, utxo.get_hash_with_outputs(self.outputs), utxo.signature) for utxo in self.inputs]
     
     def check_outputs(self) -> bool:
         '''
         Check if the UTXO outputs are properly set up
 
         Return:
-            bool: Whether the TX's outputs have distinct and valid indexes
+            bool: Whether the TX's outputs have distinct and valid indexes, in order
         '''
 
-        self.outputs.sort() # Using the __lt__ dunder method they are sorting by their index
-        
+        # Outputs out of order are rejected (by the index check below) rather than sorted,
+        # sorting would change the txid of a TX that might already be hashed into a block
         if len(self.outputs) > 255: return False
 
         for i, utxo in enumerate(self.outputs):
@@ -287,7 +430,7 @@ class TX:
         '''
 
         self._nonce = os.urandom(8)
-        self.txid_cache = b''
+        self.invalidate_cache()
         return self._nonce
     
     def make(self):
@@ -304,11 +447,13 @@ class TX:
     
     def is_valid(self) -> bool:
         '''
-        Check if the nonce is set
+        Check if the nonce is set and the TX fits in it's binary record
         NOTE: UTXOs are check using check_inputs & check_outputs
         '''
 
         if self._nonce == b'': return False
+        if len(self._nonce) > MAX_TX_NONCE_SIZE: return False
+        if len(self.inputs) > MAX_TX_INPUTS: return False
         
         return True
 
@@ -323,7 +468,7 @@ class TX:
             output.index = self.outputs[-1].index + 1
 
         self.outputs.append(output)
-        self.txid_cache = b''
+        self.invalidate_cache()
 
     def add_outputs(self, outputs: List[UTXO]) -> None:
         for utxo in outputs:
@@ -334,12 +479,93 @@ class TX:
         Add the UTXO to the inputs and invalidate the cached txid
         '''
         self.inputs.append(input)
-        self.txid_cache = b''
+        self.invalidate_cache()
 
     def add_inputs(self, inputs: List[UTXO]) -> None:
         for utxo in inputs:
             self.add_input(utxo)
 
+    # Needed to use TXs as keys, like in the mempool
+    def __hash__(self):
+        return hash(self.get_txid())
+
+class TXList(list):
+    '''
+    List of TXs with a revision number that goes up whenever the list is modified, or one
+    of it's TXs drops it's txid. Blocks use it to know when their cached txids are stale
+    '''
+
+    revision: int = 0
+
+    def __init__(self, transactions = ()) -> None:
+        super().__init__()
+        self.extend(transactions)
+
+    def touch(self) -> None:
+        self.revision += 1
+
+    def _added(self, transactions) -> None:
+        for tx in transactions:
+            tx.add_owner(self)
+
+        self.touch()
+
+    def append(self, tx: TX) -> None:
+        super().append(tx)
+        self._added((tx,))
+
+    def extend(self, transactions) -> None:
+        transactions = list(transactions)
+        super().extend(transactions)
+        self._added(transactions)
+
+    def insert(self, index, tx: TX) -> None:
+        super().insert(index, tx)
+        self._added((tx,))
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            value = list(value)
+
+        super().__setitem__(index, value)
+        self._added(value if isinstance(index, slice) else (value,))
+
+    def __iadd__(self, transactions):
+        self.extend(transactions)
+        return self
+
+    # The rest only drop or reorder TXs that are already linked
+
+    def __delitem__(self, index) -> None:
+        super().__delitem__(index)
+        self.touch()
+
+    def __imul__(self, count):
+        super().__imul__(count)
+        self.touch()
+        return self
+
+    def pop(self, index = -1) -> TX:
+        tx = super().pop(index)
+        self.touch()
+        return tx
+
+    def remove(self, tx: TX) -> None:
+        super().remove(tx)
+        self.touch()
+
+    def clear(self) -> None:
+        super().clear()
+        self.touch()
+
+    def sort(self, *args, **kwargs) -> None:
+        super().sort(*args, **kwargs)
+        self.touch()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self.touch()
+
 def hash_utxo_list(lst: List[UTXO]) -> bytes:
     '''
     Collectively hash a list of utxos
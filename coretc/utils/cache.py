@@ -0,0 +1,93 @@
+
+from collections import OrderedDict
+from typing import Any, Hashable
+
+class LRUCache:
+    '''
+    Bounded mapping that evicts the least recently used entry once full.
+    Also counts hits & misses of get() so the cache efficiency can be monitored
+    '''
+
+    def __init__(self, max_size: int):
+
+        self.max_size: int = max(0, max_size)
+        self.data: OrderedDict = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        '''
+        Get an entry and mark it as recently used
+
+        Args:
+            key (Hashable): Key of the entry
+            default (Any): Returned if the key is not cached (DEFAULT=None)
+        Returns:
+            Any: Cached value or the default
+        '''
+
+        if key not in self.data:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self.data.move_to_end(key)
+
+        return self.data[key]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        '''
+        Get an entry without marking it as used or counting the lookup
+        '''
+
+        return self.data.get(key, default)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        '''
+        Insert or replace an entry, evicting the least recently used ones if needed
+        '''
+
+        if self.max_size == 0: return
+
+        self.data[key] = value
+        self.data.move_to_end(key)
+
+        while len(self.data) > self.max_size:
+            self.data.popitem(last = False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self.data.pop(key, default)
+
+    def clear(self) -> None:
+        self.data.clear()
+
+    def hit_rate(self) -> float:
+        '''
+        Returns:
+            float: Ratio of hits over total lookups, 0 if there have been none
+        '''
+
+        total = self.hits + self.misses
+
+        return self.hits / total if total > 0 else 0.
+
+    def get_stats(self) -> dict:
+        '''
+        Returns:
+            dict: Size and hit/miss counters of the cache
+        '''
+
+        return {
+            'size': len(self.data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate()
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
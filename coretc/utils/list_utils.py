@@ -1,5 +1,9 @@
 
-from typing import List, TypeVar
+from typing import Container, List, Tuple, TypeVar
+import heapq
+
+# Stale entries a lazily deleted heap can hold on top of twice it's live ones before it's rebuilt
+LAZY_HEAP_SLACK = 64
 
 class CombinedList:
     '''
@@ -82,3 +86,23 @@ class CombinedListIter:
                 pass
 
         raise StopIteration
+
+def compact_lazy_heap(heap: List[Tuple], live: Container, key_index: int = 2) -> List[Tuple]:
+    '''
+    Heaps with lazy deletion keep the entries of removed items until they get popped.
+    Once those clearly outnumber the live ones the heap is rebuilt without them
+
+    Args:
+        heap (List[Tuple]): The heap, each entry holds the key of it's item at key_index
+        live (Container): Keys of the items that are still present
+        key_index (int): Position of the key in the entries (DEFAULT=2)
+    Returns:
+        List[Tuple]: The same heap if it didn't need compacting, otherwise a new one
+    '''
+
+    if len(heap) <= 2 * len(live) + LAZY_HEAP_SLACK: return heap
+
+    heap = [entry for entry in heap if entry[key_index] in live]
+    heapq.heapify(heap)
+
+    return heap
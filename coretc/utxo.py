@@ -1,18 +1,27 @@
 
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import struct, logging
 from binascii import hexlify, unhexlify
 from hashlib import sha256
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from coretc.object_schemas import UTXO_IN_JSON_SCHEMA, UTXO_OUT_JSON_SCHEMA, is_schema_valid
 from coretc.utils.generic import data_hexdigest, data_hexundigest, dump_json
-from coretc.crypto import data_sign, data_verify
+from coretc.crypto import data_sign, data_verify, data_verify_pk, is_signature_cached, cache_valid_signature
 from Crypto.PublicKey import ECC
 
 logger = logging.getLogger('tc-core')
 
+# Binary record: flags, index, amount, pk length | pk | [txid] | [sig length | sig]
+UTXO_RECORD_HEADER = struct.Struct('<BBdH')
+UTXO_FLAG_TXID = 0x01
+UTXO_FLAG_SIG  = 0x02
+MAX_SIGNATURE_SIZE = 0xFF
+
+# Changing any of these invalidates the cached UTXO hash (the signature is not hashed)
+HASHED_FIELDS = {'owner_pk', 'amount', 'index', 'txid'}
+
 @dataclass(init = True)
 class UTXO:
     owner_pk: bytes
@@ -21,22 +30,36 @@ class UTXO:
     index: int          = 0 
     txid: bytes         = b''
     signature: bytes    = b''
+
+    _hash_cache: bytes  = field(default = b'', init = False, repr = False, compare = False)
+
+    def __setattr__(self, name: str, value) -> None:
+        object.__setattr__(self, name, value)
+
+        if name in HASHED_FIELDS:
+            object.__setattr__(self, '_hash_cache', b'')
     
     def hash_sha256(self) -> bytes:
         '''
-        Hash the UTXO object using SHA-256
+        Hash the UTXO object using SHA-256, cached until a hashed field changes
         WARNING: Does no checks on the parameters themselves
 
         Return:
             bytes: 32 byte hash digest
         '''
 
-        return sha256(
+        if self._hash_cache: return self._hash_cache
+
+        utxo_hash = sha256(
             self.owner_pk +
             struct.pack('f', self.amount) +
             self.txid +
             int.to_bytes(self.index)
         ).digest()
+
+        object.__setattr__(self, '_hash_cache', utxo_hash)
+
+        return utxo_hash
     
 
     def get_hash_with_outputs(self, outputs: List) -> bytes:
@@ -66,6 +89,16 @@ class UTXO:
 
         return f'{data_hexdigest(self.txid, no_prefix = True)}:{self.index}'
 
+    def get_outpoint(self) -> Tuple[bytes, int]:
+        '''
+        Retrieve the UTXO's outpoint, the (txid, index) pair used as a key in hash based lookups
+
+        Return:
+            Tuple[bytes, int]: Source txid and index in the outputs
+        '''
+
+        return (self.txid, self.index)
+
     def to_json(self, is_input: bool = True) -> dict:
         '''
         Convert the UTXO into JSON
@@ -92,6 +125,87 @@ class UTXO:
 
         return json_data
     
+    def to_bytes(self) -> bytes:
+        '''
+        Serialize the UTXO into it's compact binary record
+
+        Return:
+            bytes: Binary record
+        '''
+
+        flags = 0
+
+        if len(self.txid) == 32: flags |= UTXO_FLAG_TXID
+        if self.signature:       flags |= UTXO_FLAG_SIG
+
+        record = UTXO_RECORD_HEADER.pack(flags, self.index, self.amount, len(self.owner_pk)) + self.owner_pk
+
+        if flags & UTXO_FLAG_TXID:
+            record += self.txid
+
+        if flags & UTXO_FLAG_SIG:
+            record += struct.pack('<B', len(self.signature)) + self.signature
+
+        return record
+
+    @staticmethod
+    def read_bytes(data: bytes | memoryview, offset: int = 0) -> Tuple['UTXO', int]:
+        '''
+        Parse a UTXO binary record that starts at an offset of a buffer
+        NOTE: Raises struct.error or ValueError on malformed data, use from_bytes for a checked parse
+
+        Args:
+            data (bytes | memoryview): Buffer containing the record
+            offset (int): Where the record starts
+
+        Return:
+            Tuple[UTXO, int]: Resulting object and the offset right after the record
+        '''
+
+        flags, index, amount, pk_len = UTXO_RECORD_HEADER.unpack_from(data, offset)
+        offset += UTXO_RECORD_HEADER.size
+
+        owner_pk = bytes(data[offset:offset + pk_len])
+        offset += pk_len
+
+        txid = b''
+        signature = b''
+
+        if flags & UTXO_FLAG_TXID:
+            txid = bytes(data[offset:offset + 32])
+            offset += 32
+
+        if flags & UTXO_FLAG_SIG:
+            sig_len = data[offset]
+            signature = bytes(data[offset + 1:offset + 1 + sig_len])
+            offset += 1 + sig_len
+
+        if offset > len(data):
+            raise ValueError('UTXO record exceeds the buffer')
+
+        return UTXO(owner_pk = owner_pk, amount = amount, index = index, txid = txid, signature = signature), offset
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview) -> Optional['UTXO']:
+        '''
+        Parse a UTXO from it's binary record
+
+        Return:
+            UTXO | None: Resulting object or None if the record is malformed
+        '''
+
+        try:
+            utxo, end = UTXO.read_bytes(data)
+        except (struct.error, ValueError, IndexError):
+            logger.error('Malformed UTXO binary record')
+            return None
+
+        if not end == len(data):
+            logger.error('Trailing data after UTXO binary record')
+            return None
+
+        return utxo
+
     @staticmethod
     def valid_input_json(json_data: dict) -> bool:
         '''
@@ -161,16 +275,21 @@ class UTXO:
 
     def unlock_spend(self, outputs: List) -> bool:
         '''
-        Check if the signature is valid to unlock for a list of outputs
+        Check if the signature is valid to unlock for a list of outputs.
+        Signatures already verified are looked up in the signature cache instead
 
         Return:
             bool: Validity of the signature
         '''
 
-        pub = ECC.import_key(self.owner_pk)
+        data = self.get_hash_with_outputs(outputs)
+
+        if is_signature_cached(self.owner_pk, data, self.signature): return True
 
-        if not (res := data_verify(pub, self.get_hash_with_outputs(outputs), self.signature)):
+        if not (res := data_verify_pk(self.owner_pk, data, self.signature)):
             logger.warning(f'Invalid sig of utxo input: {self.get_id()}')
+        else:
+            cache_valid_signature(self.owner_pk, data, self.signature)
         
             #dump_json(self.to_json())
         #print('Output count:', len(outputs))
@@ -206,6 +325,7 @@ class UTXO:
         if not self.is_valid(): return False
         if not len(self.txid) == 32: return False
         if not self.signature: return False
+        if len(self.signature) > MAX_SIGNATURE_SIZE: return False
 
         return True
 
@@ -1,74 +1,198 @@
 
-from typing import List, dataclass_transform
+from typing import Iterator, List, Tuple
 
 from os.path import exists as fileExists
 from os.path import isdir as isDirectory
-import bson, json
+import os, sqlite3
 
-from coretc.utils.generic import load_bson_from_file, load_json_from_file
+from coretc.utils.generic import load_bson_from_file, data_hexdigest, data_hexundigest
 from coretc.utxo import UTXO
 import logging
 
 logger = logging.getLogger('tc-core')
 
+# A UTXO is uniquely identified by the txid that created it and its index in the outputs
+Outpoint = Tuple[bytes, int]
+
+SQLITE_MAGIC = b'SQLite format 3\x00'
+
 class UTXOSet:
-    def __init__(self, store_file: str):
+    '''
+    The set of unspent outputs, stored in an sqlite database.
+    Changes are kept in memory as a delta (added / spent outpoints) on top of
+    the database until save_utxos is called, which writes only that delta
+    '''
+
+    def __init__(self, store_file: str, index_owners: bool = False):
 
         self.outfile = store_file
-        
-        self.utxos: List[UTXO] = []
-        
+
+        # Delta on top of the database, flushed by save_utxos
+        # (txid, index) -> UTXO
+        self.utxos: dict[Outpoint, UTXO] = {}
+        self.spent: set[Outpoint] = set()
+
+        # Optional secondary index on the owner public key
+        self.index_owners: bool = index_owners
+
         self.currently_scanned_height: int = -1
 
-    def load_utxos(self) -> bool:
+        self.db: sqlite3.Connection | None = None
+
+    def open_database(self) -> bool:
         '''
-        Load the UTXO set from the selected store file
-        
+        Open (and create if needed) the UTXO database. A legacy BSON utxo set
+        in the same path gets imported and kept with a .legacy suffix. If it can't be
+        imported it is kept with a .legacy-failed suffix instead and the set is left
+        empty at height -1, so it gets rebuilt from the block store
+
         Return:
-            bool: Whether the loading was successful
+            bool: Whether the database is usable
         '''
-        logger.info(f'Loading UTXO set from {self.outfile}')
-        
-        self.utxos.clear()
-        
-        data = load_bson_from_file(self.outfile, verbose = True)
 
-        if data is None:
-            logger.error('Error loading UTXOSet data from file!')
+        if self.db is not None: return True
+
+        if isDirectory(self.outfile):
+            logger.error(f'UTXO set path {self.outfile} is a directory')
             return False
 
-        if 'height' not in data or 'outputs' not in data:
-            logger.error('UTXO Set file contains invalid data!')
+        legacy_data: dict | None = None
+
+        if fileExists(self.outfile) and not self.is_database_file(self.outfile):
+            logger.warning(f'Found legacy UTXO set file {self.outfile}, importing it')
+
+            legacy_data = load_bson_from_file(self.outfile, verbose = True)
+
+            # The database takes over the path, the file is renamed once we know if the import worked
+            legacy_path = self.outfile + '.legacy-importing'
+            os.replace(self.outfile, legacy_path)
+
+        try:
+            # The RPC serializes access to the chain with it's own lock
+            self.db = sqlite3.connect(self.outfile, check_same_thread = False)
+
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS utxos (
+                    txid BLOB NOT NULL, idx INTEGER NOT NULL,
+                    owner BLOB NOT NULL, amount REAL NOT NULL,
+                    PRIMARY KEY (txid, idx)
+                ) WITHOUT ROWID
+            ''')
+            self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)')
+
+            if self.index_owners:
+                self.db.execute('CREATE INDEX IF NOT EXISTS utxos_owner ON utxos (owner)')
+
+            self.db.commit()
+
+        except sqlite3.Error as e:
+            logger.critical(f'Unable to open UTXO database {self.outfile}: {str(e)}')
+            self.db = None
             return False
 
-        self.currently_scanned_height = int(data['height'])
+        if legacy_data is not None:
+            if self.import_legacy_json(legacy_data):
+                os.replace(legacy_path, self.outfile + '.legacy')
+            else:
+                logger.error('Legacy UTXO set could not be imported, it will be rebuilt from the block store')
+                os.replace(legacy_path, self.outfile + '.legacy-failed')
+
+        return True
+
+    @staticmethod
+    def is_database_file(filename: str) -> bool:
+        '''
+        Check whether a file is an sqlite database (empty files count as one)
+        '''
+
+        with open(filename, 'rb') as f:
+            header = f.read(len(SQLITE_MAGIC))
+
+        return len(header) == 0 or header == SQLITE_MAGIC
+
+    def import_legacy_json(self, data: dict) -> bool:
+        '''
+        Import a whole UTXO set in the JSON form produced by get_as_json, and save it.
+        Nothing is kept unless every output is imported
+
+        Args:
+            data (dict): UTXO set JSON
+        Return:
+            bool: Whether the import was successful
+        '''
+
+        if data is None or 'height' not in data or 'outputs' not in data:
+            logger.error('UTXO Set data is invalid!')
+            return False
 
         for utxo_json in data['outputs']:
 
             utxo_obj = UTXO.from_json(utxo_json)
 
             if utxo_obj is None:
-                logger.error('Error parsing UTXO in file: {utxo_json}')
+                logger.error(f'Error parsing UTXO: {utxo_json}')
+                self.utxos.clear()
+                return False
+
+            # Outputs in JSON form do not carry their txid, old sets don't have it at all
+            if 'txid' in utxo_json:
+                utxo_obj.txid = data_hexundigest(utxo_json['txid'])
+
+            if not self.utxo_add(utxo_obj):
+                logger.error(f'UTXO set output can not be imported (no txid?): {utxo_json}')
+                self.utxos.clear()
                 return False
 
-            self.utxos.append(utxo_obj)
-        
-        logger.debug(f'Loaded {len(self.utxos)} from {self.outfile}')
+        self.currently_scanned_height = int(data['height'])
+
+        if self.save_utxos(): return True
+
+        self.utxos.clear()
+        self.currently_scanned_height = -1
+
+        return False
+
+    def load_utxos(self) -> bool:
+        '''
+        Load the UTXO set from the selected store file. Only the stored height is read,
+        outputs are queried as needed. Any unsaved changes are discarded
+
+        Return:
+            bool: Whether the loading was successful
+        '''
+        logger.info(f'Loading UTXO set from {self.outfile}')
+
+        self.utxos.clear()
+        self.spent.clear()
+
+        if not self.open_database() or self.db is None:
+            logger.error('Error loading UTXOSet database!')
+            return False
+
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', ('height',)).fetchone()
+
+        self.currently_scanned_height = int(row[0]) if row is not None else -1
+
+        logger.debug(f'UTXO set at height {self.currently_scanned_height}')
 
         return True
-    
+
     def get_as_json(self) -> dict:
         '''
         Get the whole set in JSON format
         '''
-        
+
         output: dict = {}
         output['height'] = self.currently_scanned_height
         output['outputs'] = list()
 
-        for utxo in self.utxos:
+        for utxo in self.iter_utxos():
 
             utxo_json = utxo.to_json(is_input = False)
+            utxo_json['txid'] = data_hexdigest(utxo.txid)
 
             output['outputs'].append(utxo_json)
 
@@ -76,43 +200,66 @@ class UTXOSet:
 
     def save_utxos(self) -> bool:
         '''
-        Store the memory loaded utxo set into the specified file
+        Write the changes made since the last save into the database
 
         Return:
             bool: Whether the saving was successful
         '''
-        
-        logger.info(f'Saving UTXO set to {self.outfile}')
 
-        if isDirectory(self.outfile):
+        if not self.open_database() or self.db is None:
             return False
 
-        output = self.get_as_json()
+        logger.debug(f'Saving UTXO set delta, {len(self.spent)} spent, {len(self.utxos)} added')
+
+        try:
+            with self.db:
+                self.db.executemany(
+                    'DELETE FROM utxos WHERE txid = ? AND idx = ?', self.spent
+                )
+
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO utxos (txid, idx, owner, amount) VALUES (?, ?, ?, ?)',
+                    [(utxo.txid, utxo.index, utxo.owner_pk, utxo.amount) for utxo in self.utxos.values()]
+                )
 
-        with open(self.outfile, 'wb') as f:
+                self.db.execute(
+                    'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                    ('height', self.currently_scanned_height)
+                )
 
-            data_raw = bson.dumps(output)
+        except sqlite3.Error as e:
+            logger.critical(f'Error saving UTXO set delta: {str(e)}')
+            return False
 
-            f.write(data_raw)
-            
-        logger.debug(f'Saved {len(self.utxos)} UTXOs to file')
+        self.utxos.clear()
+        self.spent.clear()
 
         return True
-    
-    def utxo_exists(self, txid: bytes, index: int) -> int:
+
+    def _db_get(self, outpoint: Outpoint) -> UTXO | None:
+        '''
+        Get a UTXO directly from the database, ignoring the unsaved changes
         '''
-        Get the index of a utxo if it exists, else return -1
+
+        if self.db is None: return None
+
+        row = self.db.execute(
+            'SELECT owner, amount FROM utxos WHERE txid = ? AND idx = ?', outpoint
+        ).fetchone()
+
+        if row is None: return None
+
+        return UTXO(owner_pk = row[0], amount = row[1], index = outpoint[1], txid = outpoint[0])
+
+    def utxo_exists(self, txid: bytes, index: int) -> bool:
+        '''
+        Check if a UTXO exists in the set, given it's txid and index
 
         Return:
-            int: Index in the utxos list
+            bool: Whether it's present in the set
         '''
-        for idx, utxo in enumerate(self.utxos.copy()):
-            
-            if utxo.txid == txid and utxo.index == index:
-                self.utxos.pop(idx)
-                return idx
-        
-        return -1
+
+        return self.utxo_get(txid, index) is not None
 
     def utxo_remove(self, txid: bytes, index: int) -> bool:
         '''
@@ -122,11 +269,20 @@ class UTXOSet:
             bool: Whether the deletion was successful
         '''
 
-        list_index = self.utxo_exists(txid, index)
+        outpoint = (txid, index)
+
+        # Created and spent before being saved, never reaches the database. Unless the
+        # addition replaced a stored row, then that row has to be deleted as well
+        if self.utxos.pop(outpoint, None) is not None:
+            if self._db_get(outpoint) is not None:
+                self.spent.add(outpoint)
 
-        if list_index < 0: return False
+            return True
 
-        self.utxos.pop(list_index)
+        if outpoint in self.spent or self._db_get(outpoint) is None:
+            return False
+
+        self.spent.add(outpoint)
 
         return True
 
@@ -136,16 +292,19 @@ class UTXOSet:
         If the utxo does not exist returns None
         '''
 
-        list_index = self.utxo_exists(txid, index)
+        outpoint = (txid, index)
 
-        if list_index < 0: return None
+        if (utxo := self.utxos.get(outpoint)) is not None:
+            return utxo
 
-        return self.utxos[list_index]
+        if outpoint in self.spent: return None
+
+        return self._db_get(outpoint)
 
     def utxo_add(self, utxo: UTXO) -> bool:
         '''
         Attempt to add a utxo in the utxo set. If the utxo does not have proper fields this will return False
-        NOTE: This does not handle duplicate additions
+        NOTE: A duplicate addition replaces the previous entry
 
         Args:
             utxo (UTXO): The utxo object to add to the set
@@ -153,10 +312,99 @@ class UTXOSet:
             bool: Whether the addition succeded
         '''
 
-        if not utxo.is_valid() or not len(utxo.txid) == 32: return False 
+        if not utxo.is_valid() or not len(utxo.txid) == 32: return False
+
+        outpoint = utxo.get_outpoint()
+
+        self.spent.discard(outpoint)
+        self.utxos[outpoint] = utxo
+
+        return True
+
+    def get_owner_utxos(self, owner_pk: bytes) -> List[UTXO]:
+        '''
+        Get all the UTXOs owned by a public key. Requires the set to be created with index_owners
+
+        Args:
+            owner_pk (bytes): DER public key of the owner
+        Return:
+            List[UTXO]: The owned UTXOs
+        '''
+
+        if not self.index_owners:
+            logger.error('UTXO set was not created with an owner index')
+            return []
+
+        result: List[UTXO] = [utxo for utxo in self.utxos.values() if utxo.owner_pk == owner_pk]
+
+        if self.db is None: return result
+
+        for txid, index, amount in self.db.execute(
+            'SELECT txid, idx, amount FROM utxos WHERE owner = ?', (owner_pk,)
+        ):
+            if (txid, index) in self.spent or (txid, index) in self.utxos: continue
+
+            result.append(UTXO(owner_pk = owner_pk, amount = amount, index = index, txid = txid))
+
+        return result
+
+    def iter_utxos(self) -> Iterator[UTXO]:
+        '''
+        Iterate over every UTXO in the set, including the unsaved changes
+        '''
+
+        yield from self.utxos.values()
+
+        if self.db is None: return
+
+        for txid, index, owner, amount in self.db.execute('SELECT txid, idx, owner, amount FROM utxos'):
+            if (txid, index) in self.spent or (txid, index) in self.utxos: continue
+
+            yield UTXO(owner_pk = owner, amount = amount, index = index, txid = txid)
+
+    def clear(self) -> bool:
+        '''
+        Delete every UTXO, stored ones included, and reset the height. Used to rebuild the set
+
+        Return:
+            bool: Whether the database was cleared
+        '''
+
+        self.utxos.clear()
+        self.spent.clear()
+        self.currently_scanned_height = -1
+
+        if not self.open_database() or self.db is None:
+            return False
+
+        try:
+            with self.db:
+                self.db.execute('DELETE FROM utxos')
+                self.db.execute('DELETE FROM meta WHERE key = ?', ('height',))
+
+        except sqlite3.Error as e:
+            logger.critical(f'Error clearing UTXO set: {str(e)}')
+            return False
 
-        self.utxos.append(utxo)
         return True
 
     def utxo_count(self) -> int:
-        return len(self.utxos)
+
+        if self.db is None: return len(self.utxos)
+
+        stored = self.db.execute('SELECT COUNT(*) FROM utxos').fetchone()[0]
+
+        # Pending additions can replace stored rows, those are already counted
+        added = sum([1 for outpoint in self.utxos if self._db_get(outpoint) is None])
+
+        return stored + added - len(self.spent)
+
+    def close(self) -> None:
+        '''
+        Close the database, unsaved changes are lost
+        '''
+
+        if self.db is None: return
+
+        self.db.close()
+        self.db = None
@@ -196,21 +196,73 @@ def submit_block():
 
     return jsonify(rpc.add_block(block_data))
 
-@app.route('/submittx')
+@app.route('/submittx', methods = ['POST'])
 def submit_transaction():
     '''
-    Used to submit a transaction to the node
-    If the tx is valid it will be propagated to other peers
+    Used to submit a transaction to the node, either a single one under 'tx' or
+    a batch under 'txs'. The accepted ones will be propagated to other peers
     '''
-    return error_response('Unimplemented')
 
-@app.route('/getmempool')
+    req_data = request.get_json()
+
+    if not isinstance(req_data, dict):
+        return error_response('Invalid request')
+
+    if 'tx' in req_data:
+        if not isinstance(req_data['tx'], dict):
+            return error_response('TX must be a JSON object')
+
+        return jsonify(rpc.add_tx_to_mempool(req_data['tx'], source_host = request.remote_addr))
+
+    if 'txs' not in req_data:
+        return error_response('Invalid request')
+
+    if not isinstance(req_data['txs'], list):
+        return error_response('TXs must be in a list')
+
+    if len(req_data['txs']) == 0:
+        return error_response('No TXs given')
+
+    # TODO: Add this to RPC settings
+    if len(req_data['txs']) > 4096:
+        return error_response('Cannot submit more than 4096 TXs at a time')
+
+    return jsonify(rpc.add_txs_to_mempool(req_data['txs'], source_host = request.remote_addr))
+
+@app.route('/getmempool', methods = ['GET', 'POST'])
 def get_mempool():
     '''
-    Retrieves the node's current mempool of txs
+    Retrieves a page of the node's current mempool of txs
+    Optional params: offset, count & txids (only return the txids)
     '''
-    
-    return error_response('Unimplemented')
+
+    req_data = (request.get_json(silent = True) if request.method == 'POST' else request.args) or {}
+
+    offset = req_data.get('offset', 0)
+    count  = req_data.get('count', 256)
+
+    if not is_valid_digit(offset):
+        return error_response('Offset must be in int form')
+
+    if not is_valid_digit(count):
+        return error_response('Count must be in int form')
+
+    offset = int(offset)
+    count  = int(count)
+
+    if offset < 0:
+        return error_response('Offset must be >= 0')
+
+    if count <= 0:
+        return error_response('Count must be >= 1')
+
+    txids_only = str(req_data.get('txids', False)).lower() in ['true', '1']
+
+    # TODO: Add this to RPC settings, txids are small so more of them are allowed
+    if count > (4096 if txids_only else 256):
+        return error_response('Requested too many TXs at a time')
+
+    return jsonify(rpc.get_mempool(offset, count, txids_only))
 
 @app.route('/tophashexists', methods = ['POST'])
 def check_tophash_exists():
@@ -2,7 +2,7 @@
 import logging, time
 from typing import List, MutableMapping, Tuple
 
-from coretc import Chain, Block, ChainSettings
+from coretc import Chain, Block, ChainSettings, TX
 from coretc.status import BlockStatus
 from coretc.utils.generic import data_hexdigest, data_hexundigest, dump_json, load_json_from_file
 from coretc.utils.valid_data import valid_port, valid_host
@@ -236,19 +236,10 @@ class RPC:
             dict: The blocks' JSON data in dict form
         '''
         
-        # TODO: Make an actual bulk retrieval, this is dogshit for perf
-        
         with self.lock:
-            blocks: List[dict] = []
-
-            for height in range(block_height, min(block_height + block_count + 1, self.chain.get_height() + 1)):
-                blk = self.get_block(height, use_lock = False)
-
-                if 'error' in blk: return blk
-
-                blocks.append(blk)
+            blocks = self.chain.iter_blocks(block_height, block_count, get_top_fork = True)
 
-            return blocks
+            return [blk.to_json() for blk in blocks]
 
     def add_block(self, block_json: dict) -> dict:
         '''
@@ -321,24 +312,125 @@ class RPC:
 
         return sent_block_count, rej_block_count
 
-    def add_tx_to_mempool(self, tx_json: dict) -> bool:
+    def add_tx_to_mempool(self, tx_json: dict, source_host: str | None = None) -> dict:
         '''
         Used to add a transaction to the node's mempool and propagate it to other nodes
 
         Args:
             tx_json (dict): Transaction JSON in a Dictionary
+            source_host (str | None): Host that sent the transaction, it is not sent back there (DEFAULT=None)
         Returns:
-            bool: Whether the tx was added to the mempool
+            dict: Response status of the transaction addition
         '''
-        return False
 
-        # Check if the TX is already in the mempool
+        result = self.add_txs_to_mempool([tx_json], source_host = source_host)
+
+        return {'status': result['statuses'][0]}
+
+    def add_txs_to_mempool(self, txs_json: list, source_host: str | None = None) -> dict:
+        '''
+        Add a batch of transactions to the mempool, they are validated together. The ones
+        that are accepted get propagated to the peers in a single request per peer
+
+        Args:
+            txs_json (list): List of transaction JSON dictionaries
+            source_host (str | None): Host that sent the batch, it is not sent back there (DEFAULT=None)
+        Returns:
+            dict: Status of each transaction, in the order they were given & the accepted count
+        '''
+
+        with self.lock:
+            statuses: List[int] = []
+            parsed: List[TX] = []
+            parsed_positions: List[int] = []
+
+            for i, tx_json in enumerate(txs_json):
+                transaction = TX.from_json(tx_json) if isinstance(tx_json, dict) else None
+
+                if transaction is None:
+                    statuses.append(int(BlockStatus.INVALID_ERROR))
+                    continue
+
+                statuses.append(int(BlockStatus.TX_VALID))
+                parsed.append(transaction)
+                parsed_positions.append(i)
+
+            # TXs already in the mempool come back as duplicates, so only new ones are propagated
+            results = self.chain.add_transactions_to_mempool(parsed)
+            accepted: List[TX] = []
+
+            for position, transaction, result in zip(parsed_positions, parsed, results):
+                statuses[position] = int(result)
+
+                if result == BlockStatus.TX_VALID:
+                    accepted.append(transaction)
 
-        # Try to add to the mempool
+        logger.debug(f'Accepted {len(accepted)} of {len(txs_json)} submitted TXs to the mempool')
 
-        # Share with other peers if successful
+        # Propagated without the lock, the peers might submit them right back to this node
+        if len(accepted) > 0:
+            prop_count, prop_err_count = self.propagate_transactions(accepted, skip_host = source_host)
+
+            logger.info(f'{len(accepted)} TXs propagated to {prop_count} peers. Request failed for {prop_err_count} peers')
+
+        return {
+            'statuses': statuses,
+            'accepted': len(accepted)
+        }
+
+    def propagate_transactions(self, transactions: List[TX], skip_host: str | None = None) -> Tuple[int, int]:
+        '''
+        Propagate newly accepted mempool transactions to peers. Peers that already have them
+        reject them as duplicates and don't pass them on, so this does not loop.
+        MUST NOT be called with the RPC lock held
 
-        # Return whether the tx was accepted to the caller
+        Args:
+            transactions (List[TX]): Transactions to propagate
+            skip_host (str | None): Host the transactions came from, peers on it are skipped (DEFAULT=None)
+
+        Returns:
+            Tuple[int, int]: The number of peers the transactions were sent to and the number of failed requests
+        '''
+
+        sent_count: int = 0
+        err_count: int = 0
+
+        for peer in self.peer_manager.get_peers_used():
+            if peer.host == skip_host: continue
+
+            sent_count += 1
+
+            if len(self.rpc_client.submit_transactions(transactions, peer)) == 0:
+                err_count += 1
+
+        return sent_count, err_count
+
+    def get_mempool(self, offset: int, count: int, txids_only: bool = False) -> dict:
+        '''
+        Get a page of the mempool, transactions are in the order they were added
+
+        Args:
+            offset (int): Transactions to skip
+            count (int): Max transactions returned
+            txids_only (bool): Return only the txids instead of the full transactions (DEFAULT=False)
+        Returns:
+            dict: The total mempool size, the offset and the transactions (or txids)
+        '''
+
+        with self.lock:
+            entries = self.chain.memory_pool.get_entries(offset, count)
+
+            result = {
+                'total': len(self.chain.memory_pool),
+                'offset': offset
+            }
+
+            if txids_only:
+                result['txids'] = [data_hexdigest(entry.txid) for entry in entries]
+            else:
+                result['transactions'] = [entry.transaction.to_json() for entry in entries]
+
+            return result
 
     def get_info(self) -> dict:
         return {
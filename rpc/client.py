@@ -4,12 +4,13 @@ import logging, time
 from typing import List, Literal, Tuple
 
 from coretc.blocks import Block
+from coretc.transaction import TX
 from coretc.object_schemas import BLOCK_JSON_SCHEMA, is_schema_valid
 from coretc.status import BlockStatus
 from coretc.utils.generic import data_hexdigest, data_hexundigest, is_valid_digit
 
 from .peers import Peer, PeerStatus
-from .rpcutils import make_rpc_request_raw
+from .rpcutils import make_rpc_request_raw, RPC_REQUEST_TIMEOUT
 
 logger = logging.getLogger('chain-rpc-client')
 
@@ -25,7 +26,8 @@ class RPCClient:
                      method: Literal['GET', 'POST'] = 'POST',
                      peer: Peer | None = None,
                      update_peer: bool = True,
-                     log_error: bool = True) -> Tuple[dict, bool]:
+                     log_error: bool = True,
+                     timeout: float = RPC_REQUEST_TIMEOUT) -> Tuple[dict, bool]:
         
         '''
         Make a request to the selected peer (or one given manually) at a specific endpoint
@@ -37,6 +39,7 @@ class RPCClient:
             peer (Peer): Alternate peer to use instead of the selected one (DEFAULT=None)
             update_peer (bool): Whether the last_seen of the peer will be updated (DEFAULT=True)
             log_error (bool): Whether an error will be logged if encountered (DEFAULT=True)
+            timeout (float): Seconds to wait for the peer (DEFAULT=RPC_REQUEST_TIMEOUT)
 
         Returns:
             dict: Resulting JSON rpc data
@@ -52,7 +55,8 @@ class RPCClient:
         response_json, err = make_rpc_request_raw(
             peer.form_url(endpoint),
             json_data = json_data,
-            method = method
+            method = method,
+            timeout = timeout
         )
         
         if err:
@@ -401,6 +405,48 @@ class RPCClient:
 
         return blockstatus
     
+    def submit_transactions(self, transactions: List[TX], peer: Peer | None = None) -> List[BlockStatus]:
+        '''
+        Submit a batch of transactions to another node's mempool in one request
+
+        Args:
+            transactions (List[TX]): Transactions to share
+            peer (Peer | None): Default is None. If none use the selected peer
+        Returns:
+            List[BlockStatus]: Status of each transaction from the other peer, empty on error
+        '''
+
+        peer = peer or self.selected_peer
+
+        if peer is None:
+            logger.critical('Cannot submit transactions when no peer is specified')
+            return []
+
+        response_json, err = self.send_request(
+            endpoint = '/submittx',
+            json_data = {'txs': [tx.to_json() for tx in transactions]},
+            method = 'POST',
+            peer = peer
+        )
+
+        if err: return []
+
+        if 'error' in response_json:
+            logger.error(f'Error submitting TXs to {peer.hoststr()}: {response_json["error"]}')
+            return []
+
+        statuses = response_json.get('statuses')
+
+        if not isinstance(statuses, list) or not len(statuses) == len(transactions):
+            logger.error(f'Invalid response from {peer.hoststr()} where TXs were submitted')
+            return []
+
+        try:
+            return [BlockStatus(int(status)) for status in statuses]
+        except (ValueError, TypeError):
+            logger.error(f'Unknown TX status code returned by {peer.hoststr()}')
+            return []
+
     def get_foreign_peers(self, peer: Peer | None = None) -> dict:
         '''
         Get the peer list of a foreign node
@@ -13,6 +13,9 @@ from jsonschema import validate as validate_schema
 
 logger = logging.getLogger('chain-rpc')
 
+# Seconds to wait on a peer, a peer that never answers must not hang the caller (who might hold the RPC lock)
+RPC_REQUEST_TIMEOUT = 10
+
 class NetworkType(IntEnum):
     MAINNET = 0
     TESTNET = 1
@@ -23,7 +26,8 @@ class PeerStatus(IntEnum):
     LIMITED = 2
     BANNED  = 3
 
-def make_rpc_request_raw(url: str, json_data: dict | None = None, method: Literal['POST', 'GET'] = 'POST') -> Tuple[dict, bool]:
+def make_rpc_request_raw(url: str, json_data: dict | None = None, method: Literal['POST', 'GET'] = 'POST',
+                         timeout: float = RPC_REQUEST_TIMEOUT) -> Tuple[dict, bool]:
     '''
     Make an RPC request to a Peer and return any returned JSON data
 
@@ -31,14 +35,17 @@ def make_rpc_request_raw(url: str, json_data: dict | None = None, method: Litera
         url (str): Peer RPC endpoint to access
         json_data (dict | None): JSON data to send (DEFAULT=None)
         method: Literal['post', 'get']: HTTP Method to use, default is POST
+        timeout (float): Seconds to wait for the peer (DEFAULT=RPC_REQUEST_TIMEOUT)
     Returns:
         dict: JSON response data if it exists. If an error occurs it will be present under the key 'error' in the dict.
     '''
 
     try:
-        r = requests.request(method, url, json = json_data)
+        r = requests.request(method, url, json = json_data, timeout = timeout)
     except requests.exceptions.ConnectionError:
         return ({'error': f'Unable to connect to {url}'}, True)
+    except requests.exceptions.Timeout:
+        return ({'error': f'Timed out accessing {url}'}, True)
     except BaseException as e:
         logger.error(f'Exception when attempting to access {url}: {str(e)}')
         return ({'error': f'Exception while accessing {url}: {str(e)}'}, True)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# Add the ../ directory to PATH to be able to use coretc
+import os,sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time, struct
+
+from coretc import Block, Wallet
+from coretc.blocks import BLOCK_VERSION_MERKLE, BLOCK_VERSION_MIDSTATE
+from coretc.miner import ParallelMiner, mine_block_generic, mine_block_midstate
+
+# Number of hashes timed per block size
+HASH_ROUNDS = 20000
+
+# Roughly 65536 attempts per block
+BENCH_DIFFICULTY = 0x1f010000
+BENCH_BLOCKS = 8
+
+def build_block(tx_count: int, version: int = BLOCK_VERSION_MERKLE) -> Block:
+    '''
+    Create an unmined block with tx_count reward transactions
+    '''
+
+    wallet = Wallet.generate()
+    txs = [wallet.create_reward_transaction(1.) for _ in range(tx_count)]
+
+    return Block(b'\x00'*32, int(time.time()), BENCH_DIFFICULTY, b'', txs, version)
+
+def time_hashing(blk: Block, rounds: int) -> float:
+    '''
+    Time the plain loop that mine_block used to run, without checking against the target
+
+    Returns:
+        float: Average seconds per hash
+    '''
+
+    t0 = time.perf_counter()
+
+    for counter in range(rounds):
+        blk.timestamp = int(time.time())
+        blk.nonce = struct.pack('Q', counter)
+        blk.hash_sha256()
+
+    return (time.perf_counter() - t0) / rounds
+
+def time_mining(version: int, miner) -> float:
+    '''
+    Mine a few blocks with the given miner function
+
+    Returns:
+        float: Hashes per second
+    '''
+
+    attempts = 0
+    t0 = time.perf_counter()
+
+    for _ in range(BENCH_BLOCKS):
+        attempts += miner(build_block(10, version))[1]
+
+    return attempts / (time.perf_counter() - t0)
+
+def time_parallel_mining(workers: int) -> float:
+    '''
+    Mine a few version 3 blocks with the ParallelMiner
+
+    Returns:
+        float: Total hashes per second of all workers
+    '''
+
+    miner = ParallelMiner(workers)
+
+    attempts = 0
+    t0 = time.perf_counter()
+
+    for _ in range(BENCH_BLOCKS):
+        result = miner.mine(build_block(10, BLOCK_VERSION_MIDSTATE))
+
+        if result is not None:
+            attempts += sum(result[1])
+
+    return attempts / (time.perf_counter() - t0)
+
+def main():
+
+    print(f'{"TXs":>6} | {"us/hash":>10} | {"hashes/s":>10}')
+    print('-'*32)
+
+    for tx_count in [0, 1, 10, 100, 1000]:
+        blk = build_block(tx_count)
+        per_hash = time_hashing(blk, HASH_ROUNDS)
+
+        print(f'{tx_count:>6} | {per_hash * 1e6:>10.2f} | {1 / per_hash:>10.0f}')
+
+    print()
+
+    generic  = time_mining(BLOCK_VERSION_MERKLE, mine_block_generic)
+    midstate = time_mining(BLOCK_VERSION_MIDSTATE, mine_block_midstate)
+
+    print(f'Generic miner  (v{BLOCK_VERSION_MERKLE}): {generic:>10.0f} hashes/s')
+    print(f'Midstate miner (v{BLOCK_VERSION_MIDSTATE}): {midstate:>10.0f} hashes/s ({midstate / generic:.1f}x)')
+
+    workers = os.cpu_count() or 1
+    parallel = time_parallel_mining(workers)
+
+    print(f'Parallel miner ({workers} workers): {parallel:>10.0f} hashes/s ({parallel / midstate:.1f}x)')
+
+if __name__ == '__main__': main()
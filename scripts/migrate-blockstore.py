@@ -0,0 +1,21 @@
+#!./venv/bin/python3
+
+# Converts a legacy block store (BSON .dat files) into the binary block store format
+# Usage: scripts/migrate-blockstore.py ./node-data/data/blocks/ [blocks per file]
+
+import os, sys, argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from coretc.blockstorage import migrate_legacy_store
+from coretc.settings import ChainSettings
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Migrate a legacy BSON block store to the binary format')
+    parser.add_argument('directory', type = str, help = 'Block store directory containing the .dat files')
+    parser.add_argument('blocks_per_file', type = int, nargs = '?', default = ChainSettings.blocks_per_store_file,
+                        help = 'Blocks per store file of the new store')
+
+    args = parser.parse_args()
+
+    if migrate_legacy_store(args.directory, args.blocks_per_file) < 0:
+        sys.exit(1)
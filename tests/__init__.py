@@ -7,6 +7,11 @@ from tests.misc_tests import TestMisc
 from tests.forktree_tests import TestForkTree
 from tests.txvalidation_tests import TestTXValidation
 from tests.txsecurity_tests import TXSecurity
+from tests.utxoset_tests import TestUTXOSet
+from tests.blockstorage_tests import TestBlockStorage
+from tests.merkle_tests import TestMerkle
+from tests.blocktemplate_tests import TestBlockTemplate
+from tests.mempool_tests import TestMemPool
 
 def init_test_suite() -> unittest.TestSuite:
     suite = unittest.TestSuite()
@@ -16,6 +21,11 @@ def init_test_suite() -> unittest.TestSuite:
     suite.addTest(unittest.makeSuite(TestChain))
     suite.addTest(unittest.makeSuite(TestTXValidation))
     suite.addTest(unittest.makeSuite(TXSecurity))
+    suite.addTest(unittest.makeSuite(TestUTXOSet))
+    suite.addTest(unittest.makeSuite(TestBlockStorage))
+    suite.addTest(unittest.makeSuite(TestMerkle))
+    suite.addTest(unittest.makeSuite(TestBlockTemplate))
+    suite.addTest(unittest.makeSuite(TestMemPool))
 
     suite.addTest(unittest.makeSuite(TestForkTree))
 
@@ -0,0 +1,194 @@
+import unittest, shutil, os, bson
+
+from typing import List
+
+from coretc import Block, TX, Wallet
+from coretc.blockstorage import BlockStorage
+
+from tests.helpers import CHAIN_PATH, create_example_block
+
+STORE_PATH = CHAIN_PATH + 'blockstore-test/'
+
+class TestBlockStorage(unittest.TestCase):
+
+    def setUp(self) -> None:
+        if os.path.exists(STORE_PATH):
+            shutil.rmtree(STORE_PATH)
+
+        self.blocks: List[Block] = []
+        prev = b'\x00'*32
+
+        for _ in range(10):
+            blk = create_example_block(prev = prev)
+            prev = blk.hash_sha256()
+
+            self.blocks.append(blk)
+
+    def test_blockstorage_store_load(self) -> None:
+
+        store = BlockStorage(STORE_PATH, 4)
+        self.assertEqual(store.height, 0)
+
+        store.store_blocks(self.blocks[:6])
+        store.store_blocks(self.blocks[6:])
+
+        self.assertEqual(store.height, 10)
+
+        # Reopen so nothing is served from the cache of the writer
+        store = BlockStorage(STORE_PATH, 4)
+
+        self.assertEqual(store.height, 10)
+        self.assertEqual(store.get_store_tophash(), self.blocks[-1].hash_sha256())
+
+        for height, blk in enumerate(self.blocks, start = 1):
+            stored = store.get_block(height)
+
+            self.assertIsNotNone(stored, f'Block at height {height} missing')
+            if stored is None: return
+
+            self.assertEqual(stored.hash_sha256(), blk.hash_sha256())
+
+        self.assertIsNone(store.get_block(11))
+        self.assertIsNone(store.get_block(0))
+
+        # Raw records are served straight from the mapped store files
+        records = store.get_blocks_bytes(3, 5)
+
+        self.assertEqual([bytes(record) for record in records],
+                         [blk.to_bytes() for blk in self.blocks[2:7]])
+
+        # Mappings follow the files as they grow
+        extra = create_example_block(prev = self.blocks[-1].hash_sha256())
+        store.store_blocks([extra])
+
+        raw_top = store.get_block_bytes(11)
+
+        self.assertIsNotNone(raw_top)
+        if raw_top is None: return
+
+        self.assertEqual(bytes(raw_top), extra.to_bytes())
+
+    def test_blockstorage_cache(self) -> None:
+
+        store = BlockStorage(STORE_PATH, 4)
+        store.store_blocks(self.blocks)
+
+        store = BlockStorage(STORE_PATH, 4, cache_size = 6)
+
+        first = store.get_block(1)
+
+        self.assertEqual(store.block_cache.misses, 1)
+        self.assertIs(store.get_block(1), first)
+        self.assertEqual(store.block_cache.hits, 1)
+
+        self.assertIsNotNone(first)
+        if first is None: return
+
+        self.assertIs(store.get_block_by_hash(first.hash_sha256()), first)
+
+        # Bulk reads cache the whole range
+        blocks = store.get_blocks(2, 4)
+
+        self.assertEqual([blk.hash_sha256() for blk in blocks],
+                         [blk.hash_sha256() for blk in self.blocks[1:5]])
+
+        for height in range(2, 6):
+            self.assertIs(store.get_block(height), blocks[height - 2])
+
+        # Bounded size
+        self.assertEqual(len(store.get_blocks(1, 20)), 10)
+        self.assertLessEqual(len(store.block_cache), 6)
+
+    def test_blockstorage_binary_records(self) -> None:
+
+        a = Wallet.generate()
+        b = Wallet.generate()
+
+        reward = a.create_reward_transaction(10.)
+        a.owned_utxos += reward.get_output_references()
+
+        send = a.create_transaction_single(b.get_pk_bytes(), 2.5)
+
+        self.assertIsNotNone(send)
+        if send is None: return
+
+        blk = create_example_block(mine = False)
+        blk.transactions = [reward, send]
+
+        blk_copy = Block.from_bytes(blk.to_bytes())
+
+        self.assertIsNotNone(blk_copy, 'Error parsing the binary block record')
+        if blk_copy is None: return
+
+        self.assertEqual(blk.hash_sha256(), blk_copy.hash_sha256())
+        self.assertEqual(blk_copy.transactions[1].inputs[0].signature, send.inputs[0].signature)
+        self.assertEqual(blk_copy.transactions[1].to_json(), send.to_json())
+
+        self.assertIsNone(Block.from_bytes(blk.to_bytes()[:-1]), 'Truncated record should be rejected')
+        self.assertIsNone(TX.from_bytes(send.to_bytes() + b'\x00'), 'Trailing data should be rejected')
+
+    def test_blockstorage_migration(self) -> None:
+
+        os.makedirs(STORE_PATH)
+
+        # Legacy format, BSON files of block JSON
+        for i in range(0, 10, 4):
+            with open(STORE_PATH + f'{hex(i // 4)[2:]}.dat', 'wb') as f:
+                f.write(bson.dumps({'blocks': [blk.to_json() for blk in self.blocks[i:i + 4]]}))
+
+        store = BlockStorage(STORE_PATH, 4)
+
+        self.assertEqual(store.height, 10)
+        self.assertTrue(os.path.exists(STORE_PATH + 'legacy/0.dat'))
+
+        for height, blk in enumerate(self.blocks, start = 1):
+            stored = store.get_block(height)
+
+            self.assertIsNotNone(stored)
+            if stored is None: return
+
+            self.assertEqual(stored.hash_sha256(), blk.hash_sha256())
+
+    def test_blockstorage_recovery(self) -> None:
+
+        store = BlockStorage(STORE_PATH, 4)
+        store.store_blocks(self.blocks[:5])
+        store.close()
+
+        # Crash in the middle of an index write
+        with open(STORE_PATH + 'blocks.idx', 'ab') as f:
+            f.write(b'\x01\x02\x03')
+
+        store = BlockStorage(STORE_PATH, 4)
+        self.assertEqual(store.height, 5)
+
+        store.store_blocks(self.blocks[5:])
+
+        for height, blk in enumerate(self.blocks, start = 1):
+            stored = store.get_block(height)
+
+            self.assertIsNotNone(stored)
+            if stored is None: return
+
+            self.assertEqual(stored.hash_sha256(), blk.hash_sha256())
+
+        store.close()
+
+    def test_blockstorage_failed_migration(self) -> None:
+
+        os.makedirs(STORE_PATH)
+
+        with open(STORE_PATH + '0.dat', 'wb') as f:
+            f.write(bson.dumps({'blocks': [blk.to_json() for blk in self.blocks[:4]]}))
+
+        with open(STORE_PATH + '1.dat', 'wb') as f:
+            f.write(b'Not a BSON file')
+
+        # Half a chain must not be loaded, the legacy files stay for another attempt
+        with self.assertRaises(RuntimeError):
+            BlockStorage(STORE_PATH, 4)
+
+        self.assertTrue(os.path.exists(STORE_PATH + '0.dat'))
+        self.assertTrue(os.path.exists(STORE_PATH + '1.dat'))
+        self.assertFalse(os.path.exists(STORE_PATH + 'blocks.idx'))
+        self.assertFalse(os.path.exists(STORE_PATH + '0.blk'))
@@ -0,0 +1,99 @@
+import unittest
+
+from coretc import Wallet, BlockStatus, mine_block
+from coretc.blocktemplate import BlockTemplate
+
+from tests.helpers import create_funded_chain, create_spend_tx
+
+class TestBlockTemplate(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.wallet = Wallet.generate()
+        self.receiver = Wallet.generate()
+
+        self.chain, self.rewards = create_funded_chain(self.wallet, 2)
+        self.template = BlockTemplate(self.chain, self.wallet.get_pk_bytes())
+
+    def test_template_fee_order(self) -> None:
+
+        low = create_spend_tx(self.wallet, self.rewards[0], self.receiver, 0.5)
+        high = create_spend_tx(self.wallet, self.rewards[1], self.receiver, 2.)
+
+        self.chain.memory_pool.add_transaction(1, low)
+        self.chain.memory_pool.add_transaction(2, high)
+
+        blk = self.template.create_block()
+
+        self.assertEqual(blk.previous_hash, self.chain.get_tophash())
+        self.assertEqual(len(blk.transactions), 3)
+        self.assertEqual(len(blk.transactions[0].inputs), 0, 'The reward must be the first TX')
+        self.assertEqual(blk.transactions[0].outgoing_funds(), self.chain.get_top_blockreward())
+
+        self.assertEqual(blk.transactions[1].get_txid(), high.get_txid(), 'Higher fee rate TX should come first')
+        self.assertEqual(blk.transactions[2].get_txid(), low.get_txid())
+
+        self.assertEqual(self.chain.add_block(mine_block(blk)), BlockStatus.VALID)
+
+    def test_template_conflicts_and_limits(self) -> None:
+
+        first = create_spend_tx(self.wallet, self.rewards[0], self.receiver, 0.5)
+        double_spend = create_spend_tx(self.wallet, self.rewards[0], self.receiver, 1.)
+        other = create_spend_tx(self.wallet, self.rewards[1], self.receiver, 0.1)
+
+        for i, transaction in enumerate([first, other]):
+            self.chain.memory_pool.add_transaction(i, transaction)
+
+        # The mempool turns away conflicts, but the template must not rely on it
+        self.assertFalse(self.chain.memory_pool.add_transaction(2, double_spend))
+        self.template.add_transaction(double_spend)
+
+        txids = [tx.get_txid() for tx in self.template.create_block().transactions[1:]]
+
+        self.assertEqual(txids, [double_spend.get_txid(), other.get_txid()],
+                         'Only the better paying of two conflicting TXs should be picked')
+
+        self.template.remove_transaction(double_spend.get_txid())
+
+        # Removals are followed from the mempool
+        self.chain.memory_pool.remove_transaction(other.get_txid())
+
+        txids = [tx.get_txid() for tx in self.template.create_block().transactions[1:]]
+
+        self.assertEqual(txids, [first.get_txid()])
+
+        # Only what fits in the size limit is picked
+        self.chain.memory_pool.add_transaction(3, other)
+
+        picked = self.template.select_transactions(first.get_size())
+
+        self.assertEqual([tx.get_txid() for tx in picked], [first.get_txid()])
+
+        self.template.close()
+        self.chain.memory_pool.remove_transaction(first.get_txid())
+
+        self.assertIn(first.get_txid(), self.template.candidates, 'Closed templates stop following the mempool')
+
+    def test_template_queue_upkeep(self) -> None:
+
+        low = create_spend_tx(self.wallet, self.rewards[0], self.receiver, 0.5)
+        high = create_spend_tx(self.wallet, self.rewards[1], self.receiver, 2.)
+
+        self.chain.memory_pool.add_transaction(1, low)
+        self.chain.memory_pool.add_transaction(2, high)
+
+        self.assertEqual(len(self.template.select_transactions(1 << 20)), 2)
+        self.assertEqual(len(self.template.queue), 2, 'Picked TXs stay queued until the mempool drops them')
+
+        # Entries of removed TXs are dropped once they are popped
+        self.chain.memory_pool.remove_transaction(high.get_txid())
+
+        picked = self.template.select_transactions(1 << 20)
+
+        self.assertEqual([tx.get_txid() for tx in picked], [low.get_txid()])
+        self.assertEqual(len(self.template.queue), 1)
+
+        # Clearing the mempool (like reloading it does) is followed too
+        self.chain.memory_pool.clear()
+
+        self.assertEqual(len(self.template.candidates), 0)
+        self.assertEqual(self.template.select_transactions(1 << 20), [])
@@ -1,13 +1,15 @@
 
-import unittest
+import unittest, shutil, os
 
-from coretc import Chain, ForkBlock
+from coretc import Chain, ForkBlock, Wallet, mine_block
 from coretc import ChainSettings, BlockStatus
 
 from coretc.blocks import Block
-from tests.helpers import create_empty_chain, create_example_block 
+from coretc.blockstorage import BlockStorage
+from tests.helpers import create_empty_chain, create_example_block, create_funded_chain
 
 CHAIN_PATH = './pytests-chain-tmp/'
+SYNC_PATH = CHAIN_PATH + 'sync-test/'
 
 class TestChain(unittest.TestCase):
 
@@ -77,3 +79,137 @@ class TestChain(unittest.TestCase):
         res = chain.add_block(newblock)
 
         self.assertNotEqual(res, BlockStatus.VALID)
+
+    def test_tip_listeners(self) -> None:
+
+        chain = create_empty_chain()
+        tips: list[bytes] = []
+
+        chain.add_tip_listener(tips.append)
+
+        first = create_example_block()
+        chain.add_block(first)
+
+        self.assertEqual(tips, [first.hash_sha256()])
+
+        # Rejected blocks leave the tip alone
+        chain.add_block(create_example_block(prev = b'\x69'*32))
+
+        self.assertEqual(len(tips), 1)
+
+        second = create_example_block(prev = first.hash_sha256())
+        chain.add_block(second)
+
+        self.assertEqual(tips, [first.hash_sha256(), second.hash_sha256()])
+
+        # Listeners only hear about actual changes, even with competing forks
+        side = create_example_block(prev = first.hash_sha256(), mine = False)
+        side.nonce = b'Side fork'
+        chain.add_block(mine_block(side))
+
+        self.assertEqual(tips[-1], chain.get_tophash())
+        self.assertNotEqual(tips[-1], tips[-2])
+
+        chain.remove_tip_listener(tips.append)
+        count = len(tips)
+
+        chain.add_block(create_example_block(prev = chain.get_tophash()))
+
+        self.assertEqual(len(tips), count)
+
+    def test_block_range(self) -> None:
+
+        chain = create_empty_chain()
+
+        hashes: list[bytes] = []
+
+        for _ in range(12):
+            blk = create_example_block(prev = chain.get_tophash())
+            chain.add_block(blk)
+            hashes.append(blk.hash_sha256())
+
+        # Some of the blocks are established by now, the rest still in the fork tree
+        self.assertGreater(len(chain.blocks), 0)
+        self.assertIsNotNone(chain.forks)
+
+        for height in range(1, 13):
+            blk = chain.get_block_by_height(height, get_top_fork = True)
+
+            self.assertIsNotNone(blk)
+            if blk is None: return
+
+            self.assertEqual(blk.hash_sha256(), hashes[height - 1])
+
+        self.assertIsNone(chain.get_block_by_height(13, get_top_fork = True))
+
+        span = [blk.hash_sha256() for blk in chain.iter_blocks(1, 12, get_top_fork = True)]
+        self.assertEqual(span, hashes)
+
+        # Spans crossing from the established blocks into the fork, and past the top
+        span = [blk.hash_sha256() for blk in chain.iter_blocks(len(chain.blocks) - 1, 4, get_top_fork = True)]
+        self.assertEqual(span, hashes[len(chain.blocks) - 2:len(chain.blocks) + 2])
+
+        span = [blk.hash_sha256() for blk in chain.iter_blocks(10, 10, get_top_fork = True)]
+        self.assertEqual(span, hashes[9:])
+
+        if chain.forks is None: return
+
+        # A side fork off the fork tree root, lookups on it walk up from it's tip
+        side = create_example_block(prev = chain.forks.block.hash_sha256(), mine = False)
+        side.nonce = b'Side fork'
+        side = mine_block(side)
+        chain.add_block(side)
+
+        side_fork = chain.forks.get_block_by_hash(side.hash_sha256())
+
+        self.assertIsNotNone(side_fork)
+        if side_fork is None: return
+
+        self.assertIs(side_fork.get_ancestor(1), chain.forks)
+
+        height = chain.get_established_height() + 2
+        self.assertEqual(chain.get_block_by_height(height, fork = side_fork), side)
+        self.assertNotEqual(chain.get_block_by_height(height, get_top_fork = True), side)
+
+        span = list(chain.iter_blocks(height - 1, 2, fork = side_fork))
+        self.assertEqual(span[-1], side)
+        self.assertEqual(len(span), 2)
+
+    def test_utxoset_store_sync(self) -> None:
+
+        wallet = Wallet.generate()
+        funded, rewards = create_funded_chain(wallet, blocks = 4)
+        funded.merge_all()
+
+        if os.path.exists(SYNC_PATH):
+            shutil.rmtree(SYNC_PATH)
+
+        # Blocks stored but the UTXO set never saved, like a crash between the two
+        BlockStorage(SYNC_PATH + 'blocks/', 2).store_blocks(funded.blocks)
+
+        def load_chain() -> Chain:
+            return Chain(ChainSettings(
+                blocks_per_store_file = 2,
+                block_data_directory = SYNC_PATH + 'blocks/',
+                utxo_set_path = SYNC_PATH + 'utxos.dat',
+                mempool_path = SYNC_PATH + 'mempool.dat',
+                debug_log_dir = SYNC_PATH + 'debug/'
+            ))
+
+        chain = load_chain()
+
+        self.assertEqual(chain.utxo_set.currently_scanned_height, 4)
+        self.assertTrue(all(chain.utxo_set.utxo_exists(utxo.txid, utxo.index) for utxo in rewards))
+
+        # A UTXO set ahead of the store gets rebuilt from the stored blocks
+        chain.utxo_set.utxo_remove(rewards[0].txid, rewards[0].index)
+        chain.utxo_set.currently_scanned_height = 6
+        chain.utxo_set.save_utxos()
+        chain.utxo_set.close()
+
+        chain = load_chain()
+
+        self.assertEqual(chain.utxo_set.currently_scanned_height, 4)
+        self.assertTrue(all(chain.utxo_set.utxo_exists(utxo.txid, utxo.index) for utxo in rewards))
+
+        chain.utxo_set.close()
@@ -1,10 +1,12 @@
 
-import unittest
+import unittest, random
 
 from coretc import ForkBlock, Block, mine_block
 from coretc import Chain, ChainSettings
 
-from tests.helpers import create_example_block, forktree_from_json
+from coretc import Wallet
+
+from tests.helpers import create_example_block, create_signed_tx, forktree_from_json
 
 class TestForkTree(unittest.TestCase):
 
@@ -91,3 +93,124 @@ class TestForkTree(unittest.TestCase):
 
         self.assertEqual(child.get_linear_count(), 3,
                          'Child node exhibits 3 fold linearity')
+
+    def test_forktree_utxo_overlay(self) -> None:
+
+        wallet = Wallet.generate()
+
+        reward = wallet.create_reward_transaction(10.)
+        reward_out = reward.get_output_references()[0]
+
+        spend = create_signed_tx(wallet, [reward_out], [(wallet.get_pk_bytes(), 9.)])
+        spend_out = spend.get_output_references()[0]
+
+        root_block = create_example_block(mine = False)
+        root_block.transactions = [reward]
+
+        root = ForkBlock(None, root_block)
+
+        spending_block = create_example_block(prev = root_block.hash_sha256(), mine = False)
+        spending_block.transactions = [spend]
+
+        side = root.append_block(create_example_block(prev = root_block.hash_sha256()))
+        spending = root.append_block(spending_block)
+        tip = spending.append_block(create_example_block(prev = spending_block.hash_sha256()))
+
+        outpoint = reward_out.get_outpoint()
+
+        self.assertFalse(side.is_utxo_spent(outpoint), 'Spent in the other branch only')
+        self.assertEqual(side.get_fork_utxo(outpoint), reward_out)
+
+        self.assertTrue(tip.is_utxo_spent(outpoint), 'Spends in parents should be seen')
+        self.assertIsNone(tip.get_fork_utxo(outpoint))
+        self.assertEqual(tip.get_fork_utxo(spend_out.get_outpoint()), spend_out)
+
+        used, added = tip.get_fork_utxoset()
+
+        self.assertEqual(used, [], 'Created & spent in the fork, so it is in neither')
+        self.assertEqual(added, [spend_out])
+
+        # Once the spending block is the root the reward comes from outside the fork
+        spending.make_root()
+
+        used, added = tip.get_fork_utxoset()
+
+        self.assertEqual(used, [reward_out])
+        self.assertEqual(added, [spend_out])
+        self.assertTrue(tip.is_utxo_spent(outpoint))
+        self.assertIsNone(tip.get_fork_utxo(outpoint))
+
+    def test_forktree_best_tip(self) -> None:
+
+        def walk_tallest(node: ForkBlock) -> ForkBlock:
+            while len(node.next) > 0:
+                node = node.get_tallest_subtree()
+            return node
+
+        rng = random.Random(1993)
+        root = ForkBlock(None, create_example_block(mine = False))
+        nodes = [root]
+
+        for _ in range(60):
+            parent = rng.choice(nodes)
+            nodes.append(parent.append_block(create_example_block(prev = parent.block.hash_sha256(), mine = False)))
+
+            tip, route = root.get_best_tip()
+
+            self.assertIs(tip, walk_tallest(root), 'Cached tip should match walking the tallest subtrees')
+            self.assertEqual(route, tip.get_block_route())
+            self.assertEqual(tip.get_block_route_len(), root.get_tree_height())
+
+        # Re-rooting keeps the tip, only the start of the route is dropped
+        new_root = root.get_tallest_subtree()
+        tip, route = root.get_best_tip()
+
+        new_root.make_root()
+
+        self.assertIs(new_root.get_best_tip()[0], tip)
+        self.assertEqual(new_root.get_best_tip()[1], route[1:])
+        self.assertEqual(tip.get_block_route_len(), len(route) - 1)
+
+    def test_forktree_reroot(self) -> None:
+
+        root: ForkBlock = forktree_from_json([[[], []], [[[[]]]]])
+        root.regenerate_cache()
+
+        self.assertEqual(len(root.hash_cache), 8)
+
+        new_root = root.next[1].next[0]
+        heights = [node.height for node in new_root.iterate_subtree()]
+
+        kept_leaf = new_root.get_tallest_leaf()
+        kept_maps = kept_leaf.fork_used
+        kept_depth = kept_leaf.depth
+
+        new_root.make_root()
+
+        # Nodes under the new root are not visited, their depth & root follow the tree anchor
+        self.assertIs(kept_leaf.fork_used, kept_maps)
+        self.assertIs(kept_leaf.root, new_root)
+        self.assertEqual(kept_leaf.depth, kept_depth - 2)
+        self.assertEqual(new_root.depth, 1)
+        self.assertIsNot(root.anchor, new_root.anchor, 'Dropped nodes should be on their own')
+
+        self.assertEqual(len(root.hash_cache), 0, 'The cache should have been handed over')
+        self.assertEqual(set(new_root.hash_cache.keys()), set(new_root.regenerate_cache().keys()),
+                         'Only the nodes under the new root should be left')
+        self.assertEqual(len(new_root.hash_cache), 3)
+
+        self.assertEqual([node.height for node in new_root.iterate_subtree()], heights)
+        self.assertEqual(new_root.regenerate_heights(), 2)
+        self.assertEqual([node.height for node in new_root.iterate_subtree()], heights)
+
+        # Deep forks don't recurse
+        leaf = new_root.get_tallest_leaf()
+
+        for _ in range(2000):
+            leaf = leaf.append_block(create_example_block(prev = leaf.block.hash_sha256(), mine = False))
+
+        self.assertEqual(len(new_root.regenerate_cache()), 2003)
+        self.assertEqual(new_root.regenerate_heights(), 2002)
+
+        # New nodes only get the UTXO layers from the root down, not the ones of merged blocks
+        self.assertEqual(len(leaf.fork_used.maps), leaf.depth)
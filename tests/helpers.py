@@ -3,7 +3,8 @@ from os.path import exists, isdir
 
 import os
 
-from typing import List
+from typing import List, Tuple
+from copy import deepcopy
 from coretc.wallet import Wallet
 from coretc import Chain, ChainSettings, Block, ForkBlock, TX, UTXO, difficulty, mine_block
 
@@ -83,3 +84,49 @@ def forktree_from_json(structure: list, node: ForkBlock | None = None) -> ForkBl
     return root
 
 
+
+def create_signed_tx(wallet: Wallet, inputs: List[UTXO], outputs: List[Tuple[bytes, float]]) -> TX:
+    '''
+    Spend the given (referenced) outputs of the wallet, whatever is not sent is left as a fee
+    '''
+
+    tx_outputs = [UTXO(owner_pk = pk, amount = amount, index = i) for i, (pk, amount) in enumerate(outputs)]
+    tx_inputs = [deepcopy(utxo) for utxo in inputs]
+
+    for utxo in tx_inputs:
+        utxo.sign(wallet.sk, tx_outputs)
+
+    tx = TX()
+    tx.add_inputs(tx_inputs)
+    tx.add_outputs(tx_outputs)
+
+    return tx.make()
+
+def create_spend_tx(wallet: Wallet, utxo: UTXO, receiver: Wallet, fee: float) -> TX:
+    '''
+    Send a whole (referenced) output of the wallet to the receiver, minus the fee
+    '''
+
+    return create_signed_tx(wallet, [utxo], [(receiver.get_pk_bytes(), utxo.amount - fee)])
+
+def create_funded_chain(wallet: Wallet, blocks: int = 2, chain: Chain | None = None) -> Tuple[Chain, List[UTXO]]:
+    '''
+    Create a chain of blocks whose rewards all go to the wallet, or add them to the given chain
+
+    Returns:
+        Tuple[Chain, List[UTXO]]: The chain and the reward outputs
+    '''
+
+    if chain is None:
+        chain = create_empty_chain()
+    rewards: List[UTXO] = []
+
+    for _ in range(blocks):
+        reward = wallet.create_reward_transaction(chain.get_top_blockreward())
+        blk = create_chain_block(chain, mine = False, txs = [reward])
+        blk.nonce = os.urandom(8)
+
+        chain.add_block(mine_block(blk))
+        rewards += reward.get_output_references()
+
+    return chain, rewards
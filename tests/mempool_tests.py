@@ -0,0 +1,259 @@
+import unittest, os, json, shutil
+
+from coretc import Chain, ChainSettings, Wallet, BlockStatus, mine_block
+from coretc.mempool import MemPool
+from coretc.sigverify import SignatureVerifier
+
+from tests.helpers import CHAIN_PATH, create_chain_block, create_example_block, create_funded_chain, create_signed_tx, create_spend_tx
+
+class TestMemPool(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.wallet = Wallet.generate()
+        self.receiver = Wallet.generate()
+
+        _, self.rewards = create_funded_chain(self.wallet, 4)
+
+    def test_mempool_indexes(self) -> None:
+
+        mempool = MemPool(CHAIN_PATH + 'mempool-test.dat')
+
+        first = create_spend_tx(self.wallet, self.rewards[0], self.receiver, 1.)
+        double_spend = create_spend_tx(self.wallet, self.rewards[0], self.receiver, 2.)
+
+        self.assertTrue(mempool.add_transaction(1, first))
+        self.assertFalse(mempool.add_transaction(1, first), 'Duplicate TX should be rejected')
+        self.assertFalse(mempool.add_transaction(2, double_spend), 'Conflicting TX should be rejected')
+
+        self.assertEqual(mempool.get_conflicts(double_spend), [first.get_txid()])
+        self.assertEqual(mempool.get_spender(self.rewards[0].get_outpoint()), first.get_txid())
+        self.assertIs(mempool.get_transaction(first.get_txid()), first)
+
+        self.assertTrue(mempool.remove_transaction(first.get_txid()))
+        self.assertFalse(mempool.remove_transaction(first.get_txid()))
+
+        self.assertIsNone(mempool.get_spender(self.rewards[0].get_outpoint()))
+        self.assertTrue(mempool.add_transaction(2, double_spend), 'Spent outpoint should be released on removal')
+
+        self.assertEqual(len(mempool), 1)
+        self.assertEqual(mempool.total_size, double_spend.get_size())
+
+    def test_mempool_eviction(self) -> None:
+
+        mempool = MemPool(CHAIN_PATH + 'mempool-test.dat', max_transactions = 2)
+
+        low = create_spend_tx(self.wallet, self.rewards[0], self.receiver, 0.1)
+        mid = create_spend_tx(self.wallet, self.rewards[1], self.receiver, 0.5)
+        high = create_spend_tx(self.wallet, self.rewards[2], self.receiver, 1.)
+        lowest = create_spend_tx(self.wallet, self.rewards[3], self.receiver, 0.01)
+
+        self.assertTrue(mempool.add_transaction(1, low))
+        self.assertTrue(mempool.add_transaction(2, mid))
+        self.assertTrue(mempool.add_transaction(3, high))
+
+        self.assertEqual(len(mempool), 2)
+        self.assertNotIn(low.get_txid(), mempool, 'Lowest fee rate TX should be evicted first')
+        self.assertIsNone(mempool.get_spender(self.rewards[0].get_outpoint()))
+
+        self.assertFalse(mempool.add_transaction(4, lowest), 'Full mempool should reject cheaper TXs')
+        self.assertEqual(len(mempool), 2)
+
+        # Size bound
+        mempool = MemPool(CHAIN_PATH + 'mempool-test.dat', max_size = low.get_size() + mid.get_size())
+
+        for i, transaction in enumerate([low, mid, high]):
+            mempool.add_transaction(i, transaction)
+
+        self.assertLessEqual(mempool.total_size, mempool.max_size)
+        self.assertEqual(set(tx.get_txid() for tx in mempool.get_transactions()), {mid.get_txid(), high.get_txid()})
+
+    def test_mempool_block_events(self) -> None:
+
+        chain, rewards = create_funded_chain(self.wallet, 2)
+        events: list = []
+
+        chain.add_block_listener(lambda blk, connected: events.append((blk.hash_sha256(), connected)))
+
+        pooled = create_spend_tx(self.wallet, rewards[0], self.receiver, 1.)
+        confirmed = create_spend_tx(self.wallet, rewards[0], self.receiver, 2.)
+        other = create_spend_tx(self.wallet, rewards[1], self.receiver, 1.)
+
+        chain.memory_pool.add_transaction(1, pooled)
+        chain.memory_pool.add_transaction(2, other)
+
+        fork_point = chain.get_tophash()
+
+        block_a = create_chain_block(chain, mine = False, txs = [confirmed, other])
+        chain.add_block(mine_block(block_a))
+
+        self.assertEqual(events, [(block_a.hash_sha256(), True)])
+        self.assertEqual(len(chain.memory_pool), 0, 'Confirmed TXs and their conflicts should leave the mempool')
+
+        # Reorg onto a longer branch without those transactions
+        block_b = create_example_block(prev = fork_point, mine = False)
+        block_b.difficulty_bits = chain.get_top_difficulty()
+        chain.add_block(mine_block(block_b))
+
+        block_c = create_example_block(prev = block_b.hash_sha256(), mine = False)
+        block_c.difficulty_bits = chain.get_top_difficulty()
+        chain.add_block(mine_block(block_c))
+
+        self.assertEqual(chain.get_tophash(), block_c.hash_sha256())
+        self.assertIn((block_a.hash_sha256(), False), events)
+        self.assertEqual(events[-1], (block_c.hash_sha256(), True))
+
+        self.assertEqual(set(tx.get_txid() for tx in chain.memory_pool.get_transactions()),
+                         {confirmed.get_txid(), other.get_txid()},
+                         'TXs of the orphaned block should be back in the mempool')
+
+    def test_mempool_reorg_revalidation(self) -> None:
+
+        chain, rewards = create_funded_chain(self.wallet, 2)
+
+        fork_point = chain.get_tophash()
+
+        # Old branch: a block confirming 2 TXs, then one spending an output it created
+        reward_a = self.wallet.create_reward_transaction(chain.get_top_blockreward())
+        kept = create_spend_tx(self.wallet, rewards[0], self.receiver, 1.)
+        conflicted = create_spend_tx(self.wallet, rewards[1], self.receiver, 1.)
+
+        chain.add_block(mine_block(create_chain_block(chain, mine = False, txs = [reward_a, kept, conflicted])))
+
+        child = create_spend_tx(self.wallet, reward_a.get_output_references()[0], self.receiver, 1.)
+        chain.add_block(mine_block(create_chain_block(chain, mine = False, txs = [child])))
+
+        self.assertEqual(len(chain.memory_pool), 0)
+
+        # Pooled spend of an output created on the old branch
+        grandchild = create_spend_tx(self.receiver, kept.get_output_references()[0], self.wallet, 0.5)
+        self.assertEqual(chain.add_transactions_to_mempool([grandchild]), [BlockStatus.TX_VALID])
+
+        # Longer branch, spending one of the same outputs differently
+        prev = fork_point
+
+        for txs in [[create_spend_tx(self.wallet, rewards[1], self.receiver, 2.)], [], []]:
+            blk = create_example_block(prev = prev, mine = False)
+            blk.difficulty_bits = chain.get_top_difficulty()
+            blk.transactions = txs
+
+            self.assertEqual(chain.add_block(mine_block(blk)), BlockStatus.VALID)
+            prev = blk.hash_sha256()
+
+        self.assertEqual(chain.get_tophash(), prev)
+
+        self.assertEqual([tx.get_txid() for tx in chain.memory_pool.get_transactions()], [kept.get_txid()],
+                         'Only the TXs still valid on the new tip should be back in the mempool')
+
+    def test_mempool_persistence(self) -> None:
+
+        path = CHAIN_PATH + 'mempool-persist-test.dat'
+
+        for suffix in ['', '.journal']:
+            if os.path.exists(path + suffix): os.remove(path + suffix)
+
+        txs = [create_spend_tx(self.wallet, self.rewards[i], self.receiver, 0.1 * (i + 1)) for i in range(4)]
+
+        mempool = MemPool(path)
+        self.assertTrue(mempool.load_mempool(), 'Missing files should load as an empty mempool')
+        self.assertTrue(mempool.open_journal())
+
+        # Same timestamps must not overwrite each other anymore
+        mempool.add_transaction(1, txs[0])
+        mempool.add_transaction(1, txs[1])
+
+        self.assertTrue(mempool.save_mempool())
+
+        # Changes after the snapshot only go to the journal
+        mempool.add_transaction(2, txs[2])
+        mempool.remove_transaction(txs[0].get_txid())
+        mempool.add_transaction(3, txs[3])
+        mempool.close_journal()
+
+        # Simulate a crash in the middle of a journal write
+        with open(path + '.journal', 'ab') as f:
+            f.write(b'\x01\x00\x00')
+
+        reloaded = MemPool(path)
+
+        self.assertTrue(reloaded.load_mempool())
+        self.assertEqual(set(reloaded.entries.keys()), {tx.get_txid() for tx in txs[1:]})
+        self.assertEqual(reloaded.get_entry(txs[1].get_txid()).timestamp, 1)
+        self.assertEqual(reloaded.get_spender(self.rewards[3].get_outpoint()), txs[3].get_txid())
+
+        # Old JSON mempool files are still readable
+        with open(path, 'w') as f:
+            json.dump({'7': txs[0].to_json()}, f)
+
+        os.remove(path + '.journal')
+
+        self.assertTrue(reloaded.load_mempool())
+        self.assertEqual(list(reloaded.entries.keys()), [txs[0].get_txid()])
+        self.assertEqual(reloaded.get_entry(txs[0].get_txid()).timestamp, 7)
+
+    def test_mempool_temporary_mode(self) -> None:
+
+        path = CHAIN_PATH + 'temp-mode/'
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+        chain, rewards = create_funded_chain(self.wallet, 2, Chain(ChainSettings(
+            block_data_directory = path + 'blocks/',
+            utxo_set_path = path + 'utxos.dat',
+            mempool_path = path + 'mempool.dat',
+            debug_log_dir = path + 'debug/'
+        )))
+
+        pooled = create_spend_tx(self.wallet, rewards[0], self.receiver, 1.)
+        self.assertEqual(chain.add_transactions_to_mempool([pooled]), [BlockStatus.TX_VALID])
+
+        # Like a sync, the journal is paused while the synced blocks confirm the TX
+        chain.set_temporary_mode(True)
+        chain.add_block(mine_block(create_chain_block(chain, mine = False, txs = [pooled])))
+        chain.set_temporary_mode(False)
+
+        self.assertEqual(len(chain.memory_pool), 0)
+
+        reloaded = MemPool(path + 'mempool.dat')
+
+        self.assertTrue(reloaded.load_mempool())
+        self.assertEqual(len(reloaded), 0, 'A TX confirmed in temporary mode must not come back after a restart')
+
+        chain.memory_pool.close_journal()
+        chain.utxo_set.close()
+
+    def test_mempool_batch_admission(self) -> None:
+
+        chain, rewards = create_funded_chain(self.wallet, 4)
+
+        # Force the worker pool even for a small batch
+        chain.signature_verifier = SignatureVerifier(workers = 2, parallel_min = 0)
+
+        valid = create_spend_tx(self.wallet, rewards[0], self.receiver, 1.)
+        double_spend = create_spend_tx(self.wallet, rewards[0], self.receiver, 2.)
+        forged = create_spend_tx(self.wallet, rewards[1], self.receiver, 1.)
+        forged.inputs[0].signature = create_spend_tx(self.wallet, rewards[2], self.receiver, 1.).inputs[0].signature
+        unknown = create_signed_tx(self.wallet, [rewards[3]], [(self.receiver.get_pk_bytes(), 1.)])
+        unknown.inputs[0].txid = b'\x11' * 32
+        unknown.invalidate_cache()
+
+        statuses = chain.add_transactions_to_mempool([valid, double_spend, forged, unknown, valid])
+        chain.signature_verifier.close()
+
+        self.assertEqual(statuses, [
+            BlockStatus.TX_VALID,
+            BlockStatus.INVALID_TX_UTXO_IS_SPENT,
+            BlockStatus.INVALID_TX_INPUTS,
+            BlockStatus.INVALID_TX_UTXO_IS_SPENT,
+            BlockStatus.INVALID_DUPLICATE
+        ])
+
+        self.assertEqual(len(chain.memory_pool), 1)
+        self.assertIn(valid.get_txid(), chain.memory_pool)
+
+        # Already pooled TXs are not accepted again in a later batch
+        second = create_spend_tx(self.wallet, rewards[1], self.receiver, 1.)
+        statuses = chain.add_transactions_to_mempool([valid, second])
+
+        self.assertEqual(statuses, [BlockStatus.INVALID_DUPLICATE, BlockStatus.TX_VALID])
+        self.assertEqual([entry.txid for entry in chain.memory_pool.get_entries(1, 5)], [second.get_txid()])
@@ -0,0 +1,80 @@
+import unittest
+
+from hashlib import sha256
+
+from coretc import Block, Wallet, mine_block
+from coretc.merkle import EMPTY_ROOT, merkle_root, merkle_proof, merkle_verify
+from coretc.status import BlockStatus
+
+from tests.helpers import create_empty_chain, create_example_block
+
+class TestMerkle(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.leaves = [sha256(bytes([i])).digest() for i in range(7)]
+
+    def test_merkle_root(self) -> None:
+
+        self.assertEqual(merkle_root([]), EMPTY_ROOT)
+        self.assertEqual(merkle_root(self.leaves[:1]), self.leaves[0])
+        self.assertEqual(merkle_root(self.leaves[:2]), sha256(self.leaves[0] + self.leaves[1]).digest())
+
+        # The odd node is promoted, duplicating it must change the root
+        self.assertNotEqual(merkle_root(self.leaves[:3]), merkle_root(self.leaves[:3] + self.leaves[2:3]))
+        self.assertNotEqual(merkle_root(self.leaves), merkle_root(self.leaves[::-1]))
+
+    def test_merkle_proofs(self) -> None:
+
+        for count in range(1, len(self.leaves) + 1):
+            root = merkle_root(self.leaves[:count])
+
+            for index in range(count):
+                proof = merkle_proof(self.leaves[:count], index)
+
+                self.assertIsNotNone(proof)
+                if proof is None: return
+
+                self.assertTrue(merkle_verify(self.leaves[index], proof, root),
+                                f'Proof of leaf {index}/{count} should be valid')
+                self.assertFalse(merkle_verify(b'\x00'*32, proof, root))
+
+        self.assertIsNone(merkle_proof(self.leaves, len(self.leaves)))
+
+    def test_merkle_block_header(self) -> None:
+
+        wallet = Wallet.generate()
+
+        blk: Block = create_example_block(mine = False)
+        blk._VERSION = 2
+
+        header_size = len(blk.get_header_bytes())
+
+        blk.transactions = [wallet.create_reward_transaction(1.) for _ in range(5)]
+
+        self.assertEqual(len(blk.get_header_bytes()), header_size, 'Version 2 headers must have a constant size')
+        self.assertEqual(blk.get_txdata(), merkle_root([tx.get_txid() for tx in blk.transactions]))
+
+        proof = blk.get_tx_proof(3)
+
+        self.assertIsNotNone(proof)
+        if proof is None: return
+
+        self.assertTrue(merkle_verify(blk.transactions[3].get_txid(), proof, blk.get_merkle_root()))
+
+    def test_merkle_block_versions(self) -> None:
+
+        chain = create_empty_chain()
+
+        blk = create_example_block()
+        self.assertEqual(chain.add_block(blk), BlockStatus.VALID)
+
+        blk = create_example_block(prev = blk.hash_sha256(), mine = False)
+        blk._VERSION = 2
+
+        self.assertEqual(chain.add_block(mine_block(blk)), BlockStatus.VALID,
+                         'Version 2 blocks should be accepted after version 1 ones')
+
+        blk = create_example_block(prev = blk.hash_sha256(), mine = False)
+        blk._VERSION = 200
+
+        self.assertEqual(chain.add_block(mine_block(blk)), BlockStatus.INVALID_VERSION)
@@ -1,10 +1,13 @@
 
-import unittest
+from copy import deepcopy
+import unittest, threading, time
 
-from coretc import Block, UTXO, mine_block
+from coretc import Block, UTXO, Wallet, ChainMiner, ParallelMiner, mine_block
+from coretc.blocks import BLOCK_VERSION_MIDSTATE
 from binascii import hexlify
+from hashlib import sha256
 
-from tests.helpers import create_example_block, create_example_utxo
+from tests.helpers import create_chain_block, create_empty_chain, create_example_block, create_example_utxo
 
 
 
@@ -19,3 +22,143 @@ class TestBlockMining(unittest.TestCase):
 
         self.assertEqual(hexlify(blk.hash_sha256())[:3], b'000',
                          "Mined block's hash does not correspond to the difficulty_bits")
+
+    def test_block_hash_cache(self) -> None:
+
+        blk: Block = create_example_block(mine = False)
+        initial_hash = blk.hash_sha256()
+
+        self.assertEqual(blk.hash_sha256(), initial_hash)
+
+        blk.nonce = b'Other data'
+
+        self.assertNotEqual(blk.hash_sha256(), initial_hash, 'Changing the nonce must invalidate the hash')
+        self.assertEqual(blk.hash_sha256(), sha256(blk.get_header_bytes()).digest())
+
+        blk.nonce = b'Some data'
+
+        self.assertEqual(blk.hash_sha256(), initial_hash)
+
+        # Transactions appended in place are also picked up
+        blk.transactions.append(Wallet.generate().create_reward_transaction(1.))
+
+        tx_hash = blk.hash_sha256()
+
+        self.assertNotEqual(tx_hash, initial_hash, 'Adding a transaction must invalidate the hash')
+
+        # Changes made in place to a contained TX are picked up too, the block needs no invalidate_cache()
+        blk.transactions[0].gen_nonce()
+        nonce_hash = blk.hash_sha256()
+
+        self.assertNotEqual(nonce_hash, tx_hash, 'Changing a TX must invalidate the hash')
+        self.assertEqual(nonce_hash, sha256(blk.get_header_bytes()).digest())
+
+        # Outputs don't know their TX, only the TX's own cache has to be dropped after changing one
+        reward = blk.transactions[0]
+        reward.outputs[0].amount = 2.
+        reward.invalidate_cache()
+
+        self.assertNotEqual(blk.hash_sha256(), nonce_hash, 'Changing a TX output must invalidate the hash')
+
+        # Same TX count, different TX
+        blk.transactions[0] = Wallet.generate().create_reward_transaction(1.)
+
+        self.assertEqual(blk.hash_sha256(), sha256(blk.get_header_bytes()).digest())
+        self.assertEqual(blk.hash_sha256(), Block.from_json(blk.to_json()).hash_sha256())
+
+        # Copies track their own TXs
+        copied = deepcopy(blk)
+        copied_hash = copied.hash_sha256()
+
+        copied.transactions[0].gen_nonce()
+
+        self.assertNotEqual(copied.hash_sha256(), copied_hash)
+        self.assertEqual(blk.hash_sha256(), copied_hash)
+
+    def test_mine_midstate(self) -> None:
+
+        blk: Block = create_example_block(mine = False)
+        blk._VERSION = BLOCK_VERSION_MIDSTATE
+        blk.difficulty_bits = 0x20000FFF
+        blk.transactions = [Wallet.generate().create_reward_transaction(1.)]
+
+        mine_block(blk)
+
+        self.assertTrue(blk.is_hash_valid(), 'Midstate miner produced an invalid block')
+        self.assertEqual(hexlify(blk.hash_sha256())[:3], b'000')
+        self.assertEqual(len(blk.nonce), 16)
+
+        # Varying fields come last in version 3 headers
+        self.assertTrue(blk.get_header_bytes().startswith(blk.get_header_prefix()))
+        self.assertTrue(blk.get_header_bytes().endswith(blk.nonce))
+
+    def test_mine_parallel(self) -> None:
+
+        miner = ParallelMiner(workers = 2)
+
+        for version in [1, BLOCK_VERSION_MIDSTATE]:
+            blk: Block = create_example_block(mine = False)
+            blk._VERSION = version
+            blk.difficulty_bits = 0x20000FFF
+
+            result = miner.mine(blk, timeout = 60)
+
+            self.assertIsNotNone(result, 'Parallel miner did not find a block')
+            if result is None: return
+
+            mined, counts = result
+
+            self.assertIs(mined, blk)
+            self.assertTrue(mined.is_hash_valid())
+            self.assertEqual(len(counts), 2)
+            self.assertGreater(sum(counts), 0)
+
+    def test_mine_cancel(self) -> None:
+
+        stop_event = threading.Event()
+        stop_event.set()
+
+        for version in [1, BLOCK_VERSION_MIDSTATE]:
+            blk: Block = create_example_block(mine = False)
+            blk._VERSION = version
+            blk.difficulty_bits = 0x1a00ffff
+
+            self.assertIsNone(mine_block(blk, stop_event = stop_event), 'Mining should have been cancelled')
+
+    def test_chain_miner_restart(self) -> None:
+
+        chain = create_empty_chain()
+        lock = threading.Lock()
+        templates: list[Block] = []
+        template_locked: list[bool] = []
+
+        def create_template() -> Block:
+            # Practically impossible to mine, so only a tip change gets the miner moving
+            blk = create_chain_block(chain, mine = False)
+            blk.difficulty_bits = 0x1a00ffff
+
+            template_locked.append(lock.locked())
+            templates.append(blk)
+            return blk
+
+        miner_thread = ChainMiner(chain, create_template, submit_block = lambda blk: None, lock = lock)
+        miner_thread.start()
+
+        while len(templates) == 0: time.sleep(0.01)
+
+        # Blocks from peers come in through the RPC, under the same lock
+        peer_block = create_example_block()
+
+        with lock:
+            chain.add_block(peer_block)
+
+        for _ in range(500):
+            if len(templates) > 1: break
+            time.sleep(0.01)
+
+        miner_thread.stop()
+
+        self.assertGreaterEqual(miner_thread.restarts, 1)
+        self.assertTrue(all(template_locked), 'Templates must be created under the chain lock')
+        self.assertEqual(templates[-1].previous_hash, peer_block.hash_sha256(),
+                         'Miner should have restarted on top of the new tip')
@@ -1,7 +1,9 @@
 
 import unittest
 
-from coretc.crypto import data_sign, data_verify
+from coretc import UTXO, Wallet
+
+from coretc.crypto import data_sign, data_verify, data_verify_pk, import_public_key, get_public_key_cache_stats
 
 from Crypto.PublicKey import ECC
 
@@ -25,3 +27,49 @@ class TestMisc(unittest.TestCase):
                         "Unable to verify data with correspondign public key")
 
         
+    def test_txid_cache(self):
+
+        wallet = Wallet.generate()
+        tx = wallet.create_reward_transaction(5.)
+
+        txid = tx.get_txid()
+
+        self.assertEqual(tx._txid_cache, txid, 'The txid should be cached')
+        self.assertEqual(tx.get_txid(ignore_cache = True), txid)
+
+        tx.add_output(UTXO(wallet.get_pk_bytes(), 1.))
+        self.assertNotEqual(tx.get_txid(), txid, 'Adding an output must invalidate the txid')
+
+        txid = tx.get_txid()
+        tx.gen_nonce()
+        self.assertNotEqual(tx.get_txid(), txid, 'A new nonce must invalidate the txid')
+
+        # UTXO hashes follow the changes of their hashed fields
+        utxo = tx.outputs[0]
+        utxo_hash = utxo.hash_sha256()
+
+        utxo.txid = b'\x01'*32
+        self.assertNotEqual(utxo.hash_sha256(), utxo_hash)
+
+        utxo.txid = b''
+        self.assertEqual(utxo.hash_sha256(), utxo_hash)
+
+    def test_public_key_cache(self):
+
+        data = b'Data to be signed'
+        signature = data_sign(self.example_privkey, data) or b''
+        der = self.example_pubkey.export_key(format = 'DER')
+
+        key = import_public_key(der)
+
+        self.assertEqual(key, self.example_pubkey)
+        self.assertIs(import_public_key(der), key, 'The parsed key should come from the cache')
+
+        hits = get_public_key_cache_stats()['hits']
+
+        self.assertTrue(data_verify_pk(der, data, signature))
+        self.assertFalse(data_verify_pk(der, data + b'!', signature))
+        self.assertEqual(get_public_key_cache_stats()['hits'] - hits, 2)
+
+        self.assertIsNone(import_public_key(b'A'*91))
+        self.assertFalse(data_verify_pk(b'A'*91, data, signature))
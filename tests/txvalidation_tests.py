@@ -6,7 +6,10 @@ from coretc import ChainSettings, BlockStatus
 
 from coretc.blocks import Block
 from coretc.miner import mine_block
+from coretc.crypto import get_signature_cache_stats
+from coretc.sigverify import SignatureVerifier
 from tests.helpers import create_empty_chain, create_example_block, create_example_tx, create_example_utxo
+from tests.helpers import create_chain_block, create_funded_chain, create_signed_tx
 
 class TestTXValidation(unittest.TestCase):
     
@@ -49,3 +52,145 @@ class TestTXValidation(unittest.TestCase):
 
         self.assertEqual(a.balance(), chain.get_top_blockreward())
 
+    def test_block_signatures_bulk(self) -> None:
+
+        a = Wallet.generate()
+        b = Wallet.generate()
+
+        chain, rewards = create_funded_chain(a, 4)
+
+        # Force the worker pool even for a small block
+        chain.signature_verifier = SignatureVerifier(workers = 2, parallel_min = 0)
+
+        spends = [create_signed_tx(a, [utxo], [(b.get_pk_bytes(), utxo.amount)]) for utxo in rewards]
+
+        # Swap in a signature of another input, structurally the block is fine
+        spends[2].inputs[0].signature = spends[1].inputs[0].signature
+
+        def spend_block(txs):
+            blk = create_chain_block(chain, mine = False, txs = [a.create_reward_transaction(chain.get_top_blockreward())] + txs)
+            return mine_block(blk)
+
+        self.assertEqual(chain.add_block(spend_block(spends)), BlockStatus.INVALID_TX_INPUTS)
+        self.assertEqual(chain.add_block(spend_block(spends[:2] + spends[3:])), BlockStatus.VALID)
+        self.assertIsNotNone(chain.signature_verifier.executor)
+
+        # Saving before exiting stops the workers
+        chain.save()
+        self.assertIsNone(chain.signature_verifier.executor)
+
+    def test_signature_cache(self) -> None:
+
+        a = Wallet.generate()
+        b = Wallet.generate()
+
+        chain, rewards = create_funded_chain(a, 3)
+
+        spends = [create_signed_tx(a, [utxo], [(b.get_pk_bytes(), utxo.amount - 1.)]) for utxo in rewards]
+
+        self.assertEqual(chain.add_transactions_to_mempool(spends), [BlockStatus.TX_VALID] * 3)
+
+        before = get_signature_cache_stats()
+
+        blk = create_chain_block(chain, mine = False, txs = [a.create_reward_transaction(chain.get_top_blockreward())] + spends)
+        self.assertEqual(chain.add_block(mine_block(blk)), BlockStatus.VALID)
+
+        after = get_signature_cache_stats()
+
+        self.assertEqual(after['hits'] - before['hits'], 3, 'Signatures checked in the mempool should be cached')
+        self.assertEqual(after['misses'], before['misses'])
+
+        # Invalid signatures are never cached
+        forged = create_signed_tx(a, [rewards[0]], [(b.get_pk_bytes(), 1.)])
+        forged.inputs[0].signature = spends[1].inputs[0].signature
+
+        self.assertFalse(forged.check_inputs())
+        self.assertFalse(forged.check_inputs())
+        self.assertEqual(get_signature_cache_stats()['misses'] - after['misses'], 2)
+
+    def test_block_double_spend(self) -> None:
+
+        a = Wallet.generate()
+        b = Wallet.generate()
+
+        chain, rewards = create_funded_chain(a, 2)
+
+        first = create_signed_tx(a, [rewards[0]], [(b.get_pk_bytes(), 5.)])
+        second = create_signed_tx(a, [rewards[0]], [(a.get_pk_bytes(), 5.)])
+        other = create_signed_tx(a, [rewards[1]], [(b.get_pk_bytes(), 5.)])
+
+        def spend_block(txs):
+            blk = create_chain_block(chain, mine = False, txs = [a.create_reward_transaction(chain.get_top_blockreward())] + txs)
+            return mine_block(blk)
+
+        self.assertEqual(chain.add_block(spend_block([first, other, second])), BlockStatus.INVALID_TX_UTXO_IS_SPENT,
+                         'Two TXs of a block spending the same output')
+
+        self.assertEqual(chain.add_block(spend_block([first, other])), BlockStatus.VALID)
+        self.assertEqual(chain.add_block(spend_block([second])), BlockStatus.INVALID_TX_UTXO_IS_SPENT,
+                         'Output already spent in the fork')
+
+    def test_unsorted_outputs(self) -> None:
+
+        a = Wallet.generate()
+        b = Wallet.generate()
+
+        chain, rewards = create_funded_chain(a, 1)
+
+        send = create_signed_tx(a, [rewards[0]], [(b.get_pk_bytes(), 1.), (a.get_pk_bytes(), 2.)])
+        send.outputs.reverse()
+        send.invalidate_cache()
+
+        blk = mine_block(create_chain_block(chain, mine = False,
+                                            txs = [a.create_reward_transaction(chain.get_top_blockreward()), send]))
+        blk_hash = blk.hash_sha256()
+
+        self.assertNotEqual(chain.add_block(blk), BlockStatus.VALID, 'Outputs out of order must be rejected')
+
+        # Validation must not reorder them, that would change the block's hash under it
+        self.assertEqual(send.outputs[0].index, 1)
+        self.assertEqual(blk.hash_sha256(), blk_hash)
+        self.assertEqual(blk.hash_sha256(), Block.from_json(blk.to_json()).hash_sha256())
+
+    def test_serialization_bounds(self) -> None:
+
+        a = Wallet.generate()
+        b = Wallet.generate()
+
+        chain, rewards = create_funded_chain(a, 2)
+
+        def spend_block(txs):
+            return mine_block(create_chain_block(chain, mine = False,
+                                                 txs = [a.create_reward_transaction(chain.get_top_blockreward()), *txs]))
+
+        # The nonce length is packed in a single byte
+        long_nonce = create_signed_tx(a, [rewards[0]], [(b.get_pk_bytes(), 1.)])
+        long_nonce._nonce = b'N'*300
+
+        self.assertEqual(chain.add_transactions_to_mempool([long_nonce]), [BlockStatus.INVALID_TX_INPUTS])
+        self.assertEqual(chain.add_block(spend_block([long_nonce])), BlockStatus.INVALID_TX_INPUTS)
+
+        # Same goes for the signature length
+        long_sig = create_signed_tx(a, [rewards[0]], [(b.get_pk_bytes(), 1.)])
+        long_sig.inputs[0].signature = b'S'*300
+
+        self.assertEqual(chain.add_transactions_to_mempool([long_sig]), [BlockStatus.INVALID_TX_INPUTS])
+        self.assertEqual(chain.add_block(spend_block([long_sig])), BlockStatus.INVALID_TX_INPUTS)
+
+        # A block over the size limit is rejected even if all of it's TXs are fine
+        send = create_signed_tx(a, [rewards[0]], [(b.get_pk_bytes(), 1.)])
+        chain.settings.block_size_limit = 256
+
+        self.assertEqual(chain.add_block(spend_block([send])), BlockStatus.INVALID_SIZE)
+
+        chain.settings.block_size_limit = 1024 * 1024
+
+        blk = spend_block([send])
+        self.assertEqual(chain.add_block(blk), BlockStatus.VALID)
+        self.assertEqual(Block.from_bytes(blk.to_bytes()).hash_sha256(), blk.hash_sha256())
+
+        # Too many TXs for the count field
+        blk = create_chain_block(chain, mine = False, txs = [a.create_reward_transaction(chain.get_top_blockreward())])
+        blk.transactions = blk.transactions * 0x10000
+
+        self.assertEqual(chain.add_block(blk), BlockStatus.INVALID_SIZE)
@@ -0,0 +1,151 @@
+import unittest, os, bson
+
+from coretc import UTXO, UTXOSet, Wallet
+
+from tests.helpers import CHAIN_PATH
+
+class TestUTXOSet(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.wallet = Wallet.generate()
+        self.utxo_set = UTXOSet(':memory:', index_owners = True)
+        self.utxo_set.load_utxos()
+
+    def create_utxo(self, txid: bytes, index: int = 0) -> UTXO:
+        return UTXO(self.wallet.get_pk_bytes(), 1.5, index, txid)
+
+    def test_utxoset_add_get_remove(self) -> None:
+
+        utxo = self.create_utxo(b'\x01'*32, 3)
+
+        self.assertTrue(self.utxo_set.utxo_add(utxo), 'Valid UTXO should be added')
+        self.assertFalse(self.utxo_set.utxo_add(self.create_utxo(b'')),
+                         'UTXO without a txid should not be added')
+
+        self.assertTrue(self.utxo_set.utxo_exists(b'\x01'*32, 3))
+        self.assertFalse(self.utxo_set.utxo_exists(b'\x01'*32, 2))
+
+        # Lookups must not have side effects on the set
+        self.assertIs(self.utxo_set.utxo_get(b'\x01'*32, 3), utxo)
+        self.assertIs(self.utxo_set.utxo_get(b'\x01'*32, 3), utxo)
+        self.assertEqual(self.utxo_set.utxo_count(), 1)
+
+        self.assertTrue(self.utxo_set.utxo_remove(b'\x01'*32, 3))
+        self.assertFalse(self.utxo_set.utxo_remove(b'\x01'*32, 3), 'UTXO was already removed')
+        self.assertIsNone(self.utxo_set.utxo_get(b'\x01'*32, 3))
+        self.assertEqual(self.utxo_set.utxo_count(), 0)
+
+    def test_utxoset_owner_index(self) -> None:
+
+        other = Wallet.generate()
+
+        self.utxo_set.utxo_add(self.create_utxo(b'\x01'*32, 0))
+        self.utxo_set.utxo_add(self.create_utxo(b'\x01'*32, 1))
+        self.utxo_set.utxo_add(UTXO(other.get_pk_bytes(), 2., 2, b'\x01'*32))
+
+        self.assertEqual(len(self.utxo_set.get_owner_utxos(self.wallet.get_pk_bytes())), 2)
+        self.assertEqual(len(self.utxo_set.get_owner_utxos(other.get_pk_bytes())), 1)
+
+        self.utxo_set.utxo_remove(b'\x01'*32, 1)
+
+        owned = self.utxo_set.get_owner_utxos(self.wallet.get_pk_bytes())
+
+        self.assertEqual(len(owned), 1)
+        self.assertEqual(owned[0].index, 0)
+
+    def test_utxoset_persistence(self) -> None:
+
+        path = CHAIN_PATH + 'utxoset-test.db'
+
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.exists(path + suffix): os.remove(path + suffix)
+
+        stored = UTXOSet(path, index_owners = True)
+        self.assertTrue(stored.load_utxos())
+
+        stored.utxo_add(self.create_utxo(b'\x01'*32, 0))
+        stored.utxo_add(self.create_utxo(b'\x01'*32, 1))
+        stored.currently_scanned_height = 7
+
+        self.assertTrue(stored.save_utxos())
+
+        # Unsaved changes get dropped on reload
+        stored.utxo_remove(b'\x01'*32, 0)
+        stored.utxo_add(self.create_utxo(b'\x02'*32, 0))
+        self.assertEqual(stored.utxo_count(), 2)
+
+        self.assertTrue(stored.load_utxos())
+        self.assertEqual(stored.utxo_count(), 2)
+        self.assertTrue(stored.utxo_exists(b'\x01'*32, 0))
+        self.assertFalse(stored.utxo_exists(b'\x02'*32, 0))
+
+        # Only the delta is written on save
+        stored.utxo_remove(b'\x01'*32, 0)
+        stored.currently_scanned_height = 8
+        self.assertTrue(stored.save_utxos())
+        stored.close()
+
+        reopened = UTXOSet(path, index_owners = True)
+        self.assertTrue(reopened.load_utxos())
+
+        self.assertEqual(reopened.currently_scanned_height, 8)
+        self.assertEqual(reopened.utxo_count(), 1)
+        self.assertIsNone(reopened.utxo_get(b'\x01'*32, 0))
+
+        utxo = reopened.utxo_get(b'\x01'*32, 1)
+
+        self.assertIsNotNone(utxo)
+        if utxo is None: return
+
+        self.assertEqual(utxo.owner_pk, self.wallet.get_pk_bytes())
+        self.assertEqual(utxo.amount, 1.5)
+        self.assertEqual(len(reopened.get_owner_utxos(self.wallet.get_pk_bytes())), 1)
+
+        # Re-adding a stored UTXO and removing it again must still delete the stored row
+        reopened.utxo_add(self.create_utxo(b'\x01'*32, 1))
+        self.assertEqual(reopened.utxo_count(), 1, 'A re-added stored UTXO must not be counted twice')
+        self.assertTrue(reopened.utxo_remove(b'\x01'*32, 1))
+        self.assertIsNone(reopened.utxo_get(b'\x01'*32, 1))
+
+        self.assertTrue(reopened.save_utxos())
+        self.assertTrue(reopened.load_utxos())
+        self.assertIsNone(reopened.utxo_get(b'\x01'*32, 1))
+
+        reopened.close()
+
+    def test_utxoset_legacy_import(self) -> None:
+
+        path = CHAIN_PATH + 'utxoset-legacy.db'
+
+        def write_legacy(outputs: list) -> None:
+            for suffix in ['', '-wal', '-shm', '.legacy', '.legacy-failed']:
+                if os.path.exists(path + suffix): os.remove(path + suffix)
+
+            with open(path, 'wb') as f:
+                f.write(bson.dumps({'height': 7, 'outputs': outputs}))
+
+        utxo = self.create_utxo(b'\x01'*32, 0)
+
+        # Old sets don't carry the txids, nothing can be imported from them
+        write_legacy([utxo.to_json(is_input = False)])
+
+        legacy = UTXOSet(path)
+        self.assertTrue(legacy.load_utxos())
+
+        self.assertEqual(legacy.currently_scanned_height, -1, 'A failed import must leave the set to be rebuilt')
+        self.assertEqual(legacy.utxo_count(), 0)
+        self.assertTrue(os.path.exists(path + '.legacy-failed'))
+        self.assertFalse(os.path.exists(path + '.legacy'))
+        legacy.close()
+
+        # Ones written by get_as_json do
+        write_legacy([{**utxo.to_json(is_input = False), 'txid': (b'\x01'*32).hex()}])
+
+        legacy = UTXOSet(path)
+        self.assertTrue(legacy.load_utxos())
+
+        self.assertEqual(legacy.currently_scanned_height, 7)
+        self.assertEqual(legacy.utxo_count(), 1)
+        self.assertTrue(legacy.utxo_exists(b'\x01'*32, 0))
+        self.assertTrue(os.path.exists(path + '.legacy'))
+        legacy.close()